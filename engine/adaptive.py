@@ -0,0 +1,66 @@
+from __future__ import annotations
+import math, random
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from .models import Question
+
+# Adaptive pickers for ExamSession. Both are built once from the session pool
+# and then updated in O(1) per answer; next() is O(domains) / O(difficulty bins).
+# state()/load_state() carry the learned part (not the remaining pool) across a checkpoint.
+
+class DomainAdaptive:
+    """Bias the next pick toward domains the candidate is currently missing
+    (weight = 1 - running accuracy, 0.5 for unseen domains)."""
+    def __init__(self, questions:List[Question], rng:Any=None)->None:
+        self.rng=rng or random; self.queues:Dict[str,Deque[Question]]={}
+        for q in questions: self.queues.setdefault(q.domain,deque()).append(q)
+        self.counts:Dict[str,List[int]]={}   # domain -> [correct, total]
+    def update(self, q:Question, correct:bool)->None:
+        c=self.counts.setdefault(q.domain,[0,0]); c[1]+=1
+        if correct: c[0]+=1
+    def state(self)->Dict[str,Any]: return {'counts':self.counts}
+    def load_state(self, st:Dict[str,Any])->None: self.counts={d:list(c) for d,c in st['counts'].items()}
+    def weight(self, domain:str)->float:
+        c=self.counts.get(domain); return 1.0-(c[0]/c[1]) if c and c[1] else 0.5
+    def next(self)->Optional[Question]:
+        doms=[d for d,dq in self.queues.items() if dq]
+        if not doms: return None
+        w=[self.weight(d) for d in doms]
+        if not any(w): w=[1.0]*len(doms)   # perfect so far everywhere: fall back to uniform
+        return self.queues[self.rng.choices(doms,w,k=1)[0]].popleft()
+
+def item_difficulty(q:Question, hist:Optional[Tuple[int,int]]=None, prior_weight:float=5.0)->float:
+    """Rasch difficulty in logits: the authored 1..5 ``difficulty`` maps to -2..+2 and is
+    shrunk toward the empirical -logit(p) once (correct, total) response history exists."""
+    b0=float((q.difficulty or 3)-3)
+    if not hist or not hist[1]: return b0
+    c,n=hist; p=(c+0.5)/(n+1.0)
+    return (b0*prior_weight+math.log((1-p)/p)*n)/(prior_weight+n)
+
+class IRTAdaptive:
+    """Pick the remaining item whose estimated difficulty is closest to the running
+    ability estimate; ability follows an Elo-style update with a shrinking step."""
+    BIN=0.25
+    def __init__(self, questions:List[Question], item_history:Optional[Dict[int,Tuple[int,int]]]=None, k0:float=1.0, k_min:float=0.2)->None:
+        self.theta=0.0; self.n=0; self.k0=k0; self.k_min=k_min
+        hist=item_history or {}; self.b:Dict[int,float]={}; self.bins:Dict[int,Deque[Question]]={}
+        for q in questions:
+            b=self.b[q.id]=item_difficulty(q, hist.get(q.id))
+            self.bins.setdefault(round(b/self.BIN),deque()).append(q)
+    def state(self)->Dict[str,Any]: return {'theta':self.theta,'n':self.n}
+    def load_state(self, st:Dict[str,Any])->None: self.theta=float(st['theta']); self.n=int(st['n'])
+    def probability(self, q:Question)->float:
+        return 1.0/(1.0+math.exp(self.b.get(q.id,0.0)-self.theta))
+    def update(self, q:Question, correct:bool)->None:
+        k=max(self.k_min, self.k0/(1.0+0.2*self.n)); self.theta+=k*((1.0 if correct else 0.0)-self.probability(q)); self.n+=1
+    def next(self)->Optional[Question]:
+        if not self.bins: return None
+        target=self.theta/self.BIN; key=min(self.bins, key=lambda k: (abs(k-target),k))
+        dq=self.bins[key]; q=dq.popleft()
+        if not dq: del self.bins[key]
+        return q
+
+def make_adaptive(mode:str, questions:List[Question], *, item_history:Optional[Dict[int,Tuple[int,int]]]=None, rng:Any=None):
+    if mode=='irt': return IRTAdaptive(questions, item_history)
+    if mode=='domain': return DomainAdaptive(questions, rng=rng)
+    raise ValueError(f'unknown adaptive mode: {mode}')
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from .models import AnswerRecord, SessionResult
 
 def compute_domain_stats(ans:List[AnswerRecord])->Dict[str,Dict[str,int]]:
@@ -10,6 +10,27 @@ def compute_domain_stats(ans:List[AnswerRecord])->Dict[str,Dict[str,int]]:
         if a.is_correct: d['correct']+=1
     return st
 
+def question_history(records:Iterable[Dict[str,Any]])->Dict[int,Tuple[int,int]]:
+    """Per-question (correct, total) over stored history records."""
+    out:Dict[int,List[int]]={}
+    for rec in records:
+        for a in rec.get('answers',[]):
+            c=out.setdefault(int(a['question_id']),[0,0]); c[1]+=1
+            if a.get('is_correct'): c[0]+=1
+    return {k:(v[0],v[1]) for k,v in out.items()}
+
+def timing_stats(ans:List[AnswerRecord], budget_s:float)->Optional[Dict[str,Any]]:
+    """Response-time summary over answers that carry ``latency_ms``; ``budget_s`` is the time limit per question."""
+    xs=sorted(a.latency_ms/1000 for a in ans if a.latency_ms is not None)
+    if not xs: return None
+    q=lambda p: xs[min(len(xs)-1,int(p*len(xs)))]
+    per:Dict[str,List[float]]={}
+    for a in ans:
+        if a.latency_ms is not None: per.setdefault(a.domain,[]).append(a.latency_ms/1000)
+    dom={d:{'n':len(v),'mean_s':sum(v)/len(v),'max_s':max(v),'over_budget':sum(1 for x in v if x>budget_s)} for d,v in per.items()}
+    return {'n':len(xs),'total_s':sum(xs),'mean_s':sum(xs)/len(xs),'median_s':q(0.5),'p90_s':q(0.9),'max_s':xs[-1],'budget_s':budget_s,
+            'over_budget':sum(1 for x in xs if x>budget_s),'domains':dict(sorted(dom.items(), key=lambda kv: -kv[1]['mean_s']))}
+
 def build_session_result(ans:List[AnswerRecord], user:str)->SessionResult:
     tot=len(ans); cor=sum(1 for a in ans if a.is_correct); inc=tot-cor
     pct=round((cor/tot)*100,2) if tot else 0.0
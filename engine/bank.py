@@ -0,0 +1,108 @@
+from __future__ import annotations
+import atexit, os, sys, tempfile
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from .compiled import NO_DIFF, SUFFIX, CompiledBank, write_compiled
+from .models import Question
+
+# Column store over a compiled bank (.qbc). Per-question metadata stays in the
+# mapped file's native columns (ids, difficulty, pooled string codes), small
+# vocabularies (domains, types, answer letters, option keys, tags) are decoded
+# once and interned, and question/option/explanation text is decoded only when
+# a QuestionView attribute is read. Nothing is materialised per question, so the
+# Python heap cost of a bank no longer grows with its size.
+
+class QuestionView:
+    """Row ``row`` of a QuestionBank, read like a Question."""
+    __slots__=('bank','row')
+    def __init__(self, bank:'QuestionBank', row:int)->None: self.bank=bank; self.row=row
+    id=property(lambda self: self.bank._ids[self.row])
+    domain=property(lambda self: self.bank._sym(self.bank._dom[self.row]))
+    type=property(lambda self: self.bank._sym(self.bank._typ[self.row]))
+    question=property(lambda self: self.bank._text(self.bank._q[self.row]))
+    answer=property(lambda self: self.bank._sym(self.bank._ans[self.row]))
+    answer_text=property(lambda self: self.bank._text(self.bank._atx[self.row]))
+    options=property(lambda self: self.bank.options(self.row))
+    tags=property(lambda self: self.bank.tags(self.row))
+    media=property(lambda self: self.bank.media(self.row))
+    difficulty=property(lambda self: self.bank.difficulty(self.row))
+    def to_question(self)->Question: return self.bank.compiled.question(self.row)
+    def __eq__(self, other:object)->bool:
+        if isinstance(other,QuestionView): return other.bank is self.bank and other.row==self.row
+        return NotImplemented
+    def __hash__(self)->int: return hash(self.id)
+    def __repr__(self)->str: return f'QuestionView(id={self.id}, domain={self.domain!r})'
+
+class IdMap(Mapping):
+    """Question id -> view, answered from the bank's sorted id column."""
+    __slots__=('bank',)
+    def __init__(self, bank:'QuestionBank')->None: self.bank=bank
+    def __getitem__(self, qid:int)->QuestionView:
+        r=self.bank.compiled.row_for_id(qid)
+        if r is None: raise KeyError(qid)
+        return QuestionView(self.bank, r)
+    def __len__(self)->int: return len(self.bank)
+    def __iter__(self)->Iterator[int]: return iter(self.bank._ids)
+
+class QuestionBank(Sequence):
+    """Sequence of QuestionViews backed by a CompiledBank, which it keeps open (mapped) until close()."""
+    def __init__(self, compiled:CompiledBank, cleanup:Optional[Path]=None)->None:
+        self.compiled=compiled; self._cleanup=cleanup; s=compiled.sec
+        self._ids=s['id']; self._diff=s['diff']; self._dom=s['domain']; self._typ=s['type']; self._ans=s['answer']
+        self._q=s['question']; self._atx=s['ans_text']; self._ok=s['opt_key']; self._ov=s['opt_val']; self._op=s['opt_ptr']
+        self._tg=s['tag']; self._tp=s['tag_ptr']; self._md=s['media']; self._mp=s['med_ptr']
+        self._syms:Dict[int,str]={}
+        self.clusters:List[List[int]]=[]   # near-duplicate row groups, filled by load_questions(dedupe=...)
+    @classmethod
+    def from_questions(cls, qs:List[Question], src:Path)->'QuestionBank':
+        """Bank for questions that have no sidecar (cache off, unwritable, or a source with bad lines):
+        they are compiled to an anonymous temp file so text is still read lazily."""
+        fd,name=tempfile.mkstemp(prefix='exam_engine_', suffix=SUFFIX); os.close(fd); tmp=Path(name)
+        try: write_compiled(qs, tmp, src, digest=bytes(20)); bank=cls(CompiledBank(tmp))
+        except BaseException: tmp.unlink(); raise
+        try: tmp.unlink()
+        except OSError: bank._cleanup=tmp; atexit.register(bank.close)   # Windows keeps mapped files until closed
+        return bank
+    def close(self)->None:
+        if self.compiled._mm is not None: self.compiled.close()
+        if self._cleanup is not None:
+            try: self._cleanup.unlink()
+            except OSError: pass
+            self._cleanup=None
+    def __enter__(self)->'QuestionBank': return self
+    def __exit__(self,*exc)->None: self.close()
+    def __len__(self)->int: return self.compiled.n
+    def __getitem__(self, i):
+        if isinstance(i,slice): return [QuestionView(self,r) for r in range(*i.indices(len(self)))]
+        if i<0: i+=len(self)
+        if not 0<=i<len(self): raise IndexError(i)
+        return QuestionView(self,i)
+    def __iter__(self)->Iterator[QuestionView]:
+        for r in range(len(self)): yield QuestionView(self,r)
+    @property
+    def by_id(self)->IdMap: return IdMap(self)
+    def _sym(self, i:int)->str:
+        s=self._syms.get(i)
+        if s is None: s=self._syms[i]=sys.intern(self.compiled.string(i))
+        return s
+    def _text(self, i:int)->str: return self.compiled.string(i)
+    def options(self, row:int)->Dict[str,str]:
+        a,b=self._op[row],self._op[row+1]; return {self._sym(self._ok[j]):self._text(self._ov[j]) for j in range(a,b)}
+    def tags(self, row:int)->List[str]: return [self._sym(self._tg[j]) for j in range(self._tp[row],self._tp[row+1])]
+    def media(self, row:int)->List[str]: return [self._text(self._md[j]) for j in range(self._mp[row],self._mp[row+1])]
+    def difficulty(self, row:int)->Optional[int]:
+        d=self._diff[row]; return None if d==NO_DIFF else d
+    # postings straight from the compiled file, for QuestionIndex
+    def domain_postings(self)->List[Tuple[str,List[int]]]:
+        """(domain, ascending rows), domains in order of first appearance in the source."""
+        s=self.compiled.sec; p=s['dom_ptr']; rows=s['dom_rows']
+        out=[(self._sym(k),rows[p[i]:p[i+1]].tolist()) for i,k in enumerate(s['dom_key'])]
+        return sorted(out, key=lambda x: x[1][0])
+    def difficulty_postings(self)->Dict[Optional[int],List[int]]:
+        s=self.compiled.sec; p=s['dif_ptr']; rows=s['dif_rows']
+        return {None if k==NO_DIFF else k:rows[p[i]:p[i+1]].tolist() for i,k in enumerate(s['dif_key'])}
+    def tag_rows(self, tag:str)->List[int]: return self.compiled.tag_rows(tag)
+    def domains(self)->List[str]:
+        s=self.compiled.sec; p=s['dom_ptr']; rows=s['dom_rows']; keys=s['dom_key']
+        return [self._sym(keys[i]) for i in sorted(range(len(keys)), key=lambda i: rows[p[i]])]
@@ -0,0 +1,155 @@
+from __future__ import annotations
+import argparse, gc, io, json, os, platform, random, shutil, subprocess, sys, tempfile, threading, time, tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from rich.console import Console
+from .compiled import open_compiled
+from .dedupe import find_duplicates
+from .exam import ExamSession
+from .history import open_history_store
+from .loader import load_metadata, load_questions
+from .models import SessionConfig
+from .selector import QuestionIndex, blueprint_select, filter_pool, select_questions
+from .synth import generate_bank, make_history
+from .timer import TerminalUI
+
+# Benchmarks for the hot paths ("python -m engine.main bench"). Banks and histories
+# are synthetic (engine.synth), cached per size under --work-dir, and every case
+# reports the best of --repeat runs. Results go to a JSON file that a later run
+# can be compared against with --baseline.
+
+console=Console()
+
+def _best(fn:Callable[[],Any], repeat:int)->float:
+    best=float('inf')
+    for _ in range(repeat):
+        t=time.perf_counter(); fn(); best=min(best, time.perf_counter()-t)
+    return best
+
+def _bank(work:Path, n:int, seed:int)->Path:
+    d=work/f'bank_{n}_{seed}'; q=d/'questions.jsonl'
+    if not q.exists(): generate_bank(d, n, seed=seed, tag_vocab=200)
+    return q
+
+def bank_cases(q_path:Path, n:int, repeat:int, seed:int)->List[Dict[str,Any]]:
+    out=[]; add=lambda name,sec,ops=1: out.append({'case':name,'size':n,'seconds':sec,'per_op_us':sec/max(ops,1)*1e6})
+    add('load_questions.parse', _best(lambda: load_questions(q_path, use_cache=False), repeat), n)
+    load_questions(q_path, rebuild_cache=True)
+    add('load_questions.cached', _best(lambda: load_questions(q_path), repeat), n)
+    qs=load_questions(q_path); weights=load_metadata(q_path.parent/'metadata.json')['domains']
+    add('QuestionIndex.build', _best(lambda: QuestionIndex(qs), repeat), n)
+    idx=QuestionIndex(qs); inc=[f'tag{i:04d}' for i in range(0,40,2)]; exc=['tag0001','tag0003']
+    add('filter_pool', _best(lambda: filter_pool(idx, inc, exc, 2, 4), repeat))
+    rng=random.Random(seed); total=min(1000,n)
+    add('select_questions', _best(lambda: select_questions(idx, total, weights, rng=rng), repeat))
+    bp={d:max(1,int(w*total)) for d,w in weights.items()}
+    add('blueprint_select', _best(lambda: blueprint_select(idx, bp, rng=rng), repeat))
+    # near-duplicate scan: signing everything is slow enough to run once; the cached path (signatures reused, LSH redone) gets --repeat
+    add('find_duplicates.cold', _best(lambda: find_duplicates(qs, q_path, use_cache=False), 1), n)
+    find_duplicates(qs, q_path)
+    add('find_duplicates.cached', _best(lambda: find_duplicates(qs, q_path), repeat), n)
+    sel=select_questions(idx, min(500,n), weights, rng=rng)
+    for mode in ('domain','irt'):
+        def drill()->None:
+            s=ExamSession(sel, SessionConfig(adaptive=True, adaptive_mode=mode), rng=random.Random(seed))
+            while s._pick_next_adaptive() is not None: pass
+        add(f'adaptive_pick.{mode}', _best(drill, repeat), len(sel))
+    return out
+
+def memory_cases(q_path:Path, n:int)->List[Dict[str,Any]]:
+    """Python heap retained per question (tracemalloc): a plain Question list, the QuestionBank, and a QuestionIndex over it."""
+    out=[]; load_questions(q_path).close()   # make sure the sidecar exists
+    def measure(name:str, build:Callable[[],Any])->Any:
+        gc.collect(); tracemalloc.start()
+        try: obj=build(); cur,peak=tracemalloc.get_traced_memory()
+        finally: tracemalloc.stop()
+        out.append({'case':name,'size':n,'bytes_per_question':cur/n,'peak_bytes_per_question':peak/n}); return obj
+    with open_compiled(q_path) as cb: measure('memory.question_list', cb.questions)
+    bank=measure('memory.question_bank', lambda: load_questions(q_path))
+    measure('memory.question_index', lambda: QuestionIndex(bank)); bank.close()
+    return out
+
+def history_cases(work:Path, h:int, repeat:int, seed:int, appends:int=20)->List[Dict[str,Any]]:
+    out=[]; recs=make_history(h+appends*repeat, 10000, seed=seed)
+    for backend,suffix in (('jsonl','.jsonl'),('sqlite','.sqlite')):
+        d=Path(tempfile.mkdtemp(dir=work)); store=open_history_store(d/f'history{suffix}')
+        store.append_many(recs[:h]); it=iter(recs[h:])
+        sec=_best(lambda: [store.append(next(it)) for _ in range(appends)], repeat)
+        out.append({'case':f'append_history.{backend}','size':h,'seconds':sec,'per_op_us':sec/appends*1e6})
+        sec=_best(lambda: sum(1 for _ in store.query(since='2025-01-02T00:00:00+00:00', until='2025-01-03T00:00:00+00:00')), repeat)
+        out.append({'case':f'query_history.{backend}','size':h,'seconds':sec,'per_op_us':sec*1e6})
+        store.close(); shutil.rmtree(d, ignore_errors=True)
+    return out
+
+def idle_cases(seconds:float)->List[Dict[str,Any]]:
+    """CPU spent while a prompt waits for input with the live timer on, for `seconds`: the old design (a thread
+    rebuilding a Rich Panel in a Live region every second) against TerminalUI (event loop; redraw only on change,
+    here the per-second worst case). Drawing goes to an in-memory terminal as wide as the report console,
+    so the badges do not land in the report."""
+    from rich.live import Live
+    from rich.panel import Panel
+    from rich.text import Text
+    out=[]; term=lambda: Console(file=io.StringIO(), force_terminal=True, width=console.width)
+    def record(name:str, cpu:float, redraws:int)->None:
+        out.append({'case':name,'seconds':seconds,'cpu_ms':cpu*1000,'cpu_ms_per_s':cpu*1000/seconds,'redraws':redraws})
+    stop=threading.Event(); n=[0]
+    def ticker()->None:
+        with Live(console=term(), auto_refresh=False, transient=False) as live:
+            while not stop.is_set():
+                left=max(0,int(end-time.time())); live.update(Panel(Text(f"Time Remaining: {left//60}m {left%60}s", style='bold white on blue'), border_style='blue'))
+                live.refresh(); n[0]+=1; stop.wait(1.0)
+    end=time.time()+seconds; c=time.process_time(); th=threading.Thread(target=ticker, daemon=True); th.start()
+    stop.wait(seconds); stop.set(); th.join(); record('idle.thread_live', time.process_time()-c, n[0])
+    r,w=os.pipe(); end=time.time()+seconds
+    ui=TerminalUI(lambda: end, live_timer=True, fine_below=int(seconds)+60, console=term(), stdin=os.fdopen(r))
+    os.write(w, b'A\n'); ui.ask('answer'); ui.redraws=0   # first prompt (one-off Rich setup) answered at once; then the idle one
+    c=time.process_time(); ui.ask('answer'); record('idle.event_loop', time.process_time()-c, ui.redraws); ui.close(); os.close(w)
+    return out
+
+def _git_rev()->str:
+    try: return subprocess.run(['git','rev-parse','--short','HEAD'], capture_output=True, text=True, cwd=Path(__file__).resolve().parents[1], check=False).stdout.strip()
+    except OSError: return ''
+
+def compare(results:List[Dict[str,Any]], baseline:List[Dict[str,Any]], tolerance:float)->List[Dict[str,Any]]:
+    base={(r['case'],r['size']):r['seconds'] for r in baseline}; out=[]
+    for r in results:
+        b=base.get((r['case'],r['size']))
+        if b: out.append({**r,'baseline':b,'ratio':r['seconds']/b,'regression':r['seconds']/b>tolerance})
+    return out
+
+def main(argv:Optional[List[str]]=None)->None:
+    p=argparse.ArgumentParser(prog='engine.main bench', description='Benchmark loader/selector/adaptive/history hot paths on synthetic data')
+    p.add_argument('--sizes', type=str, default='1000,10000,100000', help='Bank sizes (questions), e.g. 1000,10000,100000,1000000')
+    p.add_argument('--history-sizes', type=str, default='10,1000,10000', help='History sizes (records), up to 100000')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--work-dir', type=str, default='', help='Where generated banks are kept between runs (default: a temp dir)')
+    p.add_argument('--out', type=str, default='bench_results.json')
+    p.add_argument('--baseline', type=str, default='', help='Earlier results file to compare against')
+    p.add_argument('--tolerance', type=float, default=1.25, help='Slowdown ratio counted as a regression')
+    p.add_argument('--no-memory', action='store_true', help='Skip the per-question memory report')
+    p.add_argument('--idle-seconds', type=float, default=3.0, help='How long to measure idle CPU of the live timer while a prompt waits (0 skips)')
+    args=p.parse_args(argv)
+    work=Path(args.work_dir) if args.work_dir else Path(tempfile.gettempdir())/'exam_engine_bench'; work.mkdir(parents=True, exist_ok=True)
+    results:List[Dict[str,Any]]=[]; memory:List[Dict[str,Any]]=[]
+    for n in [int(x) for x in args.sizes.split(',') if x.strip()]:
+        console.print(f'bank {n:>8} questions ...'); rs=bank_cases(_bank(work,n,args.seed), n, args.repeat, args.seed); results+=rs
+        for r in rs: console.print(f"  {r['case']:<26} {r['seconds']*1000:10.2f} ms  {r['per_op_us']:10.2f} us/op")
+        if not args.no_memory:
+            ms=memory_cases(_bank(work,n,args.seed), n); memory+=ms
+            for r in ms: console.print(f"  {r['case']:<26} {r['bytes_per_question']:10.1f} B/question  (peak {r['peak_bytes_per_question']:.1f})")
+    for h in [int(x) for x in args.history_sizes.split(',') if x.strip()]:
+        console.print(f'history {h:>6} records ...'); rs=history_cases(work, h, args.repeat, args.seed); results+=rs
+        for r in rs: console.print(f"  {r['case']:<26} {r['seconds']*1000:10.2f} ms  {r['per_op_us']:10.2f} us/op")
+    idle:List[Dict[str,Any]]=[]
+    if args.idle_seconds>0:
+        console.print(f'idle prompt {args.idle_seconds:g}s ...'); idle=idle_cases(args.idle_seconds)
+        for r in idle: console.print(f"  {r['case']:<26} {r['cpu_ms']:10.2f} ms CPU  {r['cpu_ms_per_s']:8.3f} ms/s  {r['redraws']} redraws")
+    doc={'meta':{'timestamp':datetime.now(timezone.utc).isoformat(),'python':sys.version.split()[0],'platform':platform.platform(),
+                 'git':_git_rev(),'repeat':args.repeat,'seed':args.seed},'results':results,'memory':memory,'idle':idle}
+    Path(args.out).write_text(json.dumps(doc, indent=2), encoding='utf-8'); console.print(f'[green]Saved results to[/green] {args.out}')
+    if args.baseline:
+        cmp=compare(results, json.loads(Path(args.baseline).read_text(encoding='utf-8'))['results'], args.tolerance)
+        for r in cmp: console.print(f"  {'REGRESSION' if r['regression'] else 'ok':<10} {r['case']:<26} {r['size']:>8}  x{r['ratio']:.2f}")
+        if any(r['regression'] for r in cmp): sys.exit(1)
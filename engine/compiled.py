@@ -0,0 +1,164 @@
+from __future__ import annotations
+import hashlib, mmap, os, struct, sys
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from .models import Question
+
+# Compiled question-bank sidecar ("<source>.qbc").
+# Layout: fixed header, section directory, then 8-byte aligned native arrays.
+# Every string lives once in a pool (str_off/str_blob); per-question columns
+# reference pool indices, and domain/tag/difficulty postings list row numbers.
+MAGIC=b'EXQBC\x00\x00\x01'
+VERSION=1
+SUFFIX='.qbc'
+NO_DIFF=-32768
+_HEAD=struct.Struct('<8sIB3xQq20sII')
+_DIR=struct.Struct('<8s1s7xQQ')
+_MTIME_AT=struct.calcsize('<8sIB3xQ')
+_BO=1 if sys.byteorder=='little' else 0
+
+def cache_path(src:Path)->Path: return src.with_name(src.name+SUFFIX)
+
+def file_digest(p:Path)->bytes:
+    h=hashlib.sha1()
+    with p.open('rb') as f:
+        for blk in iter(lambda: f.read(1<<20), b''): h.update(blk)
+    return h.digest()
+
+class _Strings:
+    def __init__(self)->None:
+        self.idx:Dict[str,int]={}; self.off=array('Q',[0]); self.blob=bytearray()
+    def add(self, s:str)->int:
+        i=self.idx.get(s)
+        if i is None:
+            i=self.idx[s]=len(self.off)-1; self.blob+=s.encode('utf-8'); self.off.append(len(self.blob))
+        return i
+
+def _bsearch(n:int, get, target)->int:
+    lo,hi=0,n
+    while lo<hi:
+        mid=(lo+hi)//2
+        if get(mid)<target: lo=mid+1
+        else: hi=mid
+    return lo
+
+def _postings(keys:Iterable, tc:str, order=None)->Tuple[array,array,array]:
+    groups:Dict=dict()
+    for row,k in keys: groups.setdefault(k,[]).append(row)
+    ks=sorted(groups, key=order); kout=array(tc,ks); ptr=array('I',[0]); rows=array('I')
+    for k in ks: rows.extend(groups[k]); ptr.append(len(rows))
+    return kout,ptr,rows
+
+def write_compiled(qs:List[Question], dest:Path, src:Path, digest:Optional[bytes]=None)->None:
+    st=os.stat(src); digest=digest or file_digest(src); pool=_Strings(); n=len(qs)
+    cols={k:array('I') for k in ('domain','type','question','answer','ans_text','opt_key','opt_val','tag','media')}
+    ptrs={k:array('I',[0]) for k in ('opt_ptr','tag_ptr','med_ptr')}
+    ids=array('q'); diff=array('h'); dom_keys=[]; tag_keys=[]; dif_keys=[]
+    for row,q in enumerate(qs):
+        ids.append(q.id); d=pool.add(q.domain); cols['domain'].append(d); dom_keys.append((row,d))
+        cols['type'].append(pool.add(q.type)); cols['question'].append(pool.add(q.question))
+        cols['answer'].append(pool.add(q.answer)); cols['ans_text'].append(pool.add(q.answer_text))
+        diff.append(NO_DIFF if q.difficulty is None else int(q.difficulty)); dif_keys.append((row,diff[-1]))
+        for k,v in q.options.items(): cols['opt_key'].append(pool.add(k)); cols['opt_val'].append(pool.add(v))
+        for t in q.tags: cols['tag'].append(pool.add(t))
+        for t in dict.fromkeys(t.casefold() for t in q.tags): tag_keys.append((row,pool.add(t)))
+        for m in q.media: cols['media'].append(pool.add(m))
+        ptrs['opt_ptr'].append(len(cols['opt_key'])); ptrs['tag_ptr'].append(len(cols['tag'])); ptrs['med_ptr'].append(len(cols['media']))
+    id_sort=array('I',sorted(range(n), key=ids.__getitem__))
+    by_text=lambda i: pool.blob[pool.off[i]:pool.off[i+1]]
+    dk,dp,dr=_postings(dom_keys,'I',by_text); tk,tp,tr=_postings(tag_keys,'I',by_text); fk,fp,fr=_postings(dif_keys,'h')
+    sections:Dict[str,array]={'str_off':pool.off,'str_blob':array('B',pool.blob),'id':ids,'diff':diff,**cols,**ptrs,
+        'id_sort':id_sort,'dom_key':dk,'dom_ptr':dp,'dom_rows':dr,'tg_key':tk,'tg_ptr':tp,'tg_rows':tr,
+        'dif_key':fk,'dif_ptr':fp,'dif_rows':fr}
+    pos=_HEAD.size+_DIR.size*len(sections); entries=[]; body=bytearray()
+    for name,arr in sections.items():
+        assert len(name)<=8, name
+        pad=(-pos)%8; body+=b'\0'*pad; pos+=pad
+        entries.append(_DIR.pack(name.encode(),arr.typecode.encode(),pos,len(arr)))
+        raw=arr.tobytes(); body+=raw; pos+=len(raw)
+    tmp=dest.with_name(f'{dest.name}.tmp{os.getpid()}')
+    with tmp.open('wb') as f:
+        f.write(_HEAD.pack(MAGIC,VERSION,_BO,st.st_size,st.st_mtime_ns,digest,n,len(sections)))
+        f.write(b''.join(entries)); f.write(body)
+    os.replace(tmp, dest)
+
+class CompiledBank:
+    """Read-only, memory-mapped view over a .qbc file."""
+    def __init__(self, path:Path)->None:
+        self.path=path; self._f=path.open('rb')
+        try: self._mm=mmap.mmap(self._f.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError: self._f.close(); raise ValueError(f'empty cache file: {path}')
+        magic,ver,bo,self.src_size,self.src_mtime_ns,self.src_digest,self.n,nsec=_HEAD.unpack_from(self._mm,0)
+        if magic!=MAGIC or ver!=VERSION or bo!=_BO: self.close(); raise ValueError(f'incompatible cache file: {path}')
+        mv=memoryview(self._mm); self._views:List[memoryview]=[mv]; self.sec:Dict[str,memoryview]={}
+        for i in range(nsec):
+            name,tc,off,cnt=_DIR.unpack_from(self._mm,_HEAD.size+i*_DIR.size); tc=tc.decode()
+            v=mv[off:off+cnt*array(tc).itemsize].cast(tc); self._views.append(v); self.sec[name.rstrip(b'\0').decode()]=v
+        self._off=self.sec['str_off']; self._blob=self.sec['str_blob']
+    def close(self)->None:
+        for v in reversed(getattr(self,'_views',[])): v.release()
+        self._views=[]
+        if getattr(self,'_mm',None) is not None: self._mm.close(); self._mm=None
+        self._f.close()
+    def __enter__(self)->'CompiledBank': return self
+    def __exit__(self,*exc)->None: self.close()
+    def __len__(self)->int: return self.n
+    def matches(self, src:Path)->bool:
+        st=os.stat(src)
+        if st.st_size!=self.src_size: return False
+        if st.st_mtime_ns==self.src_mtime_ns: return True
+        if file_digest(src)!=self.src_digest: return False
+        self._touch(st.st_mtime_ns); return True
+    def _touch(self, mtime_ns:int)->None:
+        # content unchanged but mtime moved (checkout, copy): refresh header so we skip rehashing next time
+        try:
+            with self.path.open('r+b') as f: f.seek(_MTIME_AT); f.write(struct.pack('<q',mtime_ns))
+        except OSError: pass
+    def _raw(self, i:int)->bytes: return bytes(self._blob[self._off[i]:self._off[i+1]])
+    def string(self, i:int)->str: return self._raw(i).decode('utf-8')
+    def _span(self, ptr:str, col:str, row:int)->List[str]:
+        p=self.sec[ptr]; c=self.sec[col]; return [self.string(c[j]) for j in range(p[row],p[row+1])]
+    def difficulty(self, row:int)->Optional[int]:
+        d=self.sec['diff'][row]; return None if d==NO_DIFF else d
+    def question(self, row:int)->Question:
+        s=self.sec; string=self.string
+        return Question(id=s['id'][row], domain=string(s['domain'][row]), type=string(s['type'][row]),
+            question=string(s['question'][row]), options=dict(zip(self._span('opt_ptr','opt_key',row),self._span('opt_ptr','opt_val',row))),
+            answer=string(s['answer'][row]), answer_text=string(s['ans_text'][row]), tags=self._span('tag_ptr','tag',row),
+            difficulty=self.difficulty(row), media=self._span('med_ptr','media',row))
+    def questions(self)->List[Question]:
+        # decode the pool once and resolve whole columns through it in C; the
+        # per-row work left is slicing plain lists
+        blob=bytes(self._blob); off=self._off.tolist()
+        pool=[blob[a:b].decode('utf-8') for a,b in zip(off,off[1:])]; at=pool.__getitem__
+        col=lambda name: list(map(at, self.sec[name].tolist()))
+        s=self.sec; ids=s['id'].tolist(); df=s['diff'].tolist()
+        dom,typ,qq,ans,atx=col('domain'),col('type'),col('question'),col('answer'),col('ans_text')
+        ok,ov,tg,md=col('opt_key'),col('opt_val'),col('tag'),col('media')
+        op,tp,mp=s['opt_ptr'].tolist(),s['tag_ptr'].tolist(),s['med_ptr'].tolist()
+        return [Question(ids[r], dom[r], typ[r], qq[r], dict(zip(ok[op[r]:op[r+1]],ov[op[r]:op[r+1]])), ans[r], atx[r],
+                    tg[tp[r]:tp[r+1]], None if df[r]==NO_DIFF else df[r], md[mp[r]:mp[r+1]]) for r in range(self.n)]
+    def row_for_id(self, qid:int)->Optional[int]:
+        ids=self.sec['id']; order=self.sec['id_sort']
+        i=_bsearch(self.n, lambda k: ids[order[k]], qid)
+        return order[i] if i<self.n and ids[order[i]]==qid else None
+    def _lookup(self, prefix:str, i:int)->List[int]:
+        p=self.sec[prefix+'_ptr']; return list(self.sec[prefix+'_rows'][p[i]:p[i+1]])
+    def _text_lookup(self, prefix:str, text:str)->List[int]:
+        keys=self.sec[prefix+'_key']; raw=text.encode('utf-8')
+        i=_bsearch(len(keys), lambda k: self._raw(keys[k]), raw)
+        return self._lookup(prefix,i) if i<len(keys) and self._raw(keys[i])==raw else []
+    def domain_rows(self, domain:str)->List[int]: return self._text_lookup('dom', domain)
+    def tag_rows(self, tag:str)->List[int]: return self._text_lookup('tg', tag.casefold())
+    def difficulty_rows(self, difficulty:Optional[int])->List[int]:
+        keys=self.sec['dif_key']; d=NO_DIFF if difficulty is None else difficulty; i=_bsearch(len(keys), keys.__getitem__, d)
+        return self._lookup('dif',i) if i<len(keys) and keys[i]==d else []
+
+def open_compiled(src:Path, rebuild:bool=False)->Optional[CompiledBank]:
+    cp=cache_path(src)
+    if rebuild or not cp.exists(): return None
+    try: bank=CompiledBank(cp)
+    except (OSError, ValueError, struct.error): return None
+    if bank.matches(src): return bank
+    bank.close(); return None
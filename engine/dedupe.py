@@ -0,0 +1,156 @@
+from __future__ import annotations
+import argparse, hashlib, io, json, os, re, time, zlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+from .models import Question
+
+# Near-duplicate questions ("python -m engine.main dedupe", or --dedupe on an exam).
+# Each question is a set of word shingles over its normalized stem and sorted option
+# texts (so option order and letters do not matter). A MinHash signature of NUM_PERM
+# multiply-shift hashes estimates the Jaccard similarity of two sets, and LSH banding
+# (bands x rows picked for the threshold) buckets likely pairs. Every bucket member is
+# checked against the bucket's first row only and matches are unioned, so the work is
+# O(questions x bands), not pairwise. Signatures are cached per bank in
+# "<source>.minhash.npz", keyed by a hash of each question's text: an unchanged bank
+# is not re-read, and an edited one only re-signs the questions that changed.
+
+VERSION=1          # bump when shingling or hashing changes: cached signatures are then rebuilt
+NUM_PERM=128
+SHINGLE=3          # words per shingle
+THRESHOLD=0.7      # estimated Jaccard similarity that makes two questions duplicates
+SEED=1
+BATCH=1024         # questions hashed per numpy pass
+SUFFIX='.minhash.npz'
+_WORD=re.compile(r'[^\W_]+')
+
+console=Console()
+
+def sig_path(src:Path)->Path: return src.with_name(src.name+SUFFIX)
+
+def shingles(question:str, options:Sequence[str], k:int=SHINGLE)->List[str]:
+    """Word k-grams of the case-folded stem followed by the option texts in sorted order (so neither option
+    order nor letters matter); markdown and punctuation drop out. A text shorter than k words counts whole."""
+    w=_WORD.findall('\n'.join((question, *sorted(options))).casefold())
+    return [' '.join(g) for g in zip(*(w[i:] for i in range(k)))] or ([' '.join(w)] if w else [])
+
+def _content_key(question:str, options:Sequence[str])->int:
+    return int.from_bytes(hashlib.blake2b('\x1f'.join((question,*options)).encode('utf-8'), digest_size=8).digest(), 'little')
+
+def _perms(num_perm:int, seed:int)->Tuple[np.ndarray,np.ndarray]:
+    rng=np.random.default_rng(seed)
+    return rng.integers(1, 1<<63, num_perm, dtype=np.uint64)|np.uint64(1), rng.integers(0, 1<<63, num_perm, dtype=np.uint64)
+
+def signatures(sets:Sequence[Sequence[str]], num_perm:int=NUM_PERM, seed:int=SEED)->np.ndarray:
+    """(len(sets), num_perm) uint32 MinHash signatures: per hash, min of (a*crc32(shingle)+b mod 2**64)>>32."""
+    a,b=_perms(num_perm, seed); out=np.empty((len(sets),num_perm), np.uint32)
+    for s in range(0, len(sets), BATCH):
+        chunk=[x or ('',) for x in sets[s:s+BATCH]]; lens=np.fromiter(map(len,chunk), np.int64, len(chunk))
+        h=np.fromiter((zlib.crc32(t.encode('utf-8')) for x in chunk for t in x), np.uint64, int(lens.sum()))
+        v=np.multiply.outer(a, h); v+=b[:,None]   # (perm, shingle); uint64 wraps: multiply-shift hashing
+        # min before the shift: the top 32 bits of the smallest value are the smallest top 32 bits
+        out[s:s+len(chunk)]=(np.minimum.reduceat(v, np.concatenate(([0],np.cumsum(lens)[:-1])), axis=1)>>np.uint64(32)).T
+    return out
+
+def _stamp(src:Path)->List[int]:
+    st=src.stat(); return [st.st_size, st.st_mtime_ns]
+
+def _read_cache(p:Path, params:List[int])->Optional[Dict[str,np.ndarray]]:
+    try:
+        with np.load(p) as z: c={k:z[k] for k in ('params','stamp','keys','sigs')}
+    except (OSError, ValueError, KeyError): return None
+    return c if c['params'].tolist()==params else None
+
+def _write_cache(p:Path, **arrays:Any)->None:
+    buf=io.BytesIO(); np.savez(buf, **arrays); tmp=p.with_name(f'{p.name}.tmp{os.getpid()}')
+    try: tmp.write_bytes(buf.getvalue()); os.replace(tmp, p)
+    except OSError: pass   # read-only deck dir: signatures are recomputed next time
+
+def bank_signatures(qs:Sequence[Question], src:Optional[Path]=None, *, num_perm:int=NUM_PERM, k:int=SHINGLE, seed:int=SEED,
+                    use_cache:bool=True, stats:Optional[Dict[str,Any]]=None)->np.ndarray:
+    """Signatures for every question of ``qs`` (a bank loaded from ``src``), through the per-bank cache when possible."""
+    st=stats if stats is not None else {}; params=[VERSION,num_perm,k,seed]
+    cp=sig_path(src) if src is not None and use_cache else None
+    cache=_read_cache(cp, params) if cp is not None and cp.exists() else None
+    if cache is not None and cache['stamp'].tolist()==_stamp(src) and len(cache['keys'])==len(qs):
+        st.update(cache='hit', signed=0, reused=len(qs)); return cache['sigs']
+    texts=[(q.question, list(q.options.values())) for q in qs]
+    keys=np.fromiter((_content_key(t,o) for t,o in texts), np.uint64, len(texts))
+    sigs=np.empty((len(qs),num_perm), np.uint32); todo=list(range(len(qs)))
+    if cache is not None:
+        old={key:i for i,key in enumerate(cache['keys'].tolist())}; hit=[(r,old[key]) for r,key in enumerate(keys.tolist()) if key in old]
+        if hit: rows,src_rows=zip(*hit); sigs[list(rows)]=cache['sigs'][list(src_rows)]
+        done={r for r,_ in hit}; todo=[r for r in todo if r not in done]
+    if todo: sigs[todo]=signatures([shingles(*texts[r], k=k) for r in todo], num_perm, seed)
+    st.update(cache='off' if cp is None else 'partial' if cache is not None else 'rebuilt', signed=len(todo), reused=len(qs)-len(todo))
+    if cp is not None: _write_cache(cp, params=np.array(params), stamp=np.array(_stamp(src)), keys=keys, sigs=sigs)
+    return sigs
+
+def lsh_params(threshold:float, num_perm:int)->Tuple[int,int]:
+    """(bands, rows) dividing num_perm whose S-curve midpoint (1/bands)**(1/rows) is closest to ``threshold``."""
+    return min(((b,num_perm//b) for b in range(1,num_perm+1) if num_perm%b==0), key=lambda br: abs((1/br[0])**(1/br[1])-threshold))
+
+def clusters(sigs:np.ndarray, threshold:float=THRESHOLD)->List[List[int]]:
+    """Groups of rows (ascending, ordered by first row) whose signatures agree on at least ``threshold`` of their hashes."""
+    n,p=sigs.shape; bands,rows=lsh_params(threshold, p); parent:Dict[int,int]={}; ids=np.arange(n)
+    def find(x:int)->int:
+        root=x
+        while parent.get(root,root)!=root: root=parent[root]
+        while x!=root: parent[x],x=root,parent[x]
+        return root
+    for i in range(bands):
+        h=np.zeros(n, np.uint64)
+        for col in sigs[:,i*rows:(i+1)*rows].T: h=h*np.uint64(0x100000001B3)^col   # band -> bucket key (FNV-style)
+        _,first,inv=np.unique(h, return_index=True, return_inverse=True); rep=first[inv.ravel()]
+        cand=ids[rep!=ids]
+        if not len(cand): continue
+        sim=(sigs[cand]==sigs[rep[cand]]).mean(axis=1)   # bucket keys may collide: every candidate is verified
+        for a,b in zip(cand[sim>=threshold].tolist(), rep[cand[sim>=threshold]].tolist()):
+            ra,rb=find(a),find(b)
+            if ra!=rb: parent[max(ra,rb)]=min(ra,rb)
+    groups:Dict[int,List[int]]={}
+    for r in sorted(parent): groups.setdefault(find(r),[]).append(r)
+    return sorted((sorted({root,*g}) for root,g in groups.items()), key=lambda g: g[0])
+
+def find_duplicates(qs:Sequence[Question], src:Optional[Path]=None, *, threshold:float=THRESHOLD, num_perm:int=NUM_PERM,
+                    use_cache:bool=True, stats:Optional[Dict[str,Any]]=None)->List[List[int]]:
+    """Near-duplicate clusters of ``qs`` as row groups; pass ``stats`` for cache use and timings."""
+    st=stats if stats is not None else {}; t0=time.perf_counter()
+    sigs=bank_signatures(qs, src, num_perm=num_perm, use_cache=use_cache, stats=st); t1=time.perf_counter()
+    out=clusters(sigs, threshold)
+    st.update(sign_ms=(t1-t0)*1000, cluster_ms=(time.perf_counter()-t1)*1000, clusters=len(out), duplicates=sum(len(g)-1 for g in out))
+    return out
+
+def threshold_arg(s:str)->float:
+    """argparse type for a similarity threshold in (0, 1]: at 0 every question would match every other."""
+    try: t=float(s)
+    except ValueError: t=-1.0
+    if not 0<t<=1: raise argparse.ArgumentTypeError(f'expected a similarity in (0, 1], got {s!r}')
+    return t
+
+def main(argv:Optional[List[str]]=None)->None:
+    from .loader import load_questions
+    p=argparse.ArgumentParser(prog='engine.main dedupe', description='Find near-duplicate questions (MinHash/LSH over question and option text)')
+    p.add_argument('questions_file', type=str, help='.jsonl, .jsonl.gz or .zip deck')
+    p.add_argument('--threshold', type=threshold_arg, default=THRESHOLD, help='Estimated Jaccard similarity of shingle sets that counts as a duplicate')
+    p.add_argument('--num-perm', type=int, default=NUM_PERM, help='MinHash signature length (more: finer estimates, slower)')
+    p.add_argument('--no-cache', action='store_true', help=f'Do not read or write the signature cache (<questions-file>{SUFFIX})')
+    p.add_argument('--show', type=int, default=10, help='Print this many of the largest clusters')
+    p.add_argument('--json', type=str, default='', help='Write all clusters (question ids) to this file')
+    args=p.parse_args(argv)
+    src=Path(args.questions_file); bank=load_questions(src, use_cache=not args.no_cache); st:Dict[str,Any]={}
+    groups=find_duplicates(bank, src, threshold=args.threshold, num_perm=args.num_perm, use_cache=not args.no_cache, stats=st)
+    console.print(f"{len(bank)} questions • signatures: {st['signed']} computed, {st['reused']} cached ({st['cache']}) in {st['sign_ms']:.1f} ms • clustering {st['cluster_ms']:.1f} ms")
+    console.print(f"[bold]{st['clusters']}[/bold] near-duplicate clusters covering {st['clusters']+st['duplicates']} questions ({st['duplicates']} redundant)")
+    if groups and args.show:
+        t=Table(title=f'Largest Clusters (threshold {args.threshold:g})'); t.add_column('Size'); t.add_column('IDs'); t.add_column('Domains'); t.add_column('Question')
+        for g in sorted(groups, key=len, reverse=True)[:args.show]:
+            qs=[bank[r] for r in g]; ids=', '.join(str(q.id) for q in qs[:8])+(' …' if len(g)>8 else '')
+            t.add_row(str(len(g)), ids, ', '.join(sorted({q.domain for q in qs})), qs[0].question[:70])
+        console.print(t)
+    if args.json:
+        Path(args.json).write_text(json.dumps({'threshold':args.threshold,'clusters':[[bank[r].id for r in g] for g in groups]}, indent=2), encoding='utf-8')
+        console.print(f'[green]Saved clusters to[/green] {args.json}')
+    bank.close()
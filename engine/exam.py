@@ -1,53 +1,102 @@
 from __future__ import annotations
-import time
-from typing import Callable, List, Dict
+import random, time
+from typing import Any, Callable, List, Dict, Optional, Tuple
 from .models import Question, SessionConfig, AnswerRecord
-from .analytics import compute_domain_stats
+from .adaptive import make_adaptive
+from .options import OptionOrder, answer_keys
+from .profiling import phase
 
 class ExamSession:
-    def __init__(self, questions:List[Question], config:SessionConfig)->None:
+    def __init__(self, questions:List[Question], config:SessionConfig, *, rng:Any=None, item_history:Optional[Dict[int,Tuple[int,int]]]=None, clock:Callable[[],float]=time.time, journal:Any=None)->None:
         self.original_pool=questions[:]
         self.questions=questions[:]
         self.config=config
         self.answers:List[AnswerRecord]=[]
         self.start_epoch=None; self.deadline_epoch=None
         self.current_index=0
+        self.rng=rng; self.item_history=item_history; self.adaptive=None; self.clock=clock
+        self.pending:Question|None=None; self.paused=False; self.shown_at:Optional[float]=None
+        self.journal=journal; self._adaptive_state:Optional[Dict[str,Any]]=None
+        # option permutations come from (seed, question id); an unseeded session draws its own seed so the order can be saved
+        self.options=OptionOrder((config.seed if config.seed is not None else (rng or random).getrandbits(32)) if config.shuffle_options else None)
     def start(self)->None:
-        self.start_epoch=time.time(); self.deadline_epoch=self.start_epoch+(self.config.time_limit_minutes*60)
+        self.start_epoch=self.clock(); self.deadline_epoch=self.start_epoch+(self.config.time_limit_minutes*60)
     def remaining_seconds(self)->int:
         if self.deadline_epoch is None: return self.config.time_limit_minutes*60
-        return max(0,int(self.deadline_epoch-time.time()))
+        return max(0,int(self.deadline_epoch-self.clock()))
     def is_time_up(self)->bool: return self.remaining_seconds()<=0
     def _pick_next_adaptive(self)->Question|None:
-        if not self.questions: return None
-        st=compute_domain_stats(self.answers)
-        dom_w={}
-        for q in self.questions:
-            d=st.get(q.domain,{"correct":0,"total":0}); acc=(d['correct']/d['total']) if d['total'] else 0.5
-            dom_w[q.domain]=1.0-acc
-        total=sum(dom_w.values()) or 1.0
-        from random import choices
-        by={};
-        for q in self.questions: by.setdefault(q.domain,[]).append(q)
-        doms=list(by.keys()); weights=[(dom_w[d]/total) for d in doms]
-        chosen=choices(doms,weights,k=1)[0]
-        for i,q in enumerate(self.questions):
-            if q.domain==chosen: return self.questions.pop(i)
-        return self.questions.pop(0)
+        # picker state (per-domain queues/counters or IRT bins) is built once, then kept current by submit()
+        if self.adaptive is None:
+            done={a.question_id for a in self.answers}; by_id={q.id:q for q in self.questions}
+            if self.pending is not None: done.add(self.pending.id)
+            self.adaptive=make_adaptive(self.config.adaptive_mode, [q for q in self.questions if q.id not in done], item_history=self.item_history, rng=self.rng)
+            # a restored picker state covers the first 'answered' answers; only later ones are replayed
+            done_upto=0
+            if self._adaptive_state is not None:
+                self.adaptive.load_state(self._adaptive_state['state']); done_upto=self._adaptive_state['answered']; self._adaptive_state=None
+            for a in self.answers[done_upto:]:
+                if a.question_id in by_id: self.adaptive.update(by_id[a.question_id], a.is_correct)
+        return self.adaptive.next()
     def _pick_next_linear(self)->Question|None:
         if self.current_index>=len(self.questions): return None
         q=self.questions[self.current_index]; self.current_index+=1; return q
-    def run(self, ui_ask:Callable[[Question,int,int,int],str], ui_feedback:Callable[[bool,Question],None])->None:
-        self.start(); total=len(self.questions); answered=0
+    def next_question(self)->Question|None:
+        """The question to show now: the one still awaiting an answer, else a freshly picked one."""
+        if self.pending is None and len(self.answers)<len(self.questions) and not self.is_time_up():
+            self.pending=self._pick_next_adaptive() if self.config.adaptive else self._pick_next_linear()
+        if self.pending is not None and self.shown_at is None: self.shown_at=self.clock()
+        return self.pending
+    def upcoming(self, n:int)->List[Question]:
+        """Up to ``n`` questions in the order they will be shown, the pending one first. Adaptive picks are not known ahead."""
+        out=[self.pending] if self.pending is not None else []
+        if not self.config.adaptive: out+=self.questions[self.current_index:self.current_index+n]
+        return out[:n]
+    def submit(self, q:Question, choice:str)->bool:
+        """Record ``choice`` (display letters, e.g. "B" or "A,C") for ``q``; graded and stored in bank keys."""
+        chosen=self.options.to_source(q, choice.upper()); correct=set(answer_keys(chosen))==set(answer_keys(q.answer))
+        lat=None if self.shown_at is None else round((self.clock()-self.shown_at)*1000,1); self.shown_at=None
+        rec=AnswerRecord(q.id, chosen, q.answer, correct, q.domain, lat); self.answers.append(rec)
+        if self.adaptive is not None: self.adaptive.update(q, correct)
+        if self.pending is q: self.pending=None
+        if self.journal is not None: self.journal.record(self, rec)
+        return correct
+    def snapshot(self)->Dict[str,Any]:
+        """JSON-safe state: enough, with the bank, to rebuild this session via restore()."""
+        st=self.rng.getstate() if hasattr(self.rng,'getstate') else None
+        return {'ids':[q.id for q in self.questions],'answers':[a.__dict__ for a in self.answers],'index':self.current_index,
+                'start':self.start_epoch,'deadline':self.deadline_epoch,'pending':None if self.pending is None else self.pending.id,
+                'rng':None if st is None else [st[0],list(st[1]),st[2]],'options':self.options.state(),
+                'adaptive':self._adaptive_state if self.adaptive is None else {'state':self.adaptive.state(),'answered':len(self.answers)}}
+    def restore(self, snap:Dict[str,Any], by_id:Dict[int,Question])->None:
+        missing=[i for i in snap['ids'] if i not in by_id]
+        if missing: raise ValueError(f"{len(missing)} of {len(snap['ids'])} questions are not in this bank (ids {', '.join(map(str,missing[:5]))}{' …' if len(missing)>5 else ''})")
+        self.questions=[by_id[i] for i in snap['ids']]; self.original_pool=self.questions[:]
+        self.answers=[a if isinstance(a,AnswerRecord) else AnswerRecord(**a) for a in snap.get('answers',[])]; self.current_index=snap.get('index',0)
+        self.start_epoch=snap.get('start'); self.deadline_epoch=snap.get('deadline')
+        self.pending=by_id.get(snap['pending']) if snap.get('pending') is not None else None; self.shown_at=None
+        if snap.get('rng') is not None and hasattr(self.rng,'setstate'):
+            v,state,g=snap['rng']; self.rng.setstate((v,tuple(state),g))
+        if 'options' in snap: self.options=OptionOrder.from_state(snap['options'])
+        self.adaptive=None; self._adaptive_state=snap.get('adaptive')   # picker rebuilt lazily from the restored answers
+    def run(self, ui_ask:Callable[[Question,int,int,int],Optional[str]], ui_feedback:Callable[[bool,Question],None])->None:
+        """Ask until done or out of time. ``ui_ask`` returns display letters, "P" to pause, or None/"" when the
+        deadline passed with the prompt open (the question is then recorded unanswered)."""
+        if self.deadline_epoch is None: self.start()
+        total=len(self.questions)
         while not self.is_time_up():
-            q=self._pick_next_adaptive() if self.config.adaptive else self._pick_next_linear()
+            q=self.next_question()
             if q is None: break
-            remaining=self.remaining_seconds(); choice=ui_ask(q, answered+1, total, remaining)
+            remaining=self.remaining_seconds()
+            with phase('question', 'question', id=q.id, domain=q.domain): choice=ui_ask(q, len(self.answers)+1, total, remaining)
+            if not choice:
+                # the deadline passed with the prompt open: auto-submit it unanswered
+                self.submit(q, ''); break
             if choice.upper()=='P':
-                if not self.config.adaptive: self.current_index-=1
-                continue
-            correct=(choice.upper()==q.answer.upper())
-            self.answers.append(AnswerRecord(q.id, choice.upper(), q.answer.upper(), correct, q.domain))
-            answered+=1
-            if self.config.reveal_mode=='after': ui_feedback(correct, q)
-            if answered>=total: break
+                # pause: the pending question stays pending and is asked first on resume
+                self.paused=True
+                if self.journal is not None: self.journal.checkpoint(self)
+                return
+            correct=self.submit(q, choice)
+            if self.config.reveal_mode=='after':
+                with phase('feedback'): ui_feedback(correct, q)
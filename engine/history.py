@@ -0,0 +1,185 @@
+from __future__ import annotations
+import json, os, sqlite3, struct
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from rich.console import Console
+
+# Pluggable history backends. Both are append-only, lock around writes so that
+# concurrent runs for the same user cannot lose records, and answer range
+# queries by user and timestamp without loading the whole history.
+
+When=Union[str,datetime,float,None]
+SQLITE_SUFFIXES={'.db','.sqlite','.sqlite3'}
+
+console=Console(stderr=True)
+
+def to_epoch(v:When)->Optional[float]:
+    if v is None or isinstance(v,(int,float)): return v
+    if isinstance(v,str): v=datetime.fromisoformat(v)
+    if v.tzinfo is None: v=v.replace(tzinfo=timezone.utc)
+    return v.timestamp()
+
+if os.name=='nt':
+    import msvcrt
+    def _lock(f)->None:
+        f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+    def _unlock(f)->None:
+        f.seek(0); msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+    def _lock(f)->None: fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    def _unlock(f)->None: fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _still_linked(f, path:Path)->bool:
+    try: return os.path.samestat(os.fstat(f.fileno()), os.stat(path))
+    except FileNotFoundError: return False
+
+@contextmanager
+def file_lock(path:Path)->Iterator[None]:
+    """Exclusive advisory lock on ``path``, held for the with-block. The lock file is created on entry and
+    removed on release; a waiter that wakes up holding a file already unlinked retries on the new one.
+    (Windows cannot delete a file another process has open: there it may outlive the lock.)"""
+    while True:
+        f=path.open('a+b')
+        try:
+            _lock(f)
+            if os.name=='nt' or _still_linked(f, path): break
+            _unlock(f)
+        except BaseException: f.close(); raise
+        f.close()
+    try: yield
+    finally:
+        try: path.unlink()   # before unlocking, so nobody can lock this file after we let go
+        except OSError: pass
+        _unlock(f); f.close()
+
+class HistoryStore(ABC):
+    def append(self, rec:Dict[str,Any])->None: self.append_many([rec])
+    @abstractmethod
+    def append_many(self, recs:Iterable[Dict[str,Any]])->int: ...
+    @abstractmethod
+    def query(self, user:Optional[str]=None, since:When=None, until:When=None, start:int=0)->Iterator[Dict[str,Any]]:
+        """Records in append order, optionally limited to one user and a [since, until] window.
+        ``start`` skips the first N records of the store (for incremental readers)."""
+    @abstractmethod
+    def count(self)->int: ...
+    def close(self)->None: pass
+    def __enter__(self)->'HistoryStore': return self
+    def __exit__(self,*exc)->None: self.close()
+
+class JsonlHistoryStore(HistoryStore):
+    """One JSON record per line in ``path`` plus a fixed-width ``<path>.idx`` of
+    (offset, length, epoch) so date-range queries and incremental reads seek
+    straight to the records they need."""
+    _IDX=struct.Struct('<QId')
+    def __init__(self, path:Path, fsync:bool=True)->None:
+        self.path=path; self.idx_path=path.with_name(path.name+'.idx'); self.lock_path=path.with_name(path.name+'.lock'); self.fsync=fsync
+        path.parent.mkdir(parents=True, exist_ok=True)
+    def _entries(self)->List[tuple]:
+        if not self.idx_path.exists(): return []
+        raw=self.idx_path.read_bytes(); n=len(raw)//self._IDX.size
+        return list(self._IDX.iter_unpack(raw[:n*self._IDX.size]))
+    def _repair(self)->None:
+        # called under the lock: index any records a crashed writer logged but never indexed,
+        # and cut a torn trailing line so the next append starts on a clean boundary
+        ents=self._entries(); end=(ents[-1][0]+ents[-1][1]) if ents else 0
+        size=self.path.stat().st_size if self.path.exists() else 0
+        if self.idx_path.exists() and self.idx_path.stat().st_size!=len(ents)*self._IDX.size:
+            with self.idx_path.open('r+b') as f: f.truncate(len(ents)*self._IDX.size)
+        if size<=end: return
+        with self.path.open('r+b') as f, self.idx_path.open('ab') as ix:
+            f.seek(end); off=end
+            for line in f:
+                if not line.endswith(b'\n'): f.truncate(off); break
+                try: ts=to_epoch(json.loads(line).get('timestamp')) or 0.0
+                except ValueError: ts=0.0
+                ix.write(self._IDX.pack(off,len(line),ts)); off+=len(line)
+    def append_many(self, recs:Iterable[Dict[str,Any]])->int:
+        recs=list(recs); lines=[(json.dumps(r, ensure_ascii=False)+'\n').encode('utf-8') for r in recs]
+        if not lines: return 0
+        with file_lock(self.lock_path):
+            self._repair()
+            with self.path.open('ab') as f, self.idx_path.open('ab') as ix:
+                off=f.tell(); f.write(b''.join(lines)); f.flush()
+                if self.fsync: os.fsync(f.fileno())
+                for line,r in zip(lines,recs):
+                    ix.write(self._IDX.pack(off,len(line),to_epoch(r.get('timestamp')) or 0.0)); off+=len(line)
+                ix.flush()
+                if self.fsync: os.fsync(ix.fileno())
+        return len(lines)
+    def count(self)->int:
+        return (self.idx_path.stat().st_size//self._IDX.size) if self.idx_path.exists() else 0
+    def query(self, user:Optional[str]=None, since:When=None, until:When=None, start:int=0)->Iterator[Dict[str,Any]]:
+        lo,hi=to_epoch(since),to_epoch(until)
+        ents=[e for e in self._entries()[start:] if (lo is None or e[2]>=lo) and (hi is None or e[2]<=hi)]
+        if not ents: return
+        with self.path.open('rb') as f:
+            for off,ln,_ in ents:
+                f.seek(off); rec=json.loads(f.read(ln))
+                if user is None or rec.get('user')==user: yield rec
+
+class SqliteHistoryStore(HistoryStore):
+    """History rows in SQLite (WAL mode), indexed on (user, ts); the whole record is kept as JSON."""
+    def __init__(self, path:Path)->None:
+        path.parent.mkdir(parents=True, exist_ok=True); self.path=path
+        self.db=sqlite3.connect(str(path), timeout=30.0)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS history(seq INTEGER PRIMARY KEY AUTOINCREMENT, user TEXT NOT NULL, ts REAL NOT NULL, record TEXT NOT NULL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS history_user_ts ON history(user, ts)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS history_ts ON history(ts)')
+        self.db.commit()
+    def append_many(self, recs:Iterable[Dict[str,Any]])->int:
+        rows=[(r.get('user',''), to_epoch(r.get('timestamp')) or 0.0, json.dumps(r, ensure_ascii=False)) for r in recs]
+        with self.db:   # one transaction: all or nothing
+            self.db.executemany('INSERT INTO history(user, ts, record) VALUES (?,?,?)', rows)
+        return len(rows)
+    def count(self)->int: return self.db.execute('SELECT COUNT(*) FROM history').fetchone()[0]
+    def query(self, user:Optional[str]=None, since:When=None, until:When=None, start:int=0)->Iterator[Dict[str,Any]]:
+        # rows are never deleted, so seq numbers records 1..N in append order
+        sql='SELECT record FROM history WHERE seq>?'; args:List[Any]=[start]
+        if user is not None: sql+=' AND user=?'; args.append(user)
+        if since is not None: sql+=' AND ts>=?'; args.append(to_epoch(since))
+        if until is not None: sql+=' AND ts<=?'; args.append(to_epoch(until))
+        for (rec,) in self.db.execute(sql+' ORDER BY seq', args): yield json.loads(rec)
+    def close(self)->None: self.db.close()
+
+def open_history_store(path:Path)->HistoryStore:
+    """Backend is chosen by suffix: .db/.sqlite/.sqlite3 -> SQLite, anything else -> JSONL log."""
+    if path.suffix.lower() in SQLITE_SUFFIXES: return SqliteHistoryStore(path)
+    return JsonlHistoryStore(path)
+
+def _record_key(rec:Dict[str,Any])->str: return json.dumps(rec, sort_keys=True, ensure_ascii=False)
+
+def migrate_json_history(src:Path, store:HistoryStore)->int:
+    """One-shot import of a legacy ``history_<user>.json`` array. The source is renamed to
+    ``*.migrated`` afterwards so the import never runs twice; returns the records moved. A file
+    that is corrupt or not an array of records is set aside as ``*.bak.json`` (as the old JSON
+    writer did) so it cannot block later opens. ``*.migrating`` holds the store's size before
+    the import until the rename is done: a run that died in between is finished without
+    appending the records it already wrote a second time."""
+    if not src.exists(): return 0
+    marker=src.with_name(src.name+'.migrating')
+    with file_lock(src.with_name(src.name+'.lock')):
+        if not src.exists(): return 0   # another process got here first
+        try: recs=json.loads(src.read_text(encoding='utf-8') or '[]'); bad='' if isinstance(recs,list) and all(isinstance(r,dict) for r in recs) else 'not an array of history records'
+        except json.JSONDecodeError as e: bad=f'invalid JSON ({e})'
+        if bad:
+            bak=src.with_suffix('.bak.json'); src.replace(bak)
+            console.print(f'[yellow]Cannot migrate history file {src}: {bad}. Moved to {bak}; nothing migrated[/yellow]'); return 0
+        if marker.exists():
+            done={_record_key(r) for r in store.query(start=int(marker.read_text(encoding='utf-8') or 0))}
+            recs=[r for r in recs if _record_key(r) not in done]
+        else: marker.write_text(str(store.count()), encoding='utf-8')
+        n=store.append_many(recs); src.replace(src.with_name(src.name+'.migrated')); marker.unlink()
+    return n
+
+def open_history(path:Path, legacy:Optional[Path]=None)->HistoryStore:
+    """Open the store for ``path``, first folding in a legacy JSON array file if one exists.
+    A ``.json`` path is itself treated as legacy and served from the ``.jsonl`` next to it."""
+    if path.suffix.lower()=='.json': legacy=legacy or path; path=path.with_suffix('.jsonl')
+    store=open_history_store(path)
+    if legacy is not None: migrate_json_history(legacy, store)
+    return store
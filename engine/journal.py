@@ -0,0 +1,95 @@
+from __future__ import annotations
+import json, os, time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .exam import ExamSession
+from .models import AnswerRecord, Question, SessionConfig
+
+# Crash-safe pause/resume for the CLI. A session is two files:
+#   <state>.json          compact checkpoint: config, selection ids, option seed and
+#                         permutations, RNG state, adaptive picker state, time left, and
+#                         the run's user, bank and history store (so --resume alone is enough)
+#   <state>.json.journal  one JSON line per answer, appended as it is given
+# Every journal line is flushed to the OS at once (a crash of the process loses
+# nothing); fsync is batched (every FSYNC_EVERY answers or FSYNC_SECONDS, and at
+# each checkpoint), so power loss costs at most one batch. Checkpoints are written
+# at start, on pause and every CHECKPOINT_EVERY answers. Resume loads the checkpoint
+# and replays the journal over it, O(answers).
+
+VERSION=1
+FSYNC_EVERY=8
+FSYNC_SECONDS=1.0
+CHECKPOINT_EVERY=100
+
+def journal_path(state:Path)->Path: return state.with_name(state.name+'.journal')
+
+def _write_atomic(p:Path, data:str)->None:
+    tmp=p.with_name(f'{p.name}.tmp{os.getpid()}')
+    with tmp.open('w',encoding='utf-8') as f: f.write(data); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, p)
+
+class SessionJournal:
+    def __init__(self, state:Path, *, meta:Optional[Dict[str,Any]]=None, fsync_every:int=FSYNC_EVERY, fsync_seconds:float=FSYNC_SECONDS,
+                 checkpoint_every:int=CHECKPOINT_EVERY)->None:
+        self.path=state; self.jpath=journal_path(state); self.meta=meta or {}; self.fsync_every=fsync_every; self.fsync_seconds=fsync_seconds
+        self.checkpoint_every=checkpoint_every; self._f=None; self.unsynced=0; self.last_sync=time.monotonic()
+    def open(self, *, fresh:bool)->'SessionJournal':
+        """Open the journal for appending; ``fresh`` starts a new session (drops any old journal)."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f=self.jpath.open('w' if fresh else 'a', encoding='utf-8'); return self
+    def record(self, sess:ExamSession, rec:AnswerRecord)->None:
+        n=len(sess.answers)
+        self._f.write(json.dumps({'n':n,**rec.__dict__,'remaining':sess.remaining_seconds()}, separators=(',',':'))+'\n'); self._f.flush()
+        self.unsynced+=1
+        if self.unsynced>=self.fsync_every or time.monotonic()-self.last_sync>=self.fsync_seconds: self.sync()
+        if n%self.checkpoint_every==0: self.checkpoint(sess)
+    def sync(self)->None:
+        if self._f is not None and self.unsynced: os.fsync(self._f.fileno())
+        self.unsynced=0; self.last_sync=time.monotonic()
+    def checkpoint(self, sess:ExamSession)->None:
+        self.sync(); snap=sess.snapshot(); n=len(snap.pop('answers'))   # answers live in the journal
+        doc={'version':VERSION,'meta':self.meta,'config':sess.config.__dict__,'answered':n,'remaining':sess.remaining_seconds(),**snap}
+        _write_atomic(self.path, json.dumps(doc, separators=(',',':')))
+    def close(self)->None:
+        if self._f is not None: self.sync(); self._f.close(); self._f=None
+    def discard(self)->None:
+        """The session finished: remove its checkpoint and journal."""
+        self.close()
+        for p in (self.path, self.jpath):
+            try: p.unlink()
+            except FileNotFoundError: pass
+
+def read_journal(p:Path)->Tuple[List[AnswerRecord],Optional[int]]:
+    """Answers in order, and the time left at the last one. A torn last line (crash mid-write) is ignored."""
+    out:List[AnswerRecord]=[]; remaining=None
+    if not p.exists(): return out, remaining
+    with p.open('r',encoding='utf-8') as f:
+        for line in f:
+            try: d=json.loads(line)
+            except ValueError: break
+            if d.get('n')!=len(out)+1: continue   # duplicate of a line already replayed
+            out.append(AnswerRecord(d['question_id'], d['chosen'], d['correct'], d['is_correct'], d['domain'], d.get('latency_ms'))); remaining=d.get('remaining')
+    return out, remaining
+
+def read_checkpoint(state:Path)->Dict[str,Any]:
+    ckpt=json.loads(state.read_text(encoding='utf-8'))
+    if not isinstance(ckpt,dict) or ckpt.get('version')!=VERSION or 'ids' not in ckpt: raise ValueError(f'not a session checkpoint: {state}')
+    return ckpt
+
+def resume_session(state:Path, by_id:Dict[int,Question], *, rng:Any=None, item_history:Optional[Dict[int,Tuple[int,int]]]=None,
+                   clock:Callable[[],float]=time.time)->ExamSession:
+    """Rebuild a paused or crashed session from its checkpoint + journal. The clock restarts
+    from the time left when the last answer (or the pause) was recorded. ValueError if the
+    checkpoint is unreadable or names questions that ``by_id`` does not have."""
+    ckpt=read_checkpoint(state)
+    answers,remaining=read_journal(journal_path(state))
+    snap=dict(ckpt); snap['answers']=answers
+    if len(answers)!=ckpt['answered']:
+        # answers after the last checkpoint: what was pending then has been answered
+        snap['pending']=None; snap['index']=len(answers) if not ckpt['config'].get('adaptive') else ckpt['index']
+    else: remaining=ckpt['remaining']
+    sess=ExamSession([], SessionConfig(**ckpt['config']), rng=rng, item_history=item_history, clock=clock)
+    sess.restore(snap, by_id)
+    left=remaining if remaining is not None else ckpt['remaining']
+    sess.start_epoch=clock(); sess.deadline_epoch=sess.start_epoch+left
+    return sess
@@ -1,28 +1,169 @@
 from __future__ import annotations
-import json
+import gzip, hashlib, io, json, os, posixpath, tempfile, threading, time, zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
 from .models import Question
+from .options import MAX_OPTIONS, MIN_OPTIONS, normalize_answer
+from .bank import QuestionBank
+from .compiled import CompiledBank, cache_path, open_compiled, write_compiled
 
-def load_questions(p:Path)->List[Question]:
+CHUNK_LINES=5000
+PARALLEL_MIN_BYTES=8<<20   # switch to the process pool once this much text has been read
+MEDIA_CACHE_SIZE=4096
+
+class LRU:
+    """Bounded mapping that drops the least recently used entry; safe to share between threads."""
+    def __init__(self, maxsize:int)->None:
+        self.maxsize=maxsize; self._d:OrderedDict=OrderedDict(); self._lock=threading.Lock()
+    def get(self, key:Any, default:Any=None)->Any:
+        with self._lock:
+            if key not in self._d: return default
+            self._d.move_to_end(key); return self._d[key]
+    def put(self, key:Any, value:Any)->None:
+        with self._lock:
+            self._d[key]=value; self._d.move_to_end(key)
+            while len(self._d)>self.maxsize: self._d.popitem(last=False)
+    def __len__(self)->int: return len(self._d)
+
+_MISSING=object()
+_media_cache=LRU(MEDIA_CACHE_SIZE)   # (root, media path) -> resolved file or None
+
+def is_archive(p:Path)->bool: return p.suffix.lower()=='.zip'
+
+def parse_question(obj:Dict[str,Any])->Question:
+    opts=obj['options']
+    if not isinstance(opts,dict) or not MIN_OPTIONS<=len(opts)<=MAX_OPTIONS: raise ValueError(f'need {MIN_OPTIONS}-{MAX_OPTIONS} options')
+    ans=normalize_answer(obj['answer'], opts)
+    return Question(
+        id=int(obj['id']), domain=obj['domain'], type=obj.get('type','multi' if ',' in ans else 'mcq'),
+        question=obj['question'], options=opts, answer=ans,
+        answer_text=obj.get('answer_text',''), tags=obj.get('tags',[]),
+        difficulty=obj.get('difficulty'), media=obj.get('media',[])
+    )
+
+def _parse_chunk(job:Tuple[str,int,List[str]])->Tuple[List[Question],List[str]]:
+    name,first,lines=job; out=[]; errs=[]
+    for n,line in enumerate(lines, first):
+        if not line.strip(): continue
+        try: out.append(parse_question(json.loads(line)))
+        except KeyError as e: errs.append(f'{name}:{n}: missing field {e}')
+        except (ValueError, TypeError) as e: errs.append(f'{name}:{n}: {e}')
+    return out, errs
+
+def _jsonl_members(zf:zipfile.ZipFile)->List[zipfile.ZipInfo]:
+    return sorted((i for i in zf.infolist() if not i.is_dir() and i.filename.lower().endswith('.jsonl')), key=lambda i: i.filename)
+
+@contextmanager
+def _open_streams(p:Path)->Iterator[List[Tuple[str,TextIO]]]:
+    """Yield (label, text stream) pairs for a .jsonl, .jsonl.gz or .zip source without extracting anything."""
+    if is_archive(p):
+        with zipfile.ZipFile(p) as zf:
+            streams=[(f'{p.name}!{i.filename}', io.TextIOWrapper(zf.open(i), encoding='utf-8')) for i in _jsonl_members(zf)]
+            if not streams: raise ValueError(f'no .jsonl members in {p}')
+            try: yield streams
+            finally:
+                for _,s in streams: s.close()
+    elif p.suffix.lower()=='.gz':
+        with gzip.open(p,'rt',encoding='utf-8') as f: yield [(p.name,f)]
+    else:
+        with p.open('r',encoding='utf-8') as f: yield [(p.name,f)]
+
+def _chunks(label:str, f:TextIO, size:int)->Iterator[Tuple[str,int,List[str]]]:
+    first=1; buf=[]
+    for line in f:
+        buf.append(line)
+        if len(buf)>=size: yield label,first,buf; first+=len(buf); buf=[]
+    if buf: yield label,first,buf
+
+def _parse_stream(p:Path, errors:List[str], workers:Optional[int])->List[Question]:
+    workers=workers if workers is not None else (os.cpu_count() or 1)
+    out:List[Question]=[]; seen=0; pool=None; pending:deque=deque()
+    def drain(limit:int)->None:
+        while len(pending)>limit:
+            qs,errs=pending.popleft().result(); out.extend(qs); errors.extend(errs)
+    try:
+        with _open_streams(p) as streams:
+            for label,f in streams:
+                for job in _chunks(label, f, CHUNK_LINES):
+                    if pool is None and workers>1 and seen>=PARALLEL_MIN_BYTES: pool=ProcessPoolExecutor(max_workers=workers)
+                    if pool is None:
+                        qs,errs=_parse_chunk(job); out.extend(qs); errors.extend(errs)
+                        seen+=sum(map(len,job[2]))
+                    else:
+                        # keep a bounded window in flight so huge members stream instead of being read up front
+                        pending.append(pool.submit(_parse_chunk, job)); drain(2*workers)
+            drain(0)
+    finally:
+        if pool is not None: pool.shutdown(cancel_futures=True)
+    return out
+
+def load_questions(p:Path, *, use_cache:bool=True, rebuild_cache:bool=False, stats:Optional[Dict[str,Any]]=None, workers:Optional[int]=None,
+                   dedupe:Optional[float]=None)->QuestionBank:
+    """Load a question bank from .jsonl, .jsonl.gz or a .zip deck, going through the compiled .qbc sidecar when possible.
+
+    The sidecar is reused while the source's size/mtime (or, failing that, its hash)
+    is unchanged and rebuilt otherwise. Bad lines do not abort the load: they are
+    skipped and reported as "<member>:<line>: <message>" in ``stats['errors']``.
+    Pass a dict as ``stats`` to get timings and errors back.
+    The result is a QuestionBank over the mapped sidecar (a temporary one when no
+    cache can be used), so question text is only decoded when it is read.
+    With ``dedupe`` (a similarity threshold) near-duplicate clusters are found
+    (engine.dedupe, signatures cached next to the source) and kept in ``bank.clusters``.
+    """
     if not p.exists():
         raise FileNotFoundError(p)
-    out=[]
-    with p.open('r',encoding='utf-8') as f:
-        for line in f:
-            if not line.strip():
-                continue
-            obj=json.loads(line)
-            q=Question(
-                id=int(obj['id']), domain=obj['domain'], type=obj.get('type','mcq'),
-                question=obj['question'], options=obj['options'], answer=str(obj['answer']).upper(),
-                answer_text=obj.get('answer_text',''), tags=obj.get('tags',[]),
-                difficulty=obj.get('difficulty'), media=obj.get('media',[])
-            )
-            if q.answer not in q.options: raise ValueError('bad answer')
-            out.append(q)
+    t0=time.perf_counter(); st=stats if stats is not None else {}; errors:List[str]=[]
+    compiled=open_compiled(p, rebuild=rebuild_cache) if use_cache else None
+    if compiled is not None:
+        out=QuestionBank(compiled); st.update(cache='hit', parse_ms=0.0)
+    else:
+        qs=_parse_stream(p, errors, workers); st['parse_ms']=(time.perf_counter()-t0)*1000; st['cache']='off'; out=None
+        # a bank with bad lines is not cached, so the errors keep being reported until the source is fixed
+        if use_cache and not errors:
+            try: write_compiled(qs, cache_path(p), p); out=QuestionBank(CompiledBank(cache_path(p))); st['cache']='rebuilt'
+            except OSError: st['cache']='unwritable'
+        if out is None: out=QuestionBank.from_questions(qs, p)
+    if dedupe is not None:
+        from .dedupe import find_duplicates
+        st['dedupe']={}; out.clusters=find_duplicates(out, p, threshold=dedupe, use_cache=use_cache, stats=st['dedupe'])
+    st['count']=len(out); st['errors']=errors; st['total_ms']=(time.perf_counter()-t0)*1000
     return out
 
 def load_metadata(p:Path)->Dict:
     if not p.exists(): raise FileNotFoundError(p)
+    if is_archive(p):
+        with zipfile.ZipFile(p) as zf:
+            names=[n for n in zf.namelist() if posixpath.basename(n)=='metadata.json']
+            if not names: raise FileNotFoundError(f'{p}!metadata.json')
+            return json.loads(zf.read(min(names, key=len)).decode('utf-8'))
     return json.loads(p.read_text(encoding='utf-8'))
+
+def _extract_member(archive:Path, rel:str)->Optional[Path]:
+    with zipfile.ZipFile(archive) as zf:
+        members=_jsonl_members(zf); base=posixpath.dirname(members[0].filename) if members else ''
+        want=posixpath.normpath(posixpath.join(base, rel)); names=set(zf.namelist())
+        name=want if want in names else next((n for n in sorted(names) if n.endswith('/'+rel)), None)
+        if name is None: return None
+        st=archive.stat(); key=hashlib.sha1(f'{archive.resolve()}:{st.st_size}:{st.st_mtime_ns}'.encode()).hexdigest()[:12]
+        root=(Path(tempfile.gettempdir())/'exam_engine_media'/f'{archive.stem}-{key}').resolve(); dest=(root/name).resolve()
+        if root not in dest.parents: return None   # refuse members that would escape the extraction dir
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True); tmp=dest.with_name(dest.name+f'.tmp{os.getpid()}_{threading.get_ident()}')   # prefetch threads may race
+            tmp.write_bytes(zf.read(name)); os.replace(tmp, dest)
+        return dest
+
+def resolve_media(root:Path, rel:str)->Optional[Path]:
+    """Map a question's media path to a real file: under ``root`` when it is a directory, or
+    extracted on demand (once, to a temp dir) when ``root`` is a .zip deck."""
+    key=(str(root),rel); fp=_media_cache.get(key, _MISSING)
+    if fp is _MISSING:
+        if is_archive(root):
+            try: fp=_extract_member(root, rel)
+            except (OSError, zipfile.BadZipFile): fp=None
+        else:
+            fp=(root/rel).resolve(); fp=fp if fp.exists() else None
+        _media_cache.put(key, fp)
+    return fp
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import argparse, asyncio, json, random, signal, subprocess, sys, time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from rich.console import Console
+
+# Load generator for engine.server ("python -m engine.main loadtest"). Each virtual
+# candidate holds one keep-alive connection, creates a session, answers every question
+# and finishes; per-request latencies are collected by endpoint and reported as
+# p50/p95/p99 plus overall throughput.
+
+console=Console()
+
+class Client:
+    def __init__(self, host:str, port:int)->None: self.host=host; self.port=port; self.reader=None; self.writer=None
+    async def connect(self)->None: self.reader,self.writer=await asyncio.open_connection(self.host, self.port)
+    async def request(self, method:str, path:str, body:Optional[Dict[str,Any]]=None)->Tuple[int,Dict[str,Any]]:
+        data=json.dumps(body).encode('utf-8') if body is not None else b''
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode('latin-1')+data)
+        await self.writer.drain()
+        head=(await self.reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        n=next((int(l.split(':',1)[1]) for l in head[1:] if l.lower().startswith('content-length:')),0)
+        return int(head[0].split(' ')[1]), json.loads(await self.reader.readexactly(n)) if n else {}
+    async def close(self)->None:
+        if self.writer is not None: self.writer.close()
+
+async def candidate(i:int, args:argparse.Namespace, lat:Dict[str,List[float]], errors:List[str])->int:
+    rng=random.Random(f'{args.seed}:{i}'); c=Client(args.host, args.port); answered=0
+    async def call(name:str, method:str, path:str, body:Optional[Dict[str,Any]]=None)->Dict[str,Any]:
+        t=time.perf_counter(); status,out=await c.request(method, path, body); lat.setdefault(name,[]).append((time.perf_counter()-t)*1000)
+        if status>=400: raise RuntimeError(f'{name}: HTTP {status} {out.get("error")}')
+        return out
+    try:
+        await c.connect()
+        s=await call('create','POST','/sessions',{'user':f'load{i%args.users}','num_questions':args.num_questions,'seed':rng.random(),
+                                                  'adaptive':args.adaptive,'reveal':'after','shuffle_options':args.shuffle_options})
+        sid=s['session_id']
+        while True:
+            q=await call('question','GET',f'/sessions/{sid}/question')
+            if q['done']: break
+            if args.think_ms: await asyncio.sleep(rng.expovariate(1000.0/args.think_ms))
+            await call('answer','POST',f'/sessions/{sid}/answer',{'question_id':q['id'],'choice':','.join(sorted(rng.sample(list(q['options']),2))) if q['multi'] else rng.choice(list(q['options']))}); answered+=1
+        await call('finish','POST',f'/sessions/{sid}/finish')
+    except (OSError, RuntimeError, asyncio.IncompleteReadError) as e: errors.append(f'candidate {i}: {e}')
+    finally: await c.close()
+    return answered
+
+def percentile(xs:List[float], q:float)->float:
+    if not xs: return 0.0
+    s=sorted(xs); return s[min(len(s)-1,int(q*len(s)))]
+
+async def run(args:argparse.Namespace)->Dict[str,Any]:
+    lat:Dict[str,List[float]]={}; errors:List[str]=[]; sem=asyncio.Semaphore(args.concurrency)
+    async def one(i:int)->int:
+        async with sem: return await candidate(i, args, lat, errors)
+    t0=time.perf_counter(); answered=sum(await asyncio.gather(*(one(i) for i in range(args.sessions)))); el=time.perf_counter()-t0
+    c=Client(args.host, args.port); await c.connect(); _,stats=await c.request('GET','/stats'); await c.close()
+    return {'sessions':args.sessions,'concurrency':args.concurrency,'elapsed_s':el,'answers':answered,'answers_per_sec':answered/el if el else 0.0,
+            'requests_per_sec':sum(len(v) for v in lat.values())/el if el else 0.0,'errors':len(errors),'first_errors':errors[:5],'server':stats,
+            'latency_ms':{k:{'n':len(v),'p50':percentile(v,0.5),'p95':percentile(v,0.95),'p99':percentile(v,0.99),'max':max(v)} for k,v in sorted(lat.items())}}
+
+async def _wait_ready(host:str, port:int, timeout:float=30.0)->None:
+    end=time.monotonic()+timeout
+    while True:
+        try: _,w=await asyncio.open_connection(host, port); w.close(); return
+        except OSError:
+            if time.monotonic()>end: raise
+            await asyncio.sleep(0.1)
+
+def main(argv:Optional[List[str]]=None)->None:
+    p=argparse.ArgumentParser(prog='engine.main loadtest', description='Drive concurrent candidates against the exam server and report latency percentiles')
+    p.add_argument('--host', type=str, default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--sessions', type=int, default=200, help='Candidates to run in total')
+    p.add_argument('--concurrency', type=int, default=50, help='Candidates in flight at once')
+    p.add_argument('--users', type=int, default=20, help='Distinct user names (history files) to spread candidates over')
+    p.add_argument('--num-questions', type=int, default=40)
+    p.add_argument('--adaptive', nargs='?', const='domain', default=None, choices=['domain','irt'])
+    p.add_argument('--shuffle-options', action='store_true')
+    p.add_argument('--think-ms', type=float, default=0.0, help='Mean pause between question and answer')
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--spawn', action='store_true', help='Start a server subprocess for the run; extra args after -- go to it')
+    p.add_argument('--json', type=str, default='')
+    args,rest=p.parse_known_args(argv)
+    if rest and rest[0]=='--': rest=rest[1:]
+    proc=None
+    if args.spawn:
+        proc=subprocess.Popen([sys.executable,'-m','engine.main','serve','--host',args.host,'--port',str(args.port),*rest], cwd=Path(__file__).resolve().parents[1])
+    try:
+        asyncio.run(_wait_ready(args.host, args.port)); res=asyncio.run(run(args))
+    finally:
+        if proc is not None: proc.send_signal(signal.SIGINT if sys.platform!='win32' else signal.SIGTERM); proc.wait()   # SIGINT lets the server flush history
+    console.print(f"{res['sessions']} sessions @ concurrency {res['concurrency']} in {res['elapsed_s']:.2f}s • {res['answers_per_sec']:.0f} answers/s • {res['requests_per_sec']:.0f} req/s • errors {res['errors']}", soft_wrap=True)
+    for name,st in res['latency_ms'].items():
+        console.print(f"  {name:<9} n={st['n']:<7} p50 {st['p50']:7.2f} ms  p95 {st['p95']:7.2f} ms  p99 {st['p99']:7.2f} ms  max {st['max']:7.2f} ms", soft_wrap=True)
+    console.print(f"  server: {res['server']}", markup=False, soft_wrap=True)
+    for e in res['first_errors']: console.print(f'  ! {e}', markup=False)
+    if args.json: Path(args.json).write_text(json.dumps(res, indent=2), encoding='utf-8'); console.print(f'[green]Saved results to[/green] {args.json}')
@@ -1,22 +1,40 @@
 from __future__ import annotations
-import argparse, json, random
+import argparse, cProfile, importlib, json, random, sys
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict
 from rich.console import Console
-from .loader import load_questions, load_metadata
-from .selector import select_questions, blueprint_select, filter_pool
+from .loader import load_questions, load_metadata, is_archive
+from .selector import select_questions, blueprint_select, QuestionIndex
 from .models import SessionConfig
 from .exam import ExamSession
-from .renderer import render_question, render_feedback, render_final_review, render_summary
+from .journal import SessionJournal, read_checkpoint, resume_session
+from .analytics import question_history, timing_stats
+from .profiling import Profiler, activate, phase
+from .renderer import render_question, render_feedback, render_final_review, render_summary, render_timing, render_profile
+from .history import open_history
 from .storage import append_history, export_csv, export_html, export_anki_wrong
-from .timer import TimerDisplay
+from .timer import TerminalUI
+from .media import PREFETCH, MediaPipeline
 
 console=Console()
 
-def parse_args()->argparse.Namespace:
+# subcommands: python -m engine.main <command> [flags]; anything else runs an exam
+COMMANDS={'analytics':'engine.trends','simulate':'engine.simulate','synth':'engine.synth','bench':'engine.bench','serve':'engine.server','loadtest':'engine.loadtest','dedupe':'engine.dedupe'}
+
+def _count(s:str)->int:
+    try: n=int(s)
+    except ValueError: n=-1
+    if n<0: raise argparse.ArgumentTypeError(f'expected a non-negative integer, got {s!r}')
+    return n
+
+def _threshold(s:str)->float:
+    from .dedupe import threshold_arg   # numpy only once --dedupe is given
+    return threshold_arg(s)
+
+def parse_args(argv=None)->argparse.Namespace:
     p=argparse.ArgumentParser(description='Exam Simulator (CLI)')
     p.add_argument('--data-dir', type=str, default=str(Path(__file__).resolve().parents[1]/'data'))
-    p.add_argument('--questions-file', type=str, default='questions.jsonl')
+    p.add_argument('--questions-file', type=str, default='questions.jsonl', help='.jsonl, .jsonl.gz or a .zip deck (read in place, media resolved inside the archive)')
     p.add_argument('--metadata-file', type=str, default='metadata.json')
     p.add_argument('--blueprint', type=str, default='')
     p.add_argument('--num-questions', type=int, default=40)
@@ -26,7 +44,8 @@ def parse_args()->argparse.Namespace:
     p.add_argument('--shuffle-options', action='store_true')
     p.add_argument('--seed', type=int, default=None)
     p.add_argument('--weights', type=str, default='')
-    p.add_argument('--history', type=str, default='')
+    p.add_argument('--history', type=str, default='', help='History store path (.jsonl log, or .db/.sqlite for SQLite); a legacy .json array is migrated on first use')
+    p.add_argument('--history-backend', choices=['jsonl','sqlite'], default='jsonl', help='Default store when --history is not given: results/history_<user>.jsonl or a shared results/history.sqlite')
     p.add_argument('--user', type=str, default='default')
     p.add_argument('--live-timer', action='store_true')
     p.add_argument('--beep-threshold', type=int, default=5)
@@ -34,13 +53,22 @@ def parse_args()->argparse.Namespace:
     p.add_argument('--exclude-tags', type=str, default='')
     p.add_argument('--min-difficulty', type=int, default=None)
     p.add_argument('--max-difficulty', type=int, default=None)
-    p.add_argument('--open-images', action='store_true')
-    p.add_argument('--adaptive', action='store_true')
-    p.add_argument('--save-state', type=str, default='')
-    p.add_argument('--resume', type=str, default='')
+    p.add_argument('--open-images', action='store_true', help='Open attached media in the system viewer (in the background, each file once)')
+    p.add_argument('--media-preview', action='store_true', help='Draw attached images inline as terminal thumbnails (needs Pillow; otherwise a one-line summary)')
+    p.add_argument('--prefetch', type=_count, default=PREFETCH, help='Resolve and validate the media of this many upcoming questions in the background')
+    p.add_argument('--adaptive', nargs='?', const='domain', default=None, choices=['domain','irt'],
+                   help='Adapt the next pick during the run: "domain" (default) favours weak domains; "irt" matches item difficulty to a running ability estimate')
+    p.add_argument('--save-state', type=str, default='', help='Checkpoint path for this session (default: results/session_<user>.json); answers are journaled next to it')
+    p.add_argument('--resume', type=str, default='', help='Continue a paused or interrupted session from its checkpoint')
+    p.add_argument('--rebuild-cache', action='store_true', help='Recompile the question-bank cache (<questions-file>.qbc) even if it looks current')
+    p.add_argument('--no-cache', action='store_true', help='Parse the questions file directly; do not read or write the compiled cache')
+    p.add_argument('--dedupe', nargs='?', type=_threshold, const=0.7, default=None, metavar='THRESHOLD',
+                   help='Find near-duplicate questions while loading (MinHash/LSH, default similarity 0.7) and let each cluster count as one question in selection')
+    p.add_argument('--profile', nargs='?', const='', default=None, help='Time each phase (load, select, render, input, export...) and write a Chrome trace JSON; optional path (default results/<ts>_trace.json)')
+    p.add_argument('--cprofile', type=str, default='', help='Also run under cProfile and dump stats to this path')
     p.add_argument('--export-anki-wrong', nargs='?', const='', default=None,
                    help='Write an Anki CSV of WRONG answers; optional path. If omitted, saves to results/<ts>_anki_wrong.csv')
-    return p.parse_args()
+    return p.parse_args(argv)
 
 def parse_weights(spec:str, default:Dict[str,float])->Dict[str,float]:
     if not spec: return default
@@ -52,66 +80,120 @@ def parse_weights(spec:str, default:Dict[str,float])->Dict[str,float]:
     if tot>0: out={k:v/tot for k,v in out.items()}
     return out
 
-def maybe_shuffle_options(sel):
-    for q in sel:
-        letters=['A','B','C','D']; items=[(k,q.options[k]) for k in letters]
-        random.shuffle(items)
-        newopts={letters[i]:items[i][1] for i in range(4)}
-        correct=None
-        for i,(k,_) in enumerate(items):
-            if k==q.answer: correct=letters[i]
-        q.options=newopts; q.answer=correct
+def main(argv=None)->None:
+    argv=sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        importlib.import_module(COMMANDS[argv[0]]).main(argv[1:]); return
+    args=parse_args(argv)
+    prof=Profiler() if args.profile is not None else None; cprof=cProfile.Profile() if args.cprofile else None
+    activate(prof)
+    if cprof: cprof.enable()
+    try:
+        with phase('run'): run_exam(args)
+    finally:
+        if cprof:
+            cprof.disable(); cprof.dump_stats(args.cprofile); console.print(f"[green]Saved cProfile stats to[/green] {args.cprofile} (python -m pstats {args.cprofile})")
+        if prof:
+            activate(None)
+            from datetime import datetime, timezone
+            trace=Path(args.profile) if args.profile else Path(__file__).resolve().parents[1]/'results'/f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_trace.json"
+            prof.write_trace(trace, argv=argv); render_profile(prof.totals, trace)
 
-def main()->None:
-    args=parse_args()
+def run_exam(args:argparse.Namespace)->None:
     if args.seed is not None: random.seed(args.seed)
+    rng=random.Random(args.seed) if args.seed is not None else random.Random()
     data_dir=Path(args.data_dir)
-    q_path=data_dir/args.questions_file; m_path=data_dir/args.metadata_file
+    q_path=data_dir/args.questions_file; m_path=data_dir/args.metadata_file; saved:Dict[str,Any]={}
+    if args.resume:
+        # the checkpoint names the user, bank and history store of the paused run: they win over the flags
+        try: saved=read_checkpoint(Path(args.resume)).get('meta') or {}
+        except (OSError, ValueError) as e: console.print(f'[red]Cannot resume from {args.resume}:[/red] {e}'); sys.exit(1)
+        args.user=saved.get('user', args.user)
+        if 'questions' in saved: data_dir=Path(saved['data_dir']); q_path=Path(saved['questions']); m_path=Path(saved['metadata'])
     console.print(f"[cyan]Loading questions from[/cyan] {q_path}")
-    questions=load_questions(q_path)
+    load_stats={}
+    with phase('load_questions'): questions=load_questions(q_path, use_cache=not args.no_cache, rebuild_cache=args.rebuild_cache, stats=load_stats, dedupe=args.dedupe)
+    console.print(f"[cyan]Loaded[/cyan] {load_stats['count']} questions in {load_stats['total_ms']:.1f} ms (cache: {load_stats['cache']}, parse: {load_stats['parse_ms']:.1f} ms)")
+    if 'dedupe' in load_stats:
+        ds=load_stats['dedupe']; console.print(f"[cyan]Near-duplicates:[/cyan] {ds['clusters']} clusters, {ds['duplicates']} redundant questions (signatures: {ds['cache']}, {ds['sign_ms']+ds['cluster_ms']:.1f} ms)")
+    if load_stats['errors']:
+        console.print(f"[yellow]Skipped {len(load_stats['errors'])} invalid line(s):[/yellow]")
+        for e in load_stats['errors'][:10]: console.print(f"  {e}")
+        if len(load_stats['errors'])>10: console.print(f"  ... and {len(load_stats['errors'])-10} more")
+    if is_archive(q_path) and not m_path.exists(): m_path=q_path
+    media_root=q_path if is_archive(q_path) else data_dir
     console.print(f"[cyan]Loading metadata from[/cyan] {m_path}")
-    meta=load_metadata(m_path); default_weights=meta.get('domains',{}); title=meta.get('title')
-    include_tags=[t.strip() for t in args.include_tags.split(',') if t.strip()]
-    exclude_tags=[t.strip() for t in args.exclude_tags.split(',') if t.strip()]
-    filtered=filter_pool(questions, include_tags, exclude_tags, args.min_difficulty, args.max_difficulty)
-    if not filtered:
-        console.print('[red]No questions after applying filters.[/red]'); return
-    if args.blueprint:
-        bp=json.loads(Path(args.blueprint).read_text(encoding='utf-8'))
-        selection=blueprint_select(filtered, bp, shuffle=args.shuffle)
-    else:
-        weights=parse_weights(args.weights, default_weights)
-        if not weights:
-            ds=sorted({q.domain for q in filtered}); eq=1.0/len(ds) if ds else 1.0
-            weights={d:eq for d in ds}; console.print('[yellow]Using equal weights across domains:[/yellow] '+', '.join(f'{d}:{eq:.2f}' for d in ds))
-        selection=select_questions(filtered, total=args.num_questions, weights=weights, shuffle=args.shuffle)
-    if args.shuffle_options: maybe_shuffle_options(selection)
-    cfg=SessionConfig(num_questions=len(selection), time_limit_minutes=args.time_limit, reveal_mode=args.reveal, shuffle=args.shuffle, shuffle_options=args.shuffle_options, live_timer=args.live_timer, beep_threshold_minutes=args.beep_threshold, adaptive=args.adaptive, include_tags=include_tags, exclude_tags=exclude_tags, min_difficulty=args.min_difficulty, max_difficulty=args.max_difficulty, title=title, open_images=args.open_images, seed=args.seed)
-    hist_path=Path(args.history) if args.history else (Path(__file__).resolve().parents[1]/'results'/f'history_{args.user}.json')
-    sess=ExamSession(selection[:], cfg)
-    timer=None
-    if cfg.live_timer:
-        timer=TimerDisplay(sess.remaining_seconds); timer.start()
+    with phase('load_metadata'): meta=load_metadata(m_path)
+    default_weights=meta.get('domains',{}); title=meta.get('title')
+    results_dir=Path(__file__).resolve().parents[1]/'results'
+    state_path=Path(args.resume or args.save_state) if (args.resume or args.save_state) else results_dir/f'session_{args.user}.json'
     if args.resume:
-        saved=json.loads(Path(args.resume).read_text(encoding='utf-8'))
-        from .models import AnswerRecord
-        sess.answers=[AnswerRecord(**a) for a in saved.get('answers',[])]
-        sess.current_index=saved.get('index',0)
+        try:
+            with phase('resume'): sess=resume_session(state_path, questions.by_id, rng=rng)
+        except (OSError, ValueError, KeyError, TypeError) as e:   # the checkpoint and journal are left untouched
+            console.print(f'[red]Cannot resume from {state_path}:[/red] {e}'); sys.exit(1)
+        cfg=sess.config; selection=sess.questions
+        console.print(f"[cyan]Resumed[/cyan] {len(sess.answers)}/{len(selection)} answered • {sess.remaining_seconds()//60}m {sess.remaining_seconds()%60}s left")
+    else:
+        include_tags=[t.strip() for t in args.include_tags.split(',') if t.strip()]
+        exclude_tags=[t.strip() for t in args.exclude_tags.split(',') if t.strip()]
+        with phase('filter'):
+            filtered=QuestionIndex(questions).filter(include_tags, exclude_tags, args.min_difficulty, args.max_difficulty)
+            if args.dedupe is not None: filtered=filtered.collapse(rng=rng)   # one random variant per near-duplicate cluster
+        if not len(filtered):
+            console.print('[red]No questions after applying filters.[/red]'); return
+        if args.blueprint:
+            bp=json.loads(Path(args.blueprint).read_text(encoding='utf-8'))
+            with phase('select'): selection=blueprint_select(filtered, bp, shuffle=args.shuffle, rng=rng)
+        else:
+            weights=parse_weights(args.weights, default_weights)
+            if not weights:
+                ds=sorted(filtered.domains()); eq=1.0/len(ds) if ds else 1.0
+                weights={d:eq for d in ds}; console.print('[yellow]Using equal weights across domains:[/yellow] '+', '.join(f'{d}:{eq:.2f}' for d in ds))
+            with phase('select'): selection=select_questions(filtered, total=args.num_questions, weights=weights, shuffle=args.shuffle, rng=rng)
+        cfg=SessionConfig(num_questions=len(selection), time_limit_minutes=args.time_limit, reveal_mode=args.reveal, shuffle=args.shuffle, shuffle_options=args.shuffle_options, live_timer=args.live_timer, beep_threshold_minutes=args.beep_threshold, adaptive=args.adaptive is not None, adaptive_mode=args.adaptive or 'domain', include_tags=include_tags, exclude_tags=exclude_tags, min_difficulty=args.min_difficulty, max_difficulty=args.max_difficulty, title=title, open_images=args.open_images, media_preview=args.media_preview, seed=args.seed)
+        if state_path.exists(): console.print(f'[yellow]Replacing unfinished session[/yellow] {state_path} (use --resume {state_path} to continue it instead)')
+        sess=ExamSession(selection[:], cfg, rng=rng)
+    legacy_hist=results_dir/f'history_{args.user}.json'
+    if 'history' in saved: hist_path=Path(saved['history'])
+    elif args.history: hist_path=Path(args.history)
+    elif args.history_backend=='sqlite': hist_path=results_dir/'history.sqlite'
+    else: hist_path=results_dir/f'history_{args.user}.jsonl'
+    with phase('open_history'):
+        history=open_history(hist_path, legacy=None if args.history or saved else legacy_hist)
+        if cfg.adaptive and cfg.adaptive_mode=='irt': sess.item_history=question_history(history.query(user=args.user))
+    # every answer goes to the journal as it is given; P checkpoints and exits
+    run_meta={'user':args.user,'data_dir':str(data_dir.resolve()),'questions':str(q_path.resolve()),'metadata':str(m_path.resolve()),'history':str(hist_path.resolve())}
+    journal=SessionJournal(state_path, meta=run_meta).open(fresh=not args.resume); sess.journal=journal
+    if not args.resume: sess.start(); journal.checkpoint(sess)
+    # prompts wait on one event loop that also drives the live timer and auto-submits at the deadline
+    ui=TerminalUI(lambda: sess.deadline_epoch, clock=sess.clock, live_timer=cfg.live_timer, fine_below=cfg.beep_threshold_minutes*60, console=console)
+    # media of the next --prefetch questions is resolved on a thread pool while the current one is answered
+    media=MediaPipeline(media_root, preview=cfg.media_preview) if cfg.open_images or cfg.media_preview else None
     def ui_ask(q,i,total,rem):
-        return render_question(q,i,total,rem,title=cfg.title,beep_threshold_minutes=cfg.beep_threshold_minutes,data_dir=data_dir,open_images=cfg.open_images)
-    def ui_feedback(ok,q): return render_feedback(ok,q)
-    try: sess.run(ui_ask, ui_feedback)
+        if media: media.prefetch(sess.upcoming(args.prefetch+1))
+        return render_question(q,i,total,rem,title=cfg.title,beep_threshold_minutes=cfg.beep_threshold_minutes,data_dir=media_root,open_images=cfg.open_images,order=sess.options,ui=ui,media=media,preview=cfg.media_preview)
+    def ui_feedback(ok,q): return render_feedback(ok,q,sess.options)
+    try:
+        with phase('session'): sess.run(ui_ask, ui_feedback)
     finally:
-        if timer: timer.stop()
-    result=render_final_review(cfg, selection, sess.answers, user=args.user)
-    render_summary(result)
-    hist_path.parent.mkdir(parents=True, exist_ok=True); append_history(result, hist_path)
+        ui.close(); journal.close()
+        if media: media.close()
+    if sess.paused:
+        history.close()
+        console.print(f"[yellow]Paused[/yellow] after {len(sess.answers)}/{len(selection)} answers. Resume with: python -m engine.main --resume {state_path}"); return
+    with phase('final_review'): result=render_final_review(cfg, sess.questions, sess.answers, user=args.user, order=sess.options)
+    with phase('summary'):
+        render_summary(result)
+        timing=timing_stats(sess.answers, cfg.time_limit_minutes*60/max(1,len(sess.questions)))
+        if timing: render_timing(timing)
+    with phase('history_append'): append_history(result, history); history.close(); journal.discard()
     from datetime import datetime, timezone
     ts=datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
     csv_path=Path(__file__).resolve().parents[1]/'results'/f'{ts}_summary.csv'
     html_path=Path(__file__).resolve().parents[1]/'results'/f'{ts}_summary.html'
-    export_csv(result, csv_path); export_html(result, html_path)
-    console.print(f"[green]Saved history to[/green] {hist_path}")
+    with phase('export'): export_csv(result, csv_path); export_html(result, html_path)
+    console.print(f"[green]Saved history to[/green] {history.path}")
     console.print(f"[green]Saved CSV report to[/green] {csv_path}")
     console.print(f"[green]Saved HTML report to[/green] {html_path}")
     # anki export
@@ -119,7 +201,7 @@ def main()->None:
         qmap={q.id:{'question':q.question,'options':q.options,'answer_text':q.answer_text} for q in selection}
         if args.export_anki_wrong!='': anki_path=Path(args.export_anki_wrong)
         else: anki_path=Path(__file__).resolve().parents[1]/'results'/f'{ts}_anki_wrong.csv'
-        export_anki_wrong(result, anki_path, qmap)
+        with phase('export'): export_anki_wrong(result, anki_path, qmap)
         console.print(f"[green]Saved Anki WRONG CSV to[/green] {anki_path}")
 
 if __name__=='__main__': main()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import os, struct, subprocess, sys, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+from rich.color import Color
+from rich.console import Group, RenderableType
+from rich.style import Style
+from rich.text import Text
+from .loader import LRU, resolve_media
+from .models import Question
+from .profiling import phase
+
+# Question media for the CLI exam, kept off the prompt's critical path:
+#   - prefetch() resolves (extracting from .zip decks), validates and, with previews on,
+#     thumbnails the media of the next few questions on a small thread pool
+#   - validated files and rendered thumbnails live in bounded LRUs, so revisits and images
+#     shared between questions cost nothing
+#   - open() hands files to the system viewer from the pool (Popen, never waited on; exited
+#     launchers are reaped by later opens and close()); each file is launched at most once per session
+#   - preview() draws an inline thumbnail with half-block cells (needs Pillow; without it,
+#     a one-line summary: type, size and pixel dimensions read from the file header)
+
+PREFETCH=3
+WORKERS=4
+INFO_CACHE=1024
+THUMB_CACHE=64
+THUMB_COLS,THUMB_ROWS=48,12   # terminal cells; each cell shows two pixel rows
+
+@dataclass
+class MediaInfo:
+    rel:str
+    path:Optional[Path]=None
+    kind:str=''
+    size:int=0
+    width:Optional[int]=None
+    height:Optional[int]=None
+    error:Optional[str]=None
+
+def sniff(p:Path)->Tuple[str,Optional[int],Optional[int]]:
+    """(kind, width, height) from the file header; unknown formats fall back to the suffix."""
+    with p.open('rb') as f: head=f.read(64<<10)
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and len(head)>=24: w,h=struct.unpack('>II', head[16:24]); return 'png',w,h
+    if head[:6] in (b'GIF87a',b'GIF89a') and len(head)>=10: w,h=struct.unpack('<HH', head[6:10]); return 'gif',w,h
+    if head[:2]==b'BM' and len(head)>=26: w,h=struct.unpack('<ii', head[18:26]); return 'bmp',w,abs(h)
+    if head[:4]==b'RIFF' and head[8:12]==b'WEBP': return 'webp',None,None
+    if head[:3]==b'\xff\xd8\xff':
+        i=2
+        while i+9<len(head):   # walk the segments up to the first start-of-frame
+            if head[i]!=0xFF: i+=1; continue
+            m=head[i+1]
+            if m==0xFF or m==0x01 or 0xD0<=m<=0xD8: i+=1 if m==0xFF else 2; continue
+            if 0xC0<=m<=0xCF and m not in (0xC4,0xC8,0xCC): h,w=struct.unpack('>HH', head[i+5:i+9]); return 'jpeg',w,h
+            i+=2+struct.unpack('>H', head[i+2:i+4])[0]
+        return 'jpeg',None,None
+    return p.suffix.lower().lstrip('.') or 'file',None,None
+
+def thumbnail(p:Path, cols:int=THUMB_COLS, rows:int=THUMB_ROWS)->Optional[Text]:
+    """The image scaled into cols x rows cells ("▀": foreground = upper pixel, background = lower), or None without Pillow."""
+    try: from PIL import Image
+    except ImportError: return None
+    try:
+        with Image.open(p) as im:
+            im.draft('RGB', (cols, rows*2))   # JPEGs decode straight at reduced size
+            im=im.convert('RGB'); im.thumbnail((cols, rows*2)); w,h=im.size; px=im.load()
+    except (OSError, ValueError, Image.DecompressionBombError): return None
+    rgb=lambda c: Color.from_rgb(*c); out=Text()
+    for y in range(0, h, 2):
+        if y: out.append('\n')
+        for x in range(w): out.append('▀', Style(color=rgb(px[x,y]), bgcolor=rgb(px[x,y+1]) if y+1<h else None))
+    return out
+
+def _viewer(p:Path)->Optional[subprocess.Popen]:
+    if os.name=='nt': os.startfile(str(p)); return None  # type: ignore
+    cmd=['open' if sys.platform=='darwin' else 'xdg-open', str(p)]
+    return subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+class MediaPipeline:
+    """Media of one deck (``root``: data dir or .zip), resolved ahead of time and opened without blocking."""
+    def __init__(self, root:Path, *, preview:bool=False, workers:int=WORKERS, cols:int=THUMB_COLS, rows:int=THUMB_ROWS)->None:
+        self.root=root; self.preview_on=preview; self.cols=cols; self.rows=rows
+        self.pool=ThreadPoolExecutor(workers, thread_name_prefix='media')
+        self.info=LRU(INFO_CACHE)     # media path -> Future[MediaInfo]
+        self.thumbs=LRU(THUMB_CACHE)  # file -> Text, or None when it cannot be drawn
+        self.viewers:Dict[Path,Optional[subprocess.Popen]]={}; self._lock=threading.Lock()
+    def _load(self, rel:str)->MediaInfo:
+        with phase('media.load', 'media', rel=rel):
+            fp=resolve_media(self.root, rel)
+            if fp is None: return MediaInfo(rel, error='not found')
+            try: size=fp.stat().st_size; kind,w,h=sniff(fp)
+            except OSError as e: return MediaInfo(rel, fp, error=str(e))
+            info=MediaInfo(rel, fp, kind, size, w, h, None if size else 'empty file')
+            if self.preview_on and info.error is None: self._thumb(info)
+            return info
+    def _thumb(self, info:MediaInfo)->Optional[Text]:
+        t=self.thumbs.get(info.path, False)
+        if t is False: t=thumbnail(info.path, self.cols, self.rows); self.thumbs.put(info.path, t)
+        return t
+    def load(self, rel:str)->Future:
+        fut=self.info.get(rel)
+        if fut is None: fut=self.pool.submit(self._load, rel); self.info.put(rel, fut)
+        return fut
+    def prefetch(self, questions:Iterable[Question])->None:
+        for q in questions:
+            for rel in q.media: self.load(rel)
+    def _reap(self)->None:
+        # collect exited viewer launchers so none stays a zombie; poll() never blocks
+        with self._lock:
+            for path,proc in self.viewers.items():
+                if proc is not None and proc.poll() is not None: self.viewers[path]=None
+    def _open(self, fut:Future)->None:
+        info=fut.result()
+        if info.error is not None: return
+        self._reap()
+        with self._lock:
+            if info.path in self.viewers: return   # already handed to the viewer this session
+            self.viewers[info.path]=None
+        with phase('media.open', 'media', rel=info.rel):
+            try: proc=_viewer(info.path)
+            except OSError: return
+        with self._lock: self.viewers[info.path]=proc
+    def open(self, rels:Iterable[str])->None:
+        """Show files in the system viewer; returns at once (launches run on the pool after their load)."""
+        for rel in rels: self.pool.submit(self._open, self.load(rel))
+    def preview(self, rel:str)->RenderableType:
+        info:MediaInfo=self.load(rel).result()
+        if info.error is not None: return Text(f'{rel}: {info.error}', style='red')
+        dims=f' {info.width}×{info.height}' if info.width else ''
+        summary=Text(f'{rel} — {info.kind.upper()}{dims}, {info.size/1024:.1f} KB', style='dim')
+        t=self._thumb(info); return summary if t is None else Group(t, summary)
+    def close(self)->None:
+        self.pool.shutdown(wait=False, cancel_futures=True); self._reap()   # viewers still running are reaped by init once we exit
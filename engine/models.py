@@ -25,12 +25,14 @@ class SessionConfig:
     live_timer:bool=False
     beep_threshold_minutes:int=5
     adaptive:bool=False
+    adaptive_mode:str='domain'
     include_tags:List[str]=field(default_factory=list)
     exclude_tags:List[str]=field(default_factory=list)
     min_difficulty:Optional[int]=None
     max_difficulty:Optional[int]=None
     title:Optional[str]=None
     open_images:bool=False
+    media_preview:bool=False
     seed:Optional[int]=None
 
 @dataclass
@@ -40,6 +42,7 @@ class AnswerRecord:
     correct:str
     is_correct:bool
     domain:str
+    latency_ms:Optional[float]=None   # question shown -> answer submitted
 
 @dataclass
 class SessionResult:
@@ -0,0 +1,69 @@
+from __future__ import annotations
+import random, re
+from typing import Dict, List, Optional, Sequence
+from .models import Question
+
+# Option order for one session. Questions are never copied or mutated: each keeps
+# its bank keys, and the session shows option slot i under LETTERS[i] using a
+# per-question permutation (bytes; slot i shows key number perm[i]) derived from
+# (seed, question id). Answers are mapped back to bank keys before grading, so
+# history and exports always speak in bank keys.
+
+LETTERS='ABCDEFGH'
+MIN_OPTIONS,MAX_OPTIONS=2,len(LETTERS)
+
+def answer_keys(answer:str)->List[str]:
+    """Bank keys of a (possibly multi-answer, comma separated) answer."""
+    return [k for k in answer.split(',') if k]
+
+def normalize_answer(answer:object, options:Dict[str,str])->str:
+    """Canonical answer string: keys in option order, comma separated. Accepts "B", "A,C", "AC" or ["A","C"]."""
+    if isinstance(answer,(list,tuple)): keys=[str(a).strip().upper() for a in answer]
+    else:
+        s=str(answer).strip().upper()
+        keys=[k.strip() for k in s.split(',')] if ',' in s else [s] if s in options or len(s)<2 else list(s)
+    bad=[k for k in keys if k not in options]
+    if bad or not keys: raise ValueError('bad answer')
+    want=set(keys); return ','.join(k for k in options if k in want)
+
+def permutation(seed:object, qid:int, n:int)->bytes:
+    p=list(range(n)); random.Random(f'{seed}:{qid}').shuffle(p); return bytes(p)
+
+def parse_choice(text:str, letters:Sequence[str], multi:bool)->Optional[str]:
+    """Letters typed by the candidate ("b", "A,C", "a c", "AC") -> canonical display answer, or None if invalid."""
+    keys=[k for k in re.split(r'[\s,;]+', text.strip().upper()) if k]
+    if multi and len(keys)==1 and keys[0] not in letters: keys=list(keys[0])
+    if not keys or any(k not in letters for k in keys) or (not multi and len(keys)!=1): return None
+    want=set(keys); return ','.join(l for l in letters if l in want)
+
+class OptionOrder:
+    """Per-session display order of each question's options. ``seed`` None keeps bank order."""
+    def __init__(self, seed:object=None, perms:Optional[Dict[int,bytes]]=None)->None:
+        self.seed=seed; self.perms:Dict[int,bytes]=dict(perms or {})
+    def perm(self, q:Question)->bytes:
+        p=self.perms.get(q.id)
+        if p is None:
+            n=len(q.options)
+            if self.seed is None: return bytes(range(n))
+            p=self.perms[q.id]=permutation(self.seed, q.id, n)
+        return p
+    def keys(self, q:Question)->List[str]:
+        """Bank keys in display order."""
+        ks=list(q.options); return [ks[i] for i in self.perm(q)]
+    def display(self, q:Question)->Dict[str,str]:
+        opts=q.options; return {LETTERS[i]:opts[k] for i,k in enumerate(self.keys(q))}
+    def letters(self, q:Question)->str: return LETTERS[:len(q.options)]
+    def to_source(self, q:Question, choice:str)->str:
+        """Display letters ("A,C") -> canonical bank answer."""
+        ks=self.keys(q); want={ks[LETTERS.index(l)] for l in answer_keys(choice)}
+        return ','.join(k for k in q.options if k in want)
+    def to_display(self, q:Question, answer:str)->str:
+        """Bank answer -> display letters, in display order."""
+        ks=self.keys(q); want=set(answer_keys(answer))
+        return ','.join(LETTERS[i] for i,k in enumerate(ks) if k in want)
+    def state(self)->Dict[str,object]:
+        return {'seed':self.seed,'perms':{str(k):list(v) for k,v in self.perms.items()}}
+    @classmethod
+    def from_state(cls, st:Optional[Dict[str,object]])->'OptionOrder':
+        if not st: return cls()
+        return cls(st.get('seed'), {int(k):bytes(v) for k,v in (st.get('perms') or {}).items()})
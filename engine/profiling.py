@@ -0,0 +1,36 @@
+from __future__ import annotations
+import json, os, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Phase timings for --profile. Code marks spans with ``with phase('name'):``; while no
+# profiler is active that is a no-op. An active Profiler keeps each span as a Chrome
+# trace event ("X", microseconds), so the file opens in chrome://tracing or
+# https://ui.perfetto.dev, and sums them per name for the end-of-run table.
+
+class Profiler:
+    def __init__(self)->None:
+        self.t0=time.perf_counter(); self.events:List[Dict[str,Any]]=[]; self.pid=os.getpid()
+        self.totals:Dict[str,List[float]]={}   # name -> [count, total ms]
+    def _us(self, t:float)->float: return (t-self.t0)*1e6
+    def add(self, name:str, start:float, end:float, cat:str='phase', **args:Any)->None:
+        self.events.append({'name':name,'cat':cat,'ph':'X','ts':self._us(start),'dur':(end-start)*1e6,'pid':self.pid,'tid':threading.get_ident(),'args':args})
+        t=self.totals.setdefault(name,[0,0.0]); t[0]+=1; t[1]+=(end-start)*1000
+    def write_trace(self, p:Path, **meta:Any)->None:
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(json.dumps({'traceEvents':self.events,'displayTimeUnit':'ms','otherData':meta}), encoding='utf-8')
+
+_active:Optional[Profiler]=None
+
+def activate(p:Optional[Profiler])->None:
+    global _active
+    _active=p
+
+@contextmanager
+def phase(name:str, cat:str='phase', **args:Any)->Iterator[None]:
+    p=_active
+    if p is None: yield; return
+    t=time.perf_counter()
+    try: yield
+    finally: p.add(name, t, time.perf_counter(), cat, **args)
@@ -1,7 +1,6 @@
 from __future__ import annotations
-import os, subprocess, sys
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from rich.console import Console
 from rich.panel import Panel
 from rich.table import Table
@@ -10,50 +9,60 @@ from rich.text import Text
 from rich.markdown import Markdown
 from .models import Question, SessionConfig, AnswerRecord, SessionResult
 from .analytics import build_session_result
+from .media import MediaPipeline
+from .options import OptionOrder, answer_keys, parse_choice
+from .profiling import phase
+from .timer import TerminalUI
 
 console=Console()
 
-def _open_media(paths:List[str], data_dir:Path)->None:
-    for p in paths:
-        fp=(data_dir/p).resolve()
-        if fp.exists():
-            try:
-                if os.name=='nt': os.startfile(str(fp))  # type: ignore
-                elif sys.platform=='darwin': subprocess.run(['open', str(fp)], check=False)
-                else: subprocess.run(['xdg-open', str(fp)], check=False)
+def render_question(q:Question, idx:int, total:int, remaining:int, *, title:Optional[str], beep_threshold_minutes:int, data_dir:Path, open_images:bool, order:Optional[OptionOrder]=None, ui:Optional[TerminalUI]=None,
+                    media:Optional[MediaPipeline]=None, preview:bool=False)->str:
+    """Show ``q`` with its options in ``order`` (bank order if None); returns display letters ("B", "A,C"), "P",
+    or "" when ``ui`` hit the exam deadline with the prompt still open. Media is previewed and opened through
+    ``media`` (owned by the caller); without one it is only listed."""
+    order=order or OptionOrder()
+    with phase('render', id=q.id):
+        header=[title] if title else []
+        header+= [f"Q {idx}/{total}", f"Domain: {q.domain}", f"Time left: {remaining//60}m {remaining%60}s"]
+        console.rule(' • '.join(header))
+        if remaining <= beep_threshold_minutes*60:
+            try: print('', end='')
             except Exception: pass
-
-def render_question(q:Question, idx:int, total:int, remaining:int, *, title:Optional[str], beep_threshold_minutes:int, data_dir:Path, open_images:bool)->str:
-    header=[title] if title else []
-    header+= [f"Q {idx}/{total}", f"Domain: {q.domain}", f"Time left: {remaining//60}m {remaining%60}s"]
-    console.rule(' • '.join(header))
-    if remaining <= beep_threshold_minutes*60:
-        try: print('', end='')
-        except Exception: pass
-    try: console.print(Panel.fit(Markdown(q.question), title=f"Q{q.id} [{q.type}]", border_style='cyan'))
-    except Exception: console.print(Panel.fit(Text(q.question, style='bold'), title=f"Q{q.id} [{q.type}]", border_style='cyan'))
-    if q.media:
-        console.print(f"[blue]Media attached:[/blue] {', '.join(q.media)}");
-        if open_images: _open_media(q.media, data_dir)
-    table=Table(show_header=False, box=None)
-    for l in ['A','B','C','D']: table.add_row(f"[bold]{l}[/]", q.options.get(l,''))
-    console.print(table)
-    console.print('(Enter A/B/C/D. Press P to pause & save state.)')
+        try: console.print(Panel.fit(Markdown(q.question), title=f"Q{q.id} [{q.type}]", border_style='cyan'))
+        except Exception: console.print(Panel.fit(Text(q.question, style='bold'), title=f"Q{q.id} [{q.type}]", border_style='cyan'))
+        if q.media:
+            console.print(f"[blue]Media attached:[/blue] {', '.join(q.media)}");
+            if media is not None and preview:
+                for rel in q.media: console.print(media.preview(rel))
+            if media is not None and open_images: media.open(q.media)
+        table=Table(show_header=False, box=None)
+        opts=order.display(q); letters=list(opts); multi=',' in q.answer
+        for l,text in opts.items(): table.add_row(f"[bold]{l}[/]", text)
+        console.print(table)
+        pick=f"{letters[0]}-{letters[-1]}"
+        if multi: console.print(f"(Select {len(answer_keys(q.answer))}: enter letters like {letters[0]},{letters[1]}. Press P to pause & save state.)")
+        else: console.print(f"(Enter {'/'.join(letters)}. Press P to pause & save state.)")
     while True:
-        ans=Prompt.ask('Your answer (A/B/C/D or P)').strip().upper()
-        if ans in {'A','B','C','D','P'}: return ans
-        console.print('[red]Please enter A, B, C, D, or P.[/red]')
+        with phase('input', id=q.id):
+            raw=ui.ask(f"Your answer ({pick} or P)") if ui is not None else Prompt.ask(f"Your answer ({pick} or P)")
+        if raw is None:
+            console.print('[red]Time is up[/red] — this question was submitted unanswered.'); return ''
+        raw=raw.strip().upper()
+        if raw=='P': return raw
+        ans=parse_choice(raw, letters, multi)
+        if ans is not None: return ans
+        console.print(f"[red]Please enter {'letters' if multi else 'one letter'} from {pick}, or P.[/red]")
 
-def render_feedback(correct:bool, q:Question)->None:
-    console.print('[green]Correct![/green]' if correct else f"[red]Wrong.[/red] Correct: [bold]{q.answer}[/bold] — {q.answer_text}")
+def render_feedback(correct:bool, q:Question, order:Optional[OptionOrder]=None)->None:
+    console.print('[green]Correct![/green]' if correct else f"[red]Wrong.[/red] Correct: [bold]{(order or OptionOrder()).to_display(q, q.answer)}[/bold] — {q.answer_text}")
 
-def render_final_review(cfg:SessionConfig, qs:List[Question], ans:List[AnswerRecord], user:str)->SessionResult:
+def render_final_review(cfg:SessionConfig, qs:List[Question], ans:List[AnswerRecord], user:str, order:Optional[OptionOrder]=None)->SessionResult:
     if cfg.reveal_mode=='end':
-        console.rule('Final Review — Correct Answers'); qmap={q.id:q for q in qs}
+        console.rule('Final Review — Correct Answers'); qmap={q.id:q for q in qs}; order=order or OptionOrder()
         for a in ans:
             q=qmap[a.question_id]; status='✅' if a.is_correct else '❌'
-            console.print(Panel.fit(f"Q{q.id} [{q.domain}] {status}
-Correct: {q.answer} — {q.answer_text}", title=f"Your answer: {a.chosen}", border_style='magenta'))
+            console.print(Panel.fit(f"Q{q.id} [{q.domain}] {status}\nCorrect: {order.to_display(q, q.answer)} — {q.answer_text}", title=f"Your answer: {order.to_display(q, a.chosen)}", border_style='magenta'))
     return build_session_result(ans, user=user)
 
 def render_summary(res:SessionResult)->None:
@@ -65,3 +74,22 @@ def render_summary(res:SessionResult)->None:
         t.add_row(d,str(c),str(tot),f"{pct}%")
     console.print(t)
     if res.wrong_question_ids: console.print('[yellow]Questions to Review:[/yellow] '+', '.join(map(str,res.wrong_question_ids)))
+
+def _fmt_s(x:float)->str: return f"{int(x//60)}m {x%60:04.1f}s" if x>=60 else f"{x:.1f}s" if x>=1 else f"{x*1000:.0f}ms"
+
+def render_timing(st:Dict[str,Any], top:int=5)->None:
+    """Time per question against the budget, and the slowest domains."""
+    console.print(f"Time per question: mean [bold]{_fmt_s(st['mean_s'])}[/bold] • median {_fmt_s(st['median_s'])} • p90 {_fmt_s(st['p90_s'])} • "
+                  f"budget {_fmt_s(st['budget_s'])} • over budget: {st['over_budget']}/{st['n']} • total {_fmt_s(st['total_s'])}")
+    t=Table(title='Slowest Domains'); t.add_column('Domain'); t.add_column('Answered'); t.add_column('Mean'); t.add_column('Max'); t.add_column('Over budget')
+    for d,x in list(st['domains'].items())[:top]:
+        style='red' if x['mean_s']>st['budget_s'] else ''
+        t.add_row(d, str(x['n']), Text(_fmt_s(x['mean_s']), style=style), _fmt_s(x['max_s']), str(x['over_budget']))
+    console.print(t)
+
+def render_profile(totals:Dict[str,List[float]], trace_path:Optional[Path])->None:
+    console.rule('Profile')
+    t=Table(title='Phase Timings'); t.add_column('Phase'); t.add_column('Count'); t.add_column('Total ms'); t.add_column('Mean ms')
+    for name,(n,ms) in sorted(totals.items(), key=lambda kv: -kv[1][1]): t.add_row(name, str(n), f"{ms:.1f}", f"{ms/n:.2f}")
+    console.print(t)
+    if trace_path is not None: console.print(f"[green]Saved Chrome trace to[/green] {trace_path} (open in chrome://tracing or ui.perfetto.dev)")
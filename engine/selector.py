@@ -1,38 +1,149 @@
 from __future__ import annotations
 import random
-from typing import Dict, List, Optional
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+from .bank import QuestionBank
 from .models import Question
 
-def filter_pool(qs:List[Question], include_tags:List[str], exclude_tags:List[str], mi:Optional[int], ma:Optional[int])->List[Question]:
-    def ok(q:Question)->bool:
-        if include_tags and not any(t.lower() in [x.lower() for x in q.tags] for t in include_tags): return False
-        if exclude_tags and any(t.lower() in [x.lower() for x in q.tags] for t in exclude_tags): return False
-        if mi is not None and (q.difficulty or 0) < mi: return False
-        if ma is not None and (q.difficulty or 0) > ma: return False
-        return True
-    return [q for q in qs if ok(q)]
-
-def select_questions(qs:List[Question], total:int, weights:Dict[str,float], shuffle:bool=True)->List[Question]:
-    by={}
-    for q in qs: by.setdefault(q.domain,[]).append(q)
+def _mask(rows:Iterable[int], n:int)->int:
+    bits=bytearray((n+7)//8)
+    for r in rows: bits[r>>3]|=1<<(r&7)
+    return int.from_bytes(bits,'little')
+
+def iter_rows(mask:int)->List[int]:
+    """Set bit positions of ``mask`` in ascending order."""
+    s=bin(mask)[:1:-1]; out=[]; i=s.find('1')
+    while i!=-1: out.append(i); i=s.find('1',i+1)
+    return out
+
+class QuestionIndex:
+    """Lookup tables over one bank, built once: case-folded tag -> row bitset,
+    domain -> row bitset, and sorted difficulty buckets. Bitsets are plain ints
+    over row numbers, so filters are &/|/~ rather than per-question scans.
+    ``mask`` marks the rows this index currently exposes; filter() narrows it
+    and returns a new index that shares the tables."""
+    def __init__(self, qs:Sequence[Question])->None:
+        self.questions=qs; n=len(qs); self.mask=(1<<n)-1
+        if isinstance(qs,QuestionBank):
+            # postings come precomputed with the compiled bank; tags are looked up on first use
+            dom=dict(qs.domain_postings()); dif={}
+            for k,r in qs.difficulty_postings().items(): dif.setdefault(k or 0,[]).extend(r)
+            self._tag_rows=qs.tag_rows
+        else:
+            dom:Dict[str,List[int]]={}; tag:Dict[str,List[int]]={}; dif:Dict[int,List[int]]={}
+            for i,q in enumerate(qs):
+                dom.setdefault(q.domain,[]).append(i); dif.setdefault(q.difficulty or 0,[]).append(i)
+                for t in q.tags: tag.setdefault(t.casefold(),[]).append(i)
+            self._tag_rows=lambda t: tag.get(t,())
+        self._domain_bits={d:_mask(r,n) for d,r in dom.items()}
+        self._difficulty_keys=sorted(dif); self._difficulty_bits=[_mask(dif[k],n) for k in self._difficulty_keys]
+        self._tag_bits:Dict[str,int]={}
+    def _derive(self, mask:int)->'QuestionIndex':
+        sub=object.__new__(QuestionIndex); sub.__dict__.update(self.__dict__); sub.mask=mask; return sub
+    def __len__(self)->int: return bin(self.mask).count('1')
+    def tag_bits(self, tag:str)->int:
+        t=tag.casefold(); m=self._tag_bits.get(t)
+        if m is None: m=self._tag_bits[t]=_mask(self._tag_rows(t),len(self.questions))
+        return m
+    def difficulty_bits(self, lo:Optional[int], hi:Optional[int])->int:
+        keys=self._difficulty_keys
+        a=0 if lo is None else bisect_left(keys,lo); b=len(keys) if hi is None else bisect_right(keys,hi)
+        m=0
+        for bits in self._difficulty_bits[a:b]: m|=bits
+        return m
+    def filter(self, include_tags:Sequence[str]=(), exclude_tags:Sequence[str]=(), mi:Optional[int]=None, ma:Optional[int]=None)->'QuestionIndex':
+        m=self.mask
+        if include_tags:
+            inc=0
+            for t in include_tags: inc|=self.tag_bits(t)
+            m&=inc
+        for t in exclude_tags: m&=~self.tag_bits(t)
+        if mi is not None or ma is not None: m&=self.difficulty_bits(mi,ma)
+        return self._derive(m)
+    def collapse(self, clusters:Optional[Sequence[Sequence[int]]]=None, rng:Any=None)->'QuestionIndex':
+        """Keep one row, picked at random, of each near-duplicate cluster (row groups; default the bank's
+        own ``clusters``) among the rows this index exposes, so selection treats a cluster as one item."""
+        groups=getattr(self.questions,'clusters',()) if clusters is None else clusters
+        if not groups: return self
+        rng=rng or random; live=set(self.rows()); drop=[]
+        for g in groups:
+            act=[r for r in g if r in live]
+            if len(act)>1: keep=rng.choice(act); drop+=[r for r in act if r!=keep]
+        return self._derive(self.mask&~_mask(drop,len(self.questions)))
+    def rows(self)->List[int]: return iter_rows(self.mask)
+    def domains(self)->List[str]: return [d for d,b in self._domain_bits.items() if b&self.mask]
+    def domain_bits(self, domain:str)->int: return self._domain_bits.get(domain,0)&self.mask
+    def domain_rows(self, domain:str)->List[int]: return iter_rows(self.domain_bits(domain))
+    def by_domain(self)->Dict[str,List[Question]]:
+        qs=self.questions; return {d:[qs[r] for r in iter_rows(b&self.mask)] for d,b in self._domain_bits.items() if b&self.mask}
+    def active(self)->List[Question]:
+        qs=self.questions; return [qs[r] for r in self.rows()]
+
+Pool=Union[Sequence[Question],QuestionIndex]
+
+def _as_index(qs:Pool)->QuestionIndex: return qs if isinstance(qs,QuestionIndex) else QuestionIndex(qs)
+
+def filter_pool(qs:Pool, include_tags:List[str], exclude_tags:List[str], mi:Optional[int], ma:Optional[int])->List[Question]:
+    return _as_index(qs).filter(include_tags, exclude_tags, mi, ma).active()
+
+def apportion(total:int, weights:Dict[str,float], capacity:Dict[str,int])->Dict[str,int]:
+    """Largest-remainder (Hamilton) split of ``total`` seats by ``weights``, never giving a
+    domain more than its ``capacity``; seats a full domain cannot take are re-split among
+    the others. The result sums to min(total, capacity of the weighted domains)."""
+    out={d:0 for d in weights}; live={d:float(w) for d,w in weights.items() if float(w)>0 and capacity.get(d,0)>0}; left=total
+    while left>0 and live:
+        wsum=sum(live.values()); quota={d:left*w/wsum for d,w in live.items()}
+        seats={d:int(q) for d,q in quota.items()}
+        # ties go to the heavier weight, then to dict order, so the split is deterministic
+        order=sorted(live, key=lambda d: (quota[d]-seats[d], live[d]), reverse=True)
+        for d in order[:left-sum(seats.values())]: seats[d]+=1
+        full=[d for d in live if out[d]+seats[d]>=capacity[d]]
+        if not full:
+            for d in live: out[d]+=seats[d]
+            break
+        for d in full: left-=capacity[d]-out[d]; out[d]=capacity[d]; del live[d]
+    return out
+
+def sample_rows(qs:Pool, total:int, weights:Dict[str,float], rng:Any=None)->List[int]:
+    """Pick ``total`` row numbers, apportioned across domains by ``weights`` and backfilled
+    from the rest of the pool; O(pool + total). Rows are grouped by domain, in weights order."""
+    idx=_as_index(qs); rng=rng or random  # module-level functions share the global (seeded) instance
+    by={d:idx.domain_rows(d) for d in weights}
+    return _draw(idx, by, apportion(total, weights, {d:len(r) for d,r in by.items()}), total, rng)
+
+def _draw(idx:QuestionIndex, by:Dict[str,List[int]], counts:Dict[str,int], total:int, rng:Any)->List[int]:
     sel=[]
-    for d,w in weights.items():
-        need=round(total*float(w)); pool=by.get(d,[])
-        if pool: sel+=random.sample(pool, min(need,len(pool)))
+    for d,c in counts.items():
+        if c: sel+=rng.sample(by[d], c)
     if len(sel)<total:
-        rem=[q for q in qs if q not in sel]
-        short=total-len(sel)
-        if rem: sel+=random.sample(rem, min(short,len(rem)))
-    sel=sel[:total]
-    if shuffle: random.shuffle(sel)
+        rem=iter_rows(idx.mask&~_mask(sel,len(idx.questions)))
+        if rem: sel+=rng.sample(rem, min(total-len(sel),len(rem)))
     return sel
 
-def blueprint_select(qs:List[Question], bp:Dict[str,int], shuffle:bool=True)->List[Question]:
-    by={}
-    for q in qs: by.setdefault(q.domain,[]).append(q)
+def select_questions(qs:Pool, total:int, weights:Dict[str,float], shuffle:bool=True, rng:Any=None)->List[Question]:
+    idx=_as_index(qs); rng=rng or random
+    rows=sample_rows(idx, total, weights, rng)
+    if shuffle: rng.shuffle(rows)
+    return [idx.questions[r] for r in rows]
+
+def generate_forms(qs:Pool, k:int, total:int, weights:Dict[str,float], *, seed:Optional[int]=None, shuffle:bool=True)->List[List[Question]]:
+    """Build ``k`` independent forms in one pass. Domain pools and the apportionment are
+    computed once; form i draws from its own Random(f'{seed}:{i}'), so any single form can
+    be regenerated from (seed, i)."""
+    idx=_as_index(qs); by={d:idx.domain_rows(d) for d in weights}
+    counts=apportion(total, weights, {d:len(r) for d,r in by.items()}); forms=[]
+    for i in range(k):
+        rng=random.Random(f'{seed}:{i}') if seed is not None else random.Random()
+        rows=_draw(idx, by, counts, total, rng)
+        if shuffle: rng.shuffle(rows)
+        forms.append([idx.questions[r] for r in rows])
+    return forms
+
+def blueprint_select(qs:Pool, bp:Dict[str,int], shuffle:bool=True, rng:Any=None)->List[Question]:
+    idx=_as_index(qs); rng=rng or random
     pick=[]
     for d,c in bp.items():
-        pool=by.get(d,[])
-        if pool: pick+=random.sample(pool, min(c,len(pool)))
-    if shuffle: random.shuffle(pick)
-    return pick
+        pool=idx.domain_rows(d)
+        if pool: pick+=rng.sample(pool, min(c,len(pool)))
+    if shuffle: rng.shuffle(pick)
+    return [idx.questions[r] for r in pick]
@@ -0,0 +1,254 @@
+from __future__ import annotations
+import argparse, asyncio, json, os, random, re, secrets, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from rich.console import Console
+from rich.markup import escape
+from .analytics import build_session_result
+from .bank import QuestionBank
+from .exam import ExamSession
+from .history import HistoryStore, migrate_json_history, open_history_store
+from .loader import is_archive, load_metadata, load_questions
+from .models import AnswerRecord, SessionConfig
+from .options import parse_choice
+from .selector import QuestionIndex, blueprint_select, select_questions
+from .storage import history_record
+
+# Multi-candidate exam server ("python -m engine.main serve"). One process loads the
+# bank once and hosts every candidate's ExamSession on a single asyncio loop behind a
+# tiny localhost HTTP/JSON API:
+#   POST /sessions                 {"user", "num_questions", "time_limit", "adaptive", "seed", "reveal", ...}
+#   GET  /sessions/<id>/question   current question (or {"done": true})
+#   POST /sessions/<id>/answer     {"choice": "B"} (multi-answer items: "A,C"); letters as shown
+#   POST /sessions/<id>/finish     score summary; the record is queued for the history writer
+#   GET  /stats                    live/checkpointed sessions, history queue depth
+# Only --max-live sessions stay in memory; the least recently used are checkpointed to
+# --state-dir and transparently restored on their next request. A session whose time is
+# up is finished with the answers given so far (the next question/answer call reports it,
+# /finish returns its summary), and checkpoints untouched for --state-ttl are finished
+# and removed by the sweeper.
+
+MAX_BODY=1<<20
+USER_RE=re.compile(r'[A-Za-z0-9_.-]{1,64}')   # user names become history file names: no separators, no ".."
+_REASONS={200:'OK',201:'Created',400:'Bad Request',404:'Not Found',405:'Method Not Allowed',409:'Conflict',413:'Payload Too Large',500:'Internal Server Error'}
+
+console=Console()
+
+class HttpError(Exception):
+    def __init__(self, status:int, message:str)->None: super().__init__(message); self.status=status
+
+class Bank:
+    """The shared, read-only question bank."""
+    def __init__(self, questions:QuestionBank, meta:Dict[str,Any])->None:
+        self.index=QuestionIndex(questions); self.by_id=questions.by_id
+        self.weights=meta.get('domains') or {d:1.0 for d in self.index.domains()}; self.title=meta.get('title')
+
+class HistoryWriter:
+    """Single consumer that drains finished sessions in batches. Stores are opened, written and
+    closed on one dedicated thread (SQLite connections must stay on the thread that made them)."""
+    def __init__(self, results_dir:Path, backend:str, batch:int=64, linger:float=0.05)->None:
+        self.results_dir=results_dir; self.backend=backend; self.batch=batch; self.linger=linger
+        self.queue:asyncio.Queue=asyncio.Queue(); self.stores:Dict[Path,HistoryStore]={}; self.migrated:Set[str]=set()
+        self.pool=ThreadPoolExecutor(1, thread_name_prefix='history'); self.written=0; self.failed=0
+    def path_for(self, user:str)->Path:
+        return self.results_dir/('history.sqlite' if self.backend=='sqlite' else f'history_{user}.jsonl')
+    def _write(self, groups:Dict[Path,List[Dict[str,Any]]])->None:
+        for path,recs in groups.items():
+            store=self.stores.get(path)
+            if store is None: store=self.stores[path]=open_history_store(path)
+            for user in {r['user'] for r in recs}-self.migrated:   # per user: the sqlite store is shared
+                migrate_json_history(self.results_dir/f'history_{user}.json', store); self.migrated.add(user)
+            store.append_many(recs)
+    async def run(self)->None:
+        loop=asyncio.get_running_loop()
+        while True:
+            recs=[await self.queue.get()]; deadline=loop.time()+self.linger
+            while len(recs)<self.batch:
+                try: recs.append(await asyncio.wait_for(self.queue.get(), max(0.0, deadline-loop.time())))
+                except asyncio.TimeoutError: break
+            groups:Dict[Path,List[Dict[str,Any]]]={}
+            for r in recs: groups.setdefault(self.path_for(r['user']),[]).append(r)
+            try: await loop.run_in_executor(self.pool, self._write, groups); self.written+=len(recs)
+            except Exception as e:   # log and keep draining: a dead writer would strand every later record
+                self.failed+=len(recs); console.print(f'[red]History write failed ({len(recs)} records):[/red] {e.__class__.__name__}: {escape(str(e))}')
+            finally:
+                for _ in recs: self.queue.task_done()
+    def _close(self)->None:
+        for s in self.stores.values(): s.close()
+    async def close(self)->None:
+        await asyncio.get_running_loop().run_in_executor(self.pool, self._close); self.pool.shutdown()
+
+class Live:
+    __slots__=('sess','user','touched')
+    def __init__(self, sess:ExamSession, user:str)->None: self.sess=sess; self.user=user; self.touched=time.monotonic()
+
+class ExamServer:
+    def __init__(self, bank:Bank, state_dir:Path, writer:HistoryWriter, max_live:int=1000, idle_seconds:float=300.0, state_ttl:float=86400.0)->None:
+        self.bank=bank; self.state_dir=state_dir; self.writer=writer; self.max_live=max_live; self.idle_seconds=idle_seconds; self.state_ttl=state_ttl
+        self.live:'OrderedDict[str,Live]'=OrderedDict(); self.evictions=0; self.restores=0; self.timeouts=0; self.reaped=0
+        self.expired:'OrderedDict[str,Dict[str,Any]]'=OrderedDict()   # sid -> summary of sessions finished at their deadline
+        state_dir.mkdir(parents=True, exist_ok=True)
+
+    # ---- session lifecycle -------------------------------------------------
+    def _config(self, body:Dict[str,Any], n:int)->SessionConfig:
+        return SessionConfig(num_questions=n, time_limit_minutes=int(body.get('time_limit',75)), reveal_mode=body.get('reveal','after'),
+                             shuffle_options=bool(body.get('shuffle_options')), adaptive=bool(body.get('adaptive')), adaptive_mode=body.get('adaptive') if body.get('adaptive') in ('domain','irt') else 'domain',
+                             include_tags=body.get('include_tags',[]), exclude_tags=body.get('exclude_tags',[]),
+                             min_difficulty=body.get('min_difficulty'), max_difficulty=body.get('max_difficulty'), title=self.bank.title, seed=body.get('seed'))
+    def create(self, body:Dict[str,Any])->Dict[str,Any]:
+        user=str(body.get('user','default')); rng=random.Random(body.get('seed'))
+        if not USER_RE.fullmatch(user) or '..' in user: raise HttpError(400,'user must be 1-64 of A-Z a-z 0-9 _ . - (no "..")')
+        pool=self.bank.index.filter(body.get('include_tags',[]), body.get('exclude_tags',[]), body.get('min_difficulty'), body.get('max_difficulty'))
+        if not len(pool): raise HttpError(409,'no questions after applying filters')
+        if body.get('blueprint'): sel=blueprint_select(pool, body['blueprint'], rng=rng)
+        else: sel=select_questions(pool, int(body.get('num_questions',40)), body.get('weights') or self.bank.weights, rng=rng)
+        sess=ExamSession(sel, self._config(body,len(sel)), rng=rng); sess.start()
+        sid=secrets.token_hex(8); self._put(sid, Live(sess,user))
+        return {'session_id':sid,'total':len(sel),'time_limit_seconds':sess.remaining_seconds()}
+    def _ckpt(self, sid:str)->Path: return self.state_dir/f'{sid}.json'
+    def _put(self, sid:str, live:Live)->None:
+        self.live[sid]=live; self.live.move_to_end(sid)
+        while len(self.live)>self.max_live: self._evict(next(iter(self.live)))
+    def _evict(self, sid:str)->None:
+        live=self.live.pop(sid); snap={'user':live.user,'config':live.sess.config.__dict__,'session':live.sess.snapshot()}
+        tmp=self._ckpt(sid).with_suffix('.tmp'); tmp.write_text(json.dumps(snap), encoding='utf-8'); os.replace(tmp, self._ckpt(sid))
+        self.evictions+=1
+    def get(self, sid:str)->Live:
+        live=self.live.get(sid)
+        if live is None:
+            p=self._ckpt(sid)
+            if not p.exists(): raise HttpError(404,'unknown session')
+            snap=json.loads(p.read_text(encoding='utf-8'))
+            sess=ExamSession([], SessionConfig(**snap['config']), rng=random.Random()); sess.restore(snap['session'], self.bank.by_id)
+            live=Live(sess, snap['user']); p.unlink(); self.restores+=1
+        live.touched=time.monotonic(); self._put(sid, live)
+        return live
+    def sweep(self)->None:
+        cutoff=time.monotonic()-self.idle_seconds
+        for sid,live in list(self.live.items()):
+            if live.sess.is_time_up(): self._expire(sid, live)
+            elif live.touched<cutoff: self._evict(sid)
+        stale=time.time()-self.state_ttl
+        for p in self.state_dir.glob('*.json'):
+            try:
+                if p.stat().st_mtime>=stale: continue
+                snap=json.loads(p.read_text(encoding='utf-8')); answers=[AnswerRecord(**a) for a in snap['session'].get('answers',[])]
+            except (OSError, ValueError, KeyError, TypeError): continue   # vanished (restored meanwhile) or unreadable: left for inspection
+            if answers: self.writer.queue.put_nowait(history_record(build_session_result(answers, user=snap['user'])))
+            p.unlink(missing_ok=True); self.reaped+=1
+    def _finish(self, sid:str, live:Live)->Dict[str,Any]:
+        res=build_session_result(live.sess.answers, user=live.user); self.live.pop(sid, None)
+        self.writer.queue.put_nowait(history_record(res))
+        return {'total':res.total,'correct':res.correct,'percentage':res.percentage,'per_domain':res.per_domain,'wrong_question_ids':res.wrong_question_ids}
+    def _expire(self, sid:str, live:Live)->Dict[str,Any]:
+        out=self.expired[sid]={**self._finish(sid, live),'timed_out':True}; self.timeouts+=1
+        while len(self.expired)>self.max_live: self.expired.popitem(last=False)
+        return out
+
+    # ---- API ---------------------------------------------------------------
+    def question(self, sid:str)->Dict[str,Any]:
+        if sid in self.expired: return {'done':True,**self.expired[sid]}
+        live=self.get(sid); sess=live.sess
+        if sess.is_time_up(): return {'done':True,**self._expire(sid, live)}
+        q=sess.next_question()
+        if q is None: return {'done':True,'answered':len(sess.answers),'remaining_seconds':sess.remaining_seconds()}
+        return {'done':False,'index':len(sess.answers)+1,'total':len(sess.questions),'remaining_seconds':sess.remaining_seconds(),
+                'id':q.id,'domain':q.domain,'type':q.type,'question':q.question,'options':sess.options.display(q),'multi':',' in q.answer,'media':q.media}
+    def answer(self, sid:str, body:Dict[str,Any])->Dict[str,Any]:
+        if sid in self.expired: raise HttpError(409,'time is up: the session was finished with the answers given')
+        live=self.get(sid); sess=live.sess
+        if sess.is_time_up(): self._expire(sid, live); raise HttpError(409,'time is up: the session was finished with the answers given')
+        q=sess.next_question()
+        if q is None: raise HttpError(409,'session is over')
+        if body.get('question_id') not in (None,q.id): raise HttpError(409,f'question {q.id} is pending')
+        letters=sess.options.letters(q); choice=parse_choice(str(body.get('choice','')), letters, ',' in q.answer)
+        if choice is None: raise HttpError(400,f"choice must be {'letters' if ',' in q.answer else 'one'} of {','.join(letters)}")
+        ok=sess.submit(q, choice); out:Dict[str,Any]={'recorded':True,'answered':len(sess.answers)}
+        if sess.config.reveal_mode=='after': out.update(correct=ok, answer=sess.options.to_display(q, q.answer), answer_text=q.answer_text)
+        return out
+    def finish(self, sid:str)->Dict[str,Any]:
+        if sid in self.expired: return self.expired.pop(sid)
+        return self._finish(sid, self.get(sid))
+    def stats(self)->Dict[str,Any]:
+        return {'live':len(self.live),'checkpointed':sum(1 for _ in self.state_dir.glob('*.json')),'evictions':self.evictions,
+                'restores':self.restores,'timeouts':self.timeouts,'reaped':self.reaped,'history_queue':self.writer.queue.qsize(),'history_written':self.writer.written,'history_failed':self.writer.failed,'bank':len(self.bank.by_id)}
+
+    def route(self, method:str, path:str, body:Dict[str,Any])->Tuple[int,Dict[str,Any]]:
+        parts=[p for p in path.split('?',1)[0].split('/') if p]
+        if parts==['health']: return 200,{'ok':True}
+        if parts==['stats']: return 200,self.stats()
+        if parts==['sessions']:
+            if method!='POST': raise HttpError(405,'use POST')
+            return 201,self.create(body)
+        if len(parts)==3 and parts[0]=='sessions':
+            sid,action=parts[1],parts[2]
+            if action=='question' and method=='GET': return 200,self.question(sid)
+            if action=='answer' and method=='POST': return 200,self.answer(sid, body)
+            if action=='finish' and method=='POST': return 200,self.finish(sid)
+        raise HttpError(404,'no such endpoint')
+
+    # ---- HTTP --------------------------------------------------------------
+    async def handle(self, reader:asyncio.StreamReader, writer:asyncio.StreamWriter)->None:
+        try:
+            while True:
+                try: head=await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError): break
+                lines=head.decode('latin-1').split('\r\n'); method,path,_=(lines[0].split(' ')+['',''])[:3]
+                headers={k.strip().lower():v.strip() for k,_,v in (l.partition(':') for l in lines[1:] if l)}
+                try:
+                    n=int(headers.get('content-length','0') or 0)
+                    if n>MAX_BODY: raise HttpError(413,'body too large')
+                    raw=await reader.readexactly(n) if n else b''
+                    try: body=json.loads(raw) if raw else {}
+                    except ValueError: raise HttpError(400,'body must be JSON')
+                    if not isinstance(body,dict): raise HttpError(400,'body must be a JSON object')
+                    status,payload=self.route(method, path, body)
+                except HttpError as e: status,payload=e.status,{'error':str(e)}
+                except Exception as e: status,payload=500,{'error':f'{e.__class__.__name__}: {e}'}
+                data=json.dumps(payload).encode('utf-8'); close=headers.get('connection','').lower()=='close'
+                writer.write(f"HTTP/1.1 {status} {_REASONS.get(status,'')}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                             f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n".encode('latin-1')+data)
+                await writer.drain()
+                if close: break
+        finally:
+            writer.close()
+
+async def serve(args:argparse.Namespace)->None:
+    data_dir=Path(args.data_dir); q_path=data_dir/args.questions_file; m_path=data_dir/args.metadata_file
+    if is_archive(q_path) and not m_path.exists(): m_path=q_path
+    t0=time.perf_counter(); bank=Bank(load_questions(q_path), load_metadata(m_path) if m_path.exists() else {})
+    results=Path(args.results_dir); writer=HistoryWriter(results, args.history_backend)
+    app=ExamServer(bank, Path(args.state_dir) if args.state_dir else results/'server_state', writer, args.max_live, args.idle_seconds, args.state_ttl)
+    wtask=asyncio.create_task(writer.run())
+    async def sweeper()->None:
+        while True: await asyncio.sleep(min(30.0,args.idle_seconds)); app.sweep()
+    stask=asyncio.create_task(sweeper())
+    server=await asyncio.start_server(app.handle, args.host, args.port, backlog=1024)
+    port=server.sockets[0].getsockname()[1]
+    console.print(f'Serving {len(bank.by_id)} questions (loaded in {(time.perf_counter()-t0)*1000:.0f} ms) on http://{args.host}:{port}')
+    try:
+        async with server: await server.serve_forever()
+    finally:
+        stask.cancel(); join=asyncio.ensure_future(writer.queue.join())
+        await asyncio.wait((join, wtask), return_when=asyncio.FIRST_COMPLETED)   # a writer task that died must not hang shutdown
+        join.cancel(); wtask.cancel(); await writer.close()
+        for sid in list(app.live): app._evict(sid)   # keep unfinished sessions across restarts
+
+def main(argv:Optional[List[str]]=None)->None:
+    p=argparse.ArgumentParser(prog='engine.main serve', description='Host many exam sessions over a local HTTP/JSON API')
+    p.add_argument('--data-dir', type=str, default=str(Path(__file__).resolve().parents[1]/'data'))
+    p.add_argument('--questions-file', type=str, default='questions.jsonl')
+    p.add_argument('--metadata-file', type=str, default='metadata.json')
+    p.add_argument('--host', type=str, default='127.0.0.1', help='Bind address (default: localhost only)')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--max-live', type=int, default=1000, help='Sessions kept in memory; older ones are checkpointed to --state-dir')
+    p.add_argument('--idle-seconds', type=float, default=300.0, help='Checkpoint sessions idle for this long')
+    p.add_argument('--state-dir', type=str, default='')
+    p.add_argument('--state-ttl', type=float, default=86400.0, help='Finish (answers so far go to history) and remove checkpoints untouched for this many seconds')
+    p.add_argument('--results-dir', type=str, default=str(Path(__file__).resolve().parents[1]/'results'))
+    p.add_argument('--history-backend', choices=['jsonl','sqlite'], default='jsonl')
+    args=p.parse_args(argv)
+    try: asyncio.run(serve(args))
+    except KeyboardInterrupt: pass
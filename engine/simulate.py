@@ -0,0 +1,173 @@
+from __future__ import annotations
+import argparse, json, math, os, random, time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from rich.console import Console
+from rich.table import Table
+from .adaptive import item_difficulty
+from .exam import ExamSession
+from .loader import load_metadata, load_questions, is_archive
+from .models import Question, SessionConfig
+from .selector import QuestionIndex, blueprint_select, select_questions
+from .timer import VirtualClock
+
+# Headless batch simulation ("python -m engine.main simulate"): synthetic candidates
+# answer thousands of sessions through the normal ExamSession loop on a virtual clock.
+# Work is cut into fixed shards, each seeded from (--seed, shard number), so totals do
+# not depend on how many worker processes ran them or in which order they finished.
+
+console=Console()
+SHARD_SIZE=50
+
+class Policy(ABC):
+    """Answers a question for a synthetic candidate. p_correct() is the only thing most policies override."""
+    def __init__(self, think_seconds:float=60.0)->None: self.think_seconds=think_seconds
+    @abstractmethod
+    def p_correct(self, q:Question)->float: ...
+    def think(self, rng:random.Random)->float:
+        # log-normal think time around the configured median
+        return self.think_seconds*math.exp(rng.gauss(0.0,0.5)) if self.think_seconds>0 else 0.0
+    def answer(self, q:Question, rng:random.Random)->str:
+        if rng.random()<self.p_correct(q): return q.answer
+        wrong=[k for k in q.options if k!=q.answer]
+        return rng.choice(wrong) if wrong else q.answer
+
+class RandomPolicy(Policy):
+    def p_correct(self, q:Question)->float: return 1.0/len(q.options) if q.options else 0.0   # single-answer items
+    def answer(self, q:Question, rng:random.Random)->str: return rng.choice(list(q.options))
+
+class DomainAccuracyPolicy(Policy):
+    def __init__(self, accuracy:Dict[str,float], default:float=0.7, think_seconds:float=60.0)->None:
+        super().__init__(think_seconds); self.accuracy=accuracy; self.default=default
+    def p_correct(self, q:Question)->float: return self.accuracy.get(q.domain,self.default)
+
+class IRTLearner(Policy):
+    """Rasch learner: P(correct)=1/(1+exp(b-theta)) with b from the item's difficulty."""
+    def __init__(self, theta:float=0.0, think_seconds:float=60.0)->None:
+        super().__init__(think_seconds); self.theta=theta
+    def p_correct(self, q:Question)->float: return 1.0/(1.0+math.exp(item_difficulty(q)-self.theta))
+
+def make_policy(spec:Dict[str,Any], rng:random.Random)->Policy:
+    kind=spec['policy']; think=spec['think_seconds']
+    if kind=='random': return RandomPolicy(think)
+    if kind=='domain': return DomainAccuracyPolicy(spec['accuracy'], spec['default_accuracy'], think)
+    if kind=='irt': return IRTLearner(rng.gauss(spec['theta_mean'],spec['theta_sd']), think)
+    raise ValueError(f'unknown policy: {kind}')
+
+_bank:Optional[QuestionIndex]=None
+
+def _init_worker(q_path:str)->None:
+    global _bank
+    _bank=QuestionIndex(load_questions(Path(q_path)))
+
+def run_shard(shard:int, sessions:int, spec:Dict[str,Any])->Dict[str,Any]:
+    """Run ``sessions`` simulated exams; returns mergeable aggregates (score histogram, per-domain counts)."""
+    rng=random.Random(f"{spec['seed']}:{shard}"); t0=time.perf_counter()
+    hist=[0]*101; dom:Dict[str,List[int]]={}; answered=0; timed_out=0; scores=[]
+    for _ in range(sessions):
+        if spec['blueprint']: sel=blueprint_select(_bank, spec['blueprint'], rng=rng)
+        else: sel=select_questions(_bank, spec['num_questions'], spec['weights'], rng=rng)
+        cfg=SessionConfig(num_questions=len(sel), time_limit_minutes=spec['time_limit'], reveal_mode='end', shuffle=True,
+                          adaptive=spec['adaptive'] is not None, adaptive_mode=spec['adaptive'] or 'domain', seed=spec['seed'])
+        clock=VirtualClock(); policy=make_policy(spec, rng)
+        sess=ExamSession(sel, cfg, rng=rng, clock=clock)
+        def ui_ask(q:Question, i:int, total:int, remaining:int)->Optional[str]:
+            dt=policy.think(rng)
+            # out of time mid-question: let the clock hit the deadline and return the timeout sentinel,
+            # so ExamSession auto-submits the question unanswered, as the terminal UI does
+            if dt>=remaining: clock.advance(remaining); return None
+            clock.advance(dt); return sess.options.to_display(q, policy.answer(q, rng))
+        sess.run(ui_ask, lambda ok,q: None)
+        n=len(sess.answers); c=sum(1 for a in sess.answers if a.is_correct); answered+=n
+        if sess.is_time_up(): timed_out+=1
+        pct=(c/len(sel)*100) if sel else 0.0; hist[int(pct)]+=1; scores.append(pct)
+        for a in sess.answers:
+            d=dom.setdefault(a.domain,[0,0]); d[1]+=1
+            if a.is_correct: d[0]+=1
+    return {'shard':shard,'sessions':sessions,'hist':hist,'domains':dom,'answered':answered,'timed_out':timed_out,
+            'sum':sum(scores),'sumsq':sum(s*s for s in scores),'cpu_s':time.perf_counter()-t0}
+
+def _merge(tot:Dict[str,Any], r:Dict[str,Any])->None:
+    for k in ('sessions','answered','timed_out','sum','sumsq','cpu_s'): tot[k]=tot.get(k,0)+r[k]
+    tot['hist']=[a+b for a,b in zip(tot.get('hist',[0]*101),r['hist'])]
+    dom=tot.setdefault('domains',{})
+    for d,(c,t) in r['domains'].items():
+        x=dom.setdefault(d,[0,0]); x[0]+=c; x[1]+=t
+
+def _quantile(hist:List[int], q:float)->float:
+    n=sum(hist); target=q*n; run=0
+    for score,c in enumerate(hist):
+        run+=c
+        if run>=target and c: return float(score)
+    return 0.0
+
+def summarize(tot:Dict[str,Any], pass_mark:float, elapsed:float)->Dict[str,Any]:
+    n=tot.get('sessions',0); mean=tot['sum']/n if n else 0.0; var=max(0.0,tot['sumsq']/n-mean*mean) if n else 0.0
+    hist=tot.get('hist',[0]*101)
+    return {'sessions':n,'sessions_per_sec':n/elapsed if elapsed>0 else 0.0,'mean':mean,'sd':math.sqrt(var),
+            'p5':_quantile(hist,0.05),'p50':_quantile(hist,0.5),'p95':_quantile(hist,0.95),
+            'pass_rate':sum(hist[int(math.ceil(pass_mark)):])/n if n else 0.0,'timed_out':tot.get('timed_out',0),
+            'domains':{d:{'correct':c,'total':t,'accuracy':c/t if t else 0.0} for d,(c,t) in sorted(tot.get('domains',{}).items())},
+            'histogram':hist}
+
+def _parse_accuracy(spec:str)->Dict[str,float]:
+    out={}
+    for part in spec.split(','):
+        if part.strip(): name,val=part.rsplit(':',1); out[name.strip()]=float(val)
+    return out
+
+def main(argv:Optional[List[str]]=None)->None:
+    from .main import parse_weights
+    p=argparse.ArgumentParser(prog='engine.main simulate', description='Headless batch simulation of exam sessions')
+    p.add_argument('--data-dir', type=str, default=str(Path(__file__).resolve().parents[1]/'data'))
+    p.add_argument('--questions-file', type=str, default='questions.jsonl')
+    p.add_argument('--metadata-file', type=str, default='metadata.json')
+    p.add_argument('--blueprint', type=str, default='')
+    p.add_argument('--weights', type=str, default='')
+    p.add_argument('--num-questions', type=int, default=40)
+    p.add_argument('--time-limit', type=int, default=75)
+    p.add_argument('--adaptive', nargs='?', const='domain', default=None, choices=['domain','irt'])
+    p.add_argument('--sessions', type=int, default=1000)
+    p.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--policy', choices=['random','domain','irt'], default='domain')
+    p.add_argument('--accuracy', type=str, default='', help='Per-domain accuracy for --policy domain, e.g. "VPN:0.8,Routing:0.6"')
+    p.add_argument('--default-accuracy', type=float, default=0.7)
+    p.add_argument('--theta-mean', type=float, default=0.0, help='Ability distribution for --policy irt (logits)')
+    p.add_argument('--theta-sd', type=float, default=1.0)
+    p.add_argument('--think-seconds', type=float, default=60.0, help='Median virtual think time per question')
+    p.add_argument('--pass-mark', type=float, default=70.0)
+    p.add_argument('--json', type=str, default='')
+    args=p.parse_args(argv)
+    data_dir=Path(args.data_dir); q_path=data_dir/args.questions_file; m_path=data_dir/args.metadata_file
+    if is_archive(q_path) and not m_path.exists(): m_path=q_path
+    questions=load_questions(q_path)   # warms the .qbc cache so workers start from it
+    meta=load_metadata(m_path) if m_path.exists() else {}
+    weights=parse_weights(args.weights, meta.get('domains',{})) or {d:1.0 for d in sorted(questions.domains())}
+    spec={'seed':args.seed,'num_questions':args.num_questions,'time_limit':args.time_limit,'adaptive':args.adaptive,'weights':weights,
+          'blueprint':json.loads(Path(args.blueprint).read_text(encoding='utf-8')) if args.blueprint else None,
+          'policy':args.policy,'accuracy':_parse_accuracy(args.accuracy),'default_accuracy':args.default_accuracy,
+          'theta_mean':args.theta_mean,'theta_sd':args.theta_sd,'think_seconds':args.think_seconds}
+    shards=[(i,min(SHARD_SIZE,args.sessions-i*SHARD_SIZE)) for i in range((args.sessions+SHARD_SIZE-1)//SHARD_SIZE)]
+    console.print(f"[cyan]Simulating[/cyan] {args.sessions} sessions • policy={args.policy} • {len(shards)} shards on {args.workers} worker(s)")
+    tot:Dict[str,Any]={}; t0=time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(str(q_path),)) as ex:
+        futs=[ex.submit(run_shard, i, n, spec) for i,n in shards]
+        for f in as_completed(futs):
+            _merge(tot, f.result()); el=time.perf_counter()-t0; s=summarize(tot, args.pass_mark, el)
+            console.print(f"  {s['sessions']:>7} sessions • {s['sessions_per_sec']:8.1f}/s • mean {s['mean']:.1f}% (sd {s['sd']:.1f}) • pass {s['pass_rate']*100:.1f}%")
+    res=summarize(tot, args.pass_mark, time.perf_counter()-t0)
+    console.rule('Simulation Summary')
+    console.print(f"Sessions: {res['sessions']} in {time.perf_counter()-t0:.1f}s ({res['sessions_per_sec']:.1f}/s) • timed out: {res['timed_out']}")
+    console.print(f"Score: mean {res['mean']:.1f}% • sd {res['sd']:.1f} • p5/p50/p95 {res['p5']:.0f}/{res['p50']:.0f}/{res['p95']:.0f} • pass rate (≥{args.pass_mark:g}%) {res['pass_rate']*100:.1f}%")
+    t=Table(title='Score Distribution'); t.add_column('Score'); t.add_column('Sessions'); t.add_column('')
+    buckets=[sum(res['histogram'][b:b+10]) for b in range(0,100,10)]; buckets[-1]+=res['histogram'][100]; top=max(buckets) or 1
+    for b,c in enumerate(buckets): t.add_row(f"{b*10}-{b*10+9 if b<9 else 100}%", str(c), '█'*round(30*c/top))
+    console.print(t)
+    t=Table(title='Per-Domain Accuracy'); t.add_column('Domain'); t.add_column('Correct'); t.add_column('Total'); t.add_column('%')
+    for d,st in res['domains'].items(): t.add_row(d,str(st['correct']),str(st['total']),f"{st['accuracy']*100:.1f}%")
+    console.print(t)
+    if args.json:
+        Path(args.json).write_text(json.dumps(res, indent=2), encoding='utf-8'); console.print(f"[green]Saved simulation JSON to[/green] {args.json}")
@@ -1,19 +1,17 @@
 from __future__ import annotations
 import csv, json
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Union
 from .models import SessionResult
+from .history import HistoryStore, open_history_store
 
-def append_history(res:SessionResult, path:Path)->None:
-    hist=[]
-    if path.exists():
-        try: hist=json.loads(path.read_text(encoding='utf-8') or '[]')
-        except json.JSONDecodeError:
-            path.with_suffix('.bak.json').write_text(path.read_text(encoding='utf-8'), encoding='utf-8')
-            hist=[]
-    rec={'timestamp':res.timestamp,'user':res.user,'total':res.total,'correct':res.correct,'incorrect':res.incorrect,'percentage':res.percentage,'per_domain':res.per_domain,'wrong_question_ids':res.wrong_question_ids,'answers':[a.__dict__ for a in res.answers]}
-    hist.append(rec)
-    path.write_text(json.dumps(hist, indent=2), encoding='utf-8')
+def history_record(res:SessionResult)->Dict[str,Any]:
+    return {'timestamp':res.timestamp,'user':res.user,'total':res.total,'correct':res.correct,'incorrect':res.incorrect,'percentage':res.percentage,'per_domain':res.per_domain,'wrong_question_ids':res.wrong_question_ids,'answers':[a.__dict__ for a in res.answers]}
+
+def append_history(res:SessionResult, dest:Union[Path,HistoryStore])->None:
+    """Append one session to a history store (or the store for a path: .jsonl log, or SQLite for .db/.sqlite)."""
+    if isinstance(dest,HistoryStore): dest.append(history_record(res)); return
+    with open_history_store(dest) as store: store.append(history_record(res))
 
 def export_csv(res:SessionResult, p:Path)->None:
     with p.open('w',newline='',encoding='utf-8') as f:
@@ -38,6 +36,6 @@ def export_anki_wrong(res:SessionResult, p:Path, qmap:Dict[int,Dict[str,Any]])->
             if a.question_id not in wrong: continue
             q=qmap.get(a.question_id); 
             if not q: continue
-            front=q.get('question','')+'<br>'+ '<br>'.join([f"{k}. {q.get('options',{}).get(k,'')}" for k in ['A','B','C','D']])
+            front=q.get('question','')+'<br>'+ '<br>'.join([f"{k}. {v}" for k,v in q.get('options',{}).items()])
             back=f"Correct: {a.correct} — {q.get('answer_text','')}"; tag=a.domain.replace(' ','_').replace('&','and')
             w.writerow([front, back, tag])
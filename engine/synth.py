@@ -0,0 +1,90 @@
+from __future__ import annotations
+import argparse, json, random
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+from rich.console import Console
+
+# Synthetic question banks ("python -m engine.main synth"): valid questions.jsonl +
+# metadata.json of any size, for benchmarks and simulations. Output depends only on
+# the arguments and --seed.
+
+console=Console()
+
+_WORDS=('policy','route','tunnel','session','profile','cluster','interface','packet','address','certificate',
+        'gateway','firewall','proxy','sensor','fabric','peer','table','timer','cache','signature')
+
+def _sentence(rng:random.Random, words:int)->str:
+    return ' '.join(rng.choice(_WORDS) for _ in range(words)).capitalize()
+
+def make_question(qid:int, rng:random.Random, domains:Sequence[str], tags:Sequence[str], *, tags_per_question:int=2,
+                  difficulty:Sequence[int]=(1,5), options:int=4, media_ratio:float=0.0, multi_ratio:float=0.0)->Dict[str,Any]:
+    letters=[chr(ord('A')+i) for i in range(options)]
+    lo,hi=difficulty; multi=options>2 and rng.random()<multi_ratio
+    return {'id':qid,'domain':rng.choice(domains),'type':'multi' if multi else 'mcq',
+            'question':f'{_sentence(rng,12)}? (synthetic #{qid})',
+            'options':{l:_sentence(rng,6) for l in letters},'answer':sorted(rng.sample(letters,2)) if multi else rng.choice(letters),
+            'answer_text':_sentence(rng,10)+'.','tags':rng.sample(list(tags),min(tags_per_question,len(tags))),
+            'difficulty':rng.randint(lo,hi),'media':['images/synthetic.png'] if rng.random()<media_ratio else []}
+
+def reword(src:Dict[str,Any], qid:int, rng:random.Random)->Dict[str,Any]:
+    """A near-duplicate of ``src`` as merged decks have them: one stem word changed, options in another order."""
+    words=src['question'].split(' '); i=rng.randrange(len(words)-2); words[i]=rng.choice(_WORDS)
+    keys=list(src['options']); vals=list(src['options'].values()); order=rng.sample(range(len(keys)),len(keys))
+    opts={keys[j]:vals[o] for j,o in enumerate(order)}; back={keys[o]:keys[j] for j,o in enumerate(order)}
+    ans=sorted(back[a] for a in src['answer']) if isinstance(src['answer'],list) else back[src['answer']]
+    return {**src,'id':qid,'question':' '.join(words),'options':opts,'answer':ans}
+
+def generate_bank(out_dir:Path, n:int, *, domains:int=6, tag_vocab:int=50, tags_per_question:int=2, difficulty:Sequence[int]=(1,5),
+                  options:int=4, media_ratio:float=0.0, multi_ratio:float=0.0, dup_ratio:float=0.0, seed:int=0, questions_file:str='questions.jsonl', metadata_file:str='metadata.json')->Path:
+    """Write a bank of ``n`` questions to ``out_dir``; returns the questions path. A ``dup_ratio`` share are rewordings of earlier ones."""
+    rng=random.Random(seed); out_dir.mkdir(parents=True, exist_ok=True)
+    dnames=[f'Domain {i+1}' for i in range(domains)]; tnames=[f'tag{i:04d}' for i in range(tag_vocab)]
+    q_path=out_dir/questions_file
+    with q_path.open('w',encoding='utf-8') as f:
+        recent:List[Dict[str,Any]]=[]
+        for i in range(1,n+1):
+            if dup_ratio and recent and rng.random()<dup_ratio: obj=reword(rng.choice(recent), i, rng)
+            else:
+                obj=make_question(i, rng, dnames, tnames, tags_per_question=tags_per_question, difficulty=difficulty,
+                                  options=options, media_ratio=media_ratio, multi_ratio=multi_ratio)
+                if dup_ratio: recent=recent[-999:]+[obj]
+            f.write(json.dumps(obj)+'\n')
+    w=[rng.random()+0.5 for _ in dnames]; tot=sum(w)
+    meta={'title':f'Synthetic bank ({n} questions)','domains':{d:round(x/tot,4) for d,x in zip(dnames,w)},'notes':f'generated with seed {seed}'}
+    (out_dir/metadata_file).write_text(json.dumps(meta, indent=2), encoding='utf-8')
+    return q_path
+
+def make_history(n:int, questions:int, *, users:Sequence[str]=('synthetic',), domains:int=6, answers:int=40, seed:int=0)->List[Dict[str,Any]]:
+    """``n`` history records in the format storage.history_record() writes."""
+    from datetime import datetime, timedelta, timezone
+    rng=random.Random(seed); t0=datetime(2025,1,1,tzinfo=timezone.utc); out=[]
+    for s in range(n):
+        ans=[]
+        for _ in range(answers):
+            q=rng.randint(1,questions); ok=rng.random()<0.65
+            ans.append({'question_id':q,'chosen':'A','correct':'A' if ok else 'B','is_correct':ok,'domain':f'Domain {q%domains+1}'})
+        c=sum(a['is_correct'] for a in ans); per:Dict[str,Dict[str,int]]={}
+        for a in ans:
+            d=per.setdefault(a['domain'],{'correct':0,'total':0}); d['total']+=1; d['correct']+=a['is_correct']
+        out.append({'timestamp':(t0+timedelta(hours=s)).isoformat(),'user':users[s%len(users)],'total':answers,'correct':c,'incorrect':answers-c,
+                    'percentage':round(c/answers*100,2),'per_domain':per,'wrong_question_ids':[a['question_id'] for a in ans if not a['is_correct']],'answers':ans})
+    return out
+
+def main(argv:Optional[List[str]]=None)->None:
+    p=argparse.ArgumentParser(prog='engine.main synth', description='Generate a synthetic question bank')
+    p.add_argument('out_dir', type=str)
+    p.add_argument('--questions', type=int, default=1000)
+    p.add_argument('--domains', type=int, default=6)
+    p.add_argument('--tag-vocab', type=int, default=50)
+    p.add_argument('--tags-per-question', type=int, default=2)
+    p.add_argument('--min-difficulty', type=int, default=1)
+    p.add_argument('--max-difficulty', type=int, default=5)
+    p.add_argument('--options', type=int, default=4, choices=range(2,9))
+    p.add_argument('--media-ratio', type=float, default=0.0)
+    p.add_argument('--multi-ratio', type=float, default=0.0, help='Share of questions with two correct options')
+    p.add_argument('--dup-ratio', type=float, default=0.0, help='Share of questions that reword an earlier one (for dedupe)')
+    p.add_argument('--seed', type=int, default=0)
+    args=p.parse_args(argv)
+    q=generate_bank(Path(args.out_dir), args.questions, domains=args.domains, tag_vocab=args.tag_vocab, tags_per_question=args.tags_per_question,
+                    difficulty=(args.min_difficulty,args.max_difficulty), options=args.options, media_ratio=args.media_ratio, multi_ratio=args.multi_ratio, dup_ratio=args.dup_ratio, seed=args.seed)
+    console.print(f'[green]Wrote {args.questions} questions to[/green] {q} (+ metadata.json)')
@@ -1,18 +1,104 @@
 from __future__ import annotations
-import threading, time
-from rich.live import Live
-from rich.panel import Panel
-from rich.text import Text
-class TimerDisplay:
-    def __init__(self, remaining_seconds_fn, refresh=1.0)->None:
-        self.remaining_seconds_fn=remaining_seconds_fn; self.refresh=refresh
-        self._stop=threading.Event(); self._th=threading.Thread(target=self._run, daemon=True)
-    def start(self): self._th.start()
-    def stop(self): self._stop.set(); self._th.join(timeout=2)
-    def _fmt(self, s:int)->str:
-        m,s=divmod(max(0,int(s)),60); h,m=divmod(m,60); return f"{h}h {m}m {s}s" if h else f"{m}m {s}s"
-    def _run(self):
-        with Live(auto_refresh=False, transient=False) as live:
-            while not self._stop.is_set():
-                secs=self.remaining_seconds_fn(); txt=Text(f"Time Remaining: {self._fmt(secs)}", style='bold white on blue')
-                live.update(Panel(txt, border_style='blue')); live.refresh(); time.sleep(self.refresh)
+import asyncio, math, os, sys, threading, time
+from typing import Callable, IO, Optional
+from rich.cells import cell_len
+from rich.console import Console
+
+# Terminal input for the CLI exam, driven by one asyncio loop (no threads on POSIX):
+#   - stdin is read without blocking (loop.add_reader; one helper thread where the loop
+#     cannot watch stdin, e.g. Windows consoles or a redirected regular file)
+#   - each prompt waits for a line or the exam deadline, whichever comes first, so an
+#     open prompt is auto-submitted the moment time runs out
+#   - the live timer (--live-timer) is a badge in the top-right corner, redrawn by a loop
+#     callback scheduled for the instant its text next changes: once a minute, then once
+#     a second in the last ``fine_below`` seconds. Nothing runs while the text is unchanged.
+
+class VirtualClock:
+    """Drop-in for time.time that only moves when told to (headless runs, tests)."""
+    def __init__(self, start:float=0.0)->None: self.now=start
+    def __call__(self)->float: return self.now
+    def advance(self, seconds:float)->None: self.now+=seconds
+
+def fmt_remaining(secs:int, fine_below:int)->str:
+    """Minutes while more than ``fine_below`` seconds are left, then minutes and seconds."""
+    if secs>fine_below: return f"{math.ceil(secs/60)}m"
+    m,s=divmod(max(0,secs),60); h,m=divmod(m,60); return f"{h}h {m}m {s}s" if h else f"{m}m {s}s"
+
+def next_change(left:float, fine_below:int)->float:
+    """Seconds until fmt_remaining(int(left)) shows something else."""
+    secs=int(left)
+    if secs>fine_below: t=max(60*(math.ceil(secs/60)-1)+1, fine_below+1)   # the minute count drops (or seconds start) once left < t
+    else: t=secs
+    return left-t
+
+class _FdReader:
+    """Lines from a file descriptor the loop can watch; input typed ahead is kept for the next prompt."""
+    def __init__(self, loop:asyncio.AbstractEventLoop, fd:int)->None:
+        self.loop=loop; self.fd=fd; self.buf=b''; self.eof=False; self.waiter:Optional[asyncio.Future]=None
+        loop.add_reader(fd, self._ready)
+    def _ready(self)->None:
+        data=os.read(self.fd, 4096); self.buf+=data
+        if not data: self.eof=True; self.loop.remove_reader(self.fd)
+        if self.waiter is not None and not self.waiter.done(): self.waiter.set_result(None)
+    async def readline(self)->Optional[str]:
+        while b'\n' not in self.buf and not self.eof:
+            self.waiter=self.loop.create_future(); await self.waiter
+        if not self.buf: return None
+        i=self.buf.find(b'\n')+1 or len(self.buf); line,self.buf=self.buf[:i],self.buf[i:]
+        return line.decode(errors='replace')
+    def close(self)->None:
+        if not self.eof: self.loop.remove_reader(self.fd)
+
+class _ThreadReader:
+    """Fallback: a daemon thread blocks in readline(); a read still pending at the deadline carries over to the next prompt."""
+    def __init__(self, loop:asyncio.AbstractEventLoop, f:IO[str])->None:
+        self.loop=loop; self.f=f; self.pending:Optional[asyncio.Future]=None
+    def _read(self, fut:asyncio.Future)->None:
+        line=self.f.readline()
+        try: self.loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(line))
+        except RuntimeError: pass   # loop closed while we were blocked
+    async def readline(self)->Optional[str]:
+        if self.pending is None:
+            self.pending=self.loop.create_future(); threading.Thread(target=self._read, args=(self.pending,), daemon=True).start()
+        line=await asyncio.shield(self.pending); self.pending=None
+        return line or None
+    def close(self)->None: pass
+
+class TerminalUI:
+    """Prompts that give up at the exam deadline, with an optional live countdown badge.
+    ``deadline`` returns the session's deadline on ``clock`` (None: no limit)."""
+    def __init__(self, deadline:Callable[[],Optional[float]], *, clock:Callable[[],float]=time.time, live_timer:bool=False,
+                 fine_below:int=300, console:Optional[Console]=None, stdin:Optional[IO[str]]=None)->None:
+        self.deadline=deadline; self.clock=clock; self.live_timer=live_timer; self.fine_below=fine_below
+        self.console=console or Console(); self.loop=asyncio.new_event_loop(); self.redraws=0
+        self._shown:Optional[str]=None; self._tick_handle:Optional[asyncio.TimerHandle]=None
+        f=self.stdin=stdin or sys.stdin
+        try: self.reader:_FdReader|_ThreadReader=_FdReader(self.loop, f.fileno())
+        except (NotImplementedError, OSError, ValueError): self.reader=_ThreadReader(self.loop, f)   # no add_reader (Windows), or a regular file
+    def _left(self)->Optional[float]:
+        d=self.deadline(); return None if d is None else d-self.clock()
+    def _tick(self)->None:
+        self._tick_handle=None; left=self._left()
+        if left is None or left<=0: return
+        text=fmt_remaining(int(left), self.fine_below)
+        if text!=self._shown: self._draw(f' ⏱ {text} '); self._shown=text
+        self._tick_handle=self.loop.call_later(max(0.0, next_change(left, self.fine_below))+0.001, self._tick)
+    def _draw(self, badge:str)->None:
+        # save cursor, write at row 1 right-aligned, restore: the prompt line and typed input are untouched
+        if not self.console.is_terminal: return
+        col=max(1, self.console.width-cell_len(badge)); self.redraws+=1
+        self.console.file.write(f'\x1b7\x1b[1;{col}H\x1b[1;37;44m{badge}\x1b[0m\x1b8'); self.console.file.flush()
+    async def _ask(self, prompt:str)->Optional[str]:
+        self.console.print(f'{prompt}: ', end='')
+        if self.live_timer and self._tick_handle is None: self._tick()
+        left=self._left()
+        try: line=await asyncio.wait_for(self.reader.readline(), None if left is None else max(0.0, left))
+        except asyncio.TimeoutError: self.console.print(); return None
+        if line is None: raise EOFError
+        return line.rstrip('\r\n')
+    def ask(self, prompt:str)->Optional[str]:
+        """The line typed, or None if the deadline passed first (EOFError at end of input)."""
+        return self.loop.run_until_complete(self._ask(prompt))
+    def close(self)->None:
+        if self._tick_handle is not None: self._tick_handle.cancel()
+        self.reader.close(); self.loop.close()
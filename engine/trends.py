@@ -0,0 +1,186 @@
+from __future__ import annotations
+import argparse, hashlib, json, os
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+from .history import SQLITE_SUFFIXES, open_history_store, to_epoch
+
+# Cross-session analytics over every stored session ("python -m engine.main analytics").
+# History is folded into a cache of sufficient statistics: per-question moment sums
+# (for p-values and item/rest-score correlation) and per-session rows (user, time,
+# score, per-domain correct/total). Each run only ingests records appended since the
+# last one, then computes every report with vectorised NumPy over the cached arrays.
+# The folded sums cannot be split by store again, so each selection of stores gets its
+# own cache under <cache-dir>/<hash of the store paths>.
+
+console=Console()
+CACHE_VERSION=1
+_QCOLS=('n','sx','sy','sxy','syy')
+
+class TrendCache:
+    def __init__(self)->None:
+        self.watermarks:Dict[str,int]={}; self.users:List[str]=[]; self.domains:List[str]=[]
+        self.qid=np.zeros(0,np.int64); self.qstats=np.zeros((0,len(_QCOLS)),np.float64)
+        self.s_user=np.zeros(0,np.int32); self.s_ts=np.zeros(0,np.float64); self.s_pct=np.zeros(0,np.float64)
+        self.s_dom_c=np.zeros((0,0),np.int32); self.s_dom_t=np.zeros((0,0),np.int32)
+
+    @classmethod
+    def load(cls, d:Path)->'TrendCache':
+        c=cls(); man=d/'manifest.json'; arr=d/'arrays.npz'
+        if not (man.exists() and arr.exists()): return c
+        m=json.loads(man.read_text(encoding='utf-8'))
+        if m.get('version')!=CACHE_VERSION: return c
+        with np.load(arr, allow_pickle=False) as z:
+            for k in ('qid','qstats','s_user','s_ts','s_pct','s_dom_c','s_dom_t'): setattr(c,k,z[k])
+        c.watermarks=m['watermarks']; c.users=m['users']; c.domains=m['domains']
+        return c
+
+    def save(self, d:Path)->None:
+        d.mkdir(parents=True, exist_ok=True); tmp=d/f'arrays.tmp{os.getpid()}.npz'
+        np.savez(tmp, qid=self.qid, qstats=self.qstats, s_user=self.s_user, s_ts=self.s_ts, s_pct=self.s_pct, s_dom_c=self.s_dom_c, s_dom_t=self.s_dom_t)
+        os.replace(tmp, d/'arrays.npz')
+        man={'version':CACHE_VERSION,'watermarks':self.watermarks,'users':self.users,'domains':self.domains}
+        (d/'manifest.json').write_text(json.dumps(man), encoding='utf-8')
+
+    def _code(self, vocab:List[str], lookup:Dict[str,int], v:str)->int:
+        i=lookup.get(v)
+        if i is None: i=lookup[v]=len(vocab); vocab.append(v)
+        return i
+
+    def ingest(self, records:Iterable[Dict[str,Any]])->int:
+        """Fold new history records into the cache; returns the number of sessions added."""
+        ucode={u:i for i,u in enumerate(self.users)}; dcode={d:i for i,d in enumerate(self.domains)}
+        s_user:List[int]=[]; s_ts:List[float]=[]; s_pct:List[float]=[]; cells:List[tuple]=[]
+        a_sess:List[int]=[]; a_qid:List[int]=[]; a_x:List[int]=[]
+        for rec in records:
+            answers=rec.get('answers',[])
+            if not answers: continue
+            s=len(s_user); s_user.append(self._code(self.users,ucode,rec.get('user',''))); s_ts.append(to_epoch(rec.get('timestamp')) or 0.0)
+            s_pct.append(sum(1 for a in answers if a.get('is_correct'))/len(answers))
+            for a in answers:
+                a_sess.append(s); a_qid.append(int(a['question_id'])); a_x.append(1 if a.get('is_correct') else 0)
+                cells.append((s, self._code(self.domains,dcode,a.get('domain',''))))
+        if not s_user: return 0
+        ns=len(s_user); nd=len(self.domains)
+        sess=np.asarray(a_sess,np.int64); x=np.asarray(a_x,np.float64); qid=np.asarray(a_qid,np.int64)
+        cell=np.asarray(cells,np.int64).reshape(-1,2)
+        # per-session domain matrix for the new sessions, then widen the old one if domains appeared
+        flat=cell[:,0]*nd+cell[:,1]
+        dom_t=np.bincount(flat,minlength=ns*nd).reshape(ns,nd).astype(np.int32)
+        dom_c=np.bincount(flat,weights=x,minlength=ns*nd).reshape(ns,nd).astype(np.int32)
+        pad=nd-self.s_dom_t.shape[1]
+        old_t=np.pad(self.s_dom_t,((0,0),(0,pad))); old_c=np.pad(self.s_dom_c,((0,0),(0,pad)))
+        self.s_dom_t=np.vstack([old_t,dom_t]); self.s_dom_c=np.vstack([old_c,dom_c])
+        self.s_user=np.concatenate([self.s_user,np.asarray(s_user,np.int32)])
+        self.s_ts=np.concatenate([self.s_ts,np.asarray(s_ts,np.float64)])
+        self.s_pct=np.concatenate([self.s_pct,np.asarray(s_pct,np.float64)])
+        # rest score: the session's accuracy on the *other* items, so an item is not correlated with itself
+        tot=np.bincount(sess,minlength=ns).astype(np.float64); cor=np.bincount(sess,weights=x,minlength=ns)
+        denom=tot[sess]-1.0; y=np.divide(cor[sess]-x, denom, out=np.zeros_like(x), where=denom>0)
+        uq,inv=np.unique(qid, return_inverse=True)
+        add=np.stack([np.bincount(inv,weights=w,minlength=len(uq)) for w in (np.ones_like(x),x,y,x*y,y*y)],axis=1)
+        allq=np.union1d(self.qid,uq); merged=np.zeros((len(allq),len(_QCOLS)))
+        merged[np.searchsorted(allq,self.qid)]+=self.qstats; merged[np.searchsorted(allq,uq)]+=add
+        self.qid=allq; self.qstats=merged
+        return ns
+
+    # ---- reports -----------------------------------------------------------
+    def item_stats(self)->Dict[str,np.ndarray]:
+        n,sx,sy,sxy,syy=self.qstats.T
+        p=np.divide(sx,n,out=np.zeros_like(sx),where=n>0)
+        cov=n*sxy-sx*sy; var=(n*sx-sx*sx)*(n*syy-sy*sy)   # x is 0/1, so sum(x^2)=sum(x)
+        r=np.divide(cov,np.sqrt(np.clip(var,0,None)),out=np.full_like(cov,np.nan),where=var>0)
+        return {'qid':self.qid,'n':n.astype(np.int64),'p':p,'discrimination':r}
+
+    def domain_trends(self, window:int)->Dict[str,Dict[str,float]]:
+        order=np.argsort(self.s_ts,kind='stable'); c=self.s_dom_c[order].astype(np.float64); t=self.s_dom_t[order].astype(np.float64)
+        cc=np.vstack([np.zeros((1,c.shape[1])),np.cumsum(c,axis=0)]); ct=np.vstack([np.zeros((1,t.shape[1])),np.cumsum(t,axis=0)])
+        s=len(order); w=min(window,s)
+        def acc(a:int,b:int)->np.ndarray:
+            tt=ct[b]-ct[a]; return np.divide(cc[b]-cc[a],tt,out=np.full(tt.shape,np.nan),where=tt>0)
+        overall=acc(0,s); last=acc(s-w,s); prev=acc(max(0,s-2*w),s-w)
+        return {d:{'overall':overall[i],'last':last[i],'previous':prev[i],'responses':float(ct[s][i])} for i,d in enumerate(self.domains)}
+
+    def user_percentiles(self)->Dict[str,Dict[str,float]]:
+        if not len(self.s_user): return {}
+        order=np.lexsort((self.s_pct,self.s_user)); u=self.s_user[order]; pct=self.s_pct[order]
+        starts=np.flatnonzero(np.r_[True,u[1:]!=u[:-1]]); ends=np.r_[starts[1:],len(u)]
+        means=np.add.reduceat(pct,starts)/(ends-starts)
+        # percentile rank of each user's mean score among all users (mid-rank for ties)
+        srt=np.sort(means); below=np.searchsorted(srt,means,side='left'); same=np.searchsorted(srt,means,side='right')-below
+        rank=(below+0.5*same)/len(means)*100
+        out={}
+        for k,(a,b) in enumerate(zip(starts,ends)):
+            q=np.percentile(pct[a:b],[10,50,90])*100
+            out[self.users[u[a]]]={'sessions':int(b-a),'mean':means[k]*100,'p10':q[0],'p50':q[1],'p90':q[2],'rank':rank[k]}
+        return out
+
+def _stores(args:argparse.Namespace)->List[Path]:
+    if args.history: return [Path(p) for p in args.history]
+    d=Path(args.results_dir)
+    return sorted(d.glob('history_*.jsonl'))+sorted(p for p in d.glob('history*') if p.suffix.lower() in SQLITE_SUFFIXES)
+
+def cache_key(stores:Iterable[str])->str:
+    return hashlib.sha1('\n'.join(sorted(stores)).encode('utf-8')).hexdigest()[:16]
+
+def run(args:argparse.Namespace)->Dict[str,Any]:
+    stores={str(p.resolve()):p for p in _stores(args)}; counts={}
+    cache_dir=(Path(args.cache_dir) if args.cache_dir else Path(args.results_dir)/'analytics_cache')/cache_key(stores)
+    cache=TrendCache() if args.rebuild else TrendCache.load(cache_dir); added=0
+    if set(cache.watermarks)-set(stores): cache=TrendCache()   # holds sessions from stores outside this selection
+    for key,p in stores.items():
+        with open_history_store(p) as store: counts[key]=store.count()
+    if any(counts[k]<cache.watermarks.get(k,0) for k in stores): cache=TrendCache()   # a store shrank (replaced): start over
+    for key,p in stores.items():
+        wm=cache.watermarks.get(key,0)
+        if counts[key]>wm:
+            with open_history_store(p) as store: added+=cache.ingest(store.query(start=wm))
+            cache.watermarks[key]=counts[key]
+    if added or not (cache_dir/'manifest.json').exists(): cache.save(cache_dir)
+    items=cache.item_stats(); keep=items['n']>=args.min_responses
+    hard=np.argsort(items['p'][keep],kind='stable')[:args.top]
+    report={'sessions':int(len(cache.s_user)),'new_sessions':added,
+            'questions':[{'id':int(items['qid'][keep][i]),'responses':int(items['n'][keep][i]),'p_value':float(items['p'][keep][i]),
+                          'discrimination':None if np.isnan(items['discrimination'][keep][i]) else float(items['discrimination'][keep][i])} for i in hard],
+            'domains':{d:{k:(None if v!=v else float(v)) for k,v in st.items()} for d,st in cache.domain_trends(args.window).items()},
+            'users':{u:{k:float(v) for k,v in st.items()} for u,st in cache.user_percentiles().items()}}
+    return report
+
+def _table(title:str, cols)->Table:
+    t=Table(title=title)
+    for c in cols: t.add_column(c)
+    return t
+
+def render(report:Dict[str,Any], window:int)->None:
+    console.rule(f"History Analytics • {report['sessions']} sessions ({report['new_sessions']} new)")
+    t=_table('Hardest Questions (lowest p-value)', ('Q','Responses','p-value','Discrimination'))
+    for q in report['questions']:
+        t.add_row(str(q['id']),str(q['responses']),f"{q['p_value']:.2f}",'—' if q['discrimination'] is None else f"{q['discrimination']:.2f}")
+    console.print(t)
+    t=_table(f'Domain Accuracy (rolling {window} sessions)', ('Domain','Overall','Last','Previous','Δ'))
+    for d,st in sorted(report['domains'].items()):
+        f=lambda v: '—' if v is None else f'{v*100:.1f}%'
+        delta='—' if st['last'] is None or st['previous'] is None else f"{(st['last']-st['previous'])*100:+.1f}"
+        t.add_row(d,f(st['overall']),f(st['last']),f(st['previous']),delta)
+    console.print(t)
+    t=_table('Users', ('User','Sessions','Mean %','P10','P50','P90','Percentile'))
+    for u,st in sorted(report['users'].items()):
+        t.add_row(u,str(int(st['sessions'])),*(f"{st[k]:.1f}" for k in ('mean','p10','p50','p90','rank')))
+    console.print(t)
+
+def main(argv:Optional[List[str]]=None)->None:
+    p=argparse.ArgumentParser(prog='engine.main analytics', description='Cross-session analytics over stored history')
+    p.add_argument('--results-dir', type=str, default=str(Path(__file__).resolve().parents[1]/'results'))
+    p.add_argument('--history', action='append', default=[], help='History store(s) to read; default: every history store in --results-dir')
+    p.add_argument('--cache-dir', type=str, default='', help='Where to keep the incremental cache (default: <results-dir>/analytics_cache)')
+    p.add_argument('--rebuild', action='store_true', help='Ignore the cache and re-read all history')
+    p.add_argument('--window', type=int, default=10, help='Rolling window, in sessions, for domain trends')
+    p.add_argument('--min-responses', type=int, default=5, help='Only rank questions with at least this many responses')
+    p.add_argument('--top', type=int, default=15)
+    p.add_argument('--json', type=str, default='', help='Also write the report as JSON')
+    args=p.parse_args(argv)
+    report=run(args); render(report, args.window)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding='utf-8'); console.print(f"[green]Saved analytics JSON to[/green] {args.json}")
@@ -0,0 +1,20 @@
+from __future__ import annotations
+import sys
+from pathlib import Path
+from typing import List
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))   # run from anywhere without installing
+
+from engine.models import Question
+
+def make_questions(n:int=6, options:int=4)->List[Question]:
+    keys='ABCDEFGH'[:options]
+    return [Question(i, f'Domain {i%2+1}', 'mcq', f'Question {i}?', {k:f'option {k.lower()} of {i}' for k in keys}, keys[i%options], f'because {i}',
+                     tags=[f'tag{i%3}'], difficulty=i%5+1) for i in range(1, n+1)]
+
+@pytest.fixture
+def questions()->List[Question]: return make_questions()
+
+@pytest.fixture(name='make_questions')
+def make_questions_fixture(): return make_questions
@@ -0,0 +1,41 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+from engine.compiled import CompiledBank, cache_path
+from engine.loader import _parse_stream, load_questions
+from engine.synth import generate_bank
+
+def deck(tmp_path:Path, n:int=300)->Path:
+    return generate_bank(tmp_path, n, domains=5, tag_vocab=40, options=6, media_ratio=0.3, multi_ratio=0.3, seed=7)
+
+def test_compiled_bank_round_trip(tmp_path:Path):
+    src=deck(tmp_path); parsed=_parse_stream(src, [], 1); st:dict={}
+    with load_questions(src, stats=st) as bank:
+        assert st['cache']=='rebuilt' and cache_path(src).exists()
+        assert [v.to_question() for v in bank]==parsed
+        v=bank[17]; q=parsed[17]
+        assert (v.id, v.domain, v.type, v.question, v.options, v.answer, v.answer_text, v.tags, v.difficulty, v.media)==\
+               (q.id, q.domain, q.type, q.question, q.options, q.answer, q.answer_text, q.tags, q.difficulty, q.media)
+        assert set(bank.by_id)=={q.id for q in parsed} and bank.by_id[q.id].question==q.question
+
+def test_postings_match_a_scan(tmp_path:Path):
+    src=deck(tmp_path); parsed=_parse_stream(src, [], 1); load_questions(src).close()
+    with CompiledBank(cache_path(src)) as cb:
+        for d in {q.domain for q in parsed}: assert cb.domain_rows(d)==[i for i,q in enumerate(parsed) if q.domain==d]
+        for t in ('tag0001', 'TAG0002', 'no-such-tag'): assert sorted(cb.tag_rows(t))==[i for i,q in enumerate(parsed) if t.casefold() in q.tags]
+        for k in range(0, 7): assert sorted(cb.difficulty_rows(k))==[i for i,q in enumerate(parsed) if q.difficulty==k]
+        assert all(cb.row_for_id(q.id)==i for i,q in enumerate(parsed)) and cb.row_for_id(10**9) is None
+
+def test_cache_is_reused_until_the_source_changes(tmp_path:Path):
+    src=deck(tmp_path, 50); st:dict={}
+    load_questions(src).close(); load_questions(src, stats=st).close(); assert st['cache']=='hit'
+    with src.open('a', encoding='utf-8') as f: f.write(src.read_text(encoding='utf-8').splitlines()[0].replace('"id": 1,', '"id": 999,')+'\n')
+    os.utime(src, ns=(src.stat().st_atime_ns, src.stat().st_mtime_ns+10**9))
+    with load_questions(src, stats=st) as bank: assert st['cache']=='rebuilt' and len(bank)==51 and bank[50].id==999
+
+def test_bad_lines_are_reported_not_cached(tmp_path:Path):
+    src=deck(tmp_path, 20)
+    with src.open('a', encoding='utf-8') as f: f.write('{"id": "broken"\n')
+    st:dict={}
+    with load_questions(src, stats=st) as bank: assert len(bank)==20 and len(st['errors'])==1 and st['cache']!='rebuilt'
+    assert not cache_path(src).exists()
@@ -0,0 +1,36 @@
+from __future__ import annotations
+import argparse, re
+from pathlib import Path
+import pytest
+from engine.dedupe import find_duplicates, shingles, sig_path, threshold_arg
+from engine.loader import load_questions
+from engine.synth import generate_bank
+
+def test_shingles_ignore_option_order_case_and_markup():
+    assert shingles('Which **policy** matches?', ['Deny all', 'Allow DNS']) == shingles('which policy matches', ['allow dns', 'deny all'])
+    assert shingles('Two words', []) == ['two words']
+
+def test_finds_reworded_questions(tmp_path:Path):
+    src=generate_bank(tmp_path, 400, dup_ratio=0.2, seed=5); st:dict={}
+    with load_questions(src) as bank:
+        groups=find_duplicates(bank, src, stats=st)
+        origin=[int(re.search(r'#(\d+)\)', q.question).group(1)) for q in bank]   # rewordings keep their source's number
+    truth={}
+    for row,o in enumerate(origin): truth.setdefault(o,[]).append(row)
+    want={frozenset(g) for g in truth.values() if len(g)>1}
+    assert all(len({origin[r] for r in g})==1 for g in groups)   # no false merges
+    assert len({frozenset(g) for g in groups}&want)>=0.9*len(want)
+    assert st['cache']=='rebuilt' and sig_path(src).exists()
+
+def test_signature_cache_is_reused(tmp_path:Path):
+    src=generate_bank(tmp_path, 200, dup_ratio=0.1, seed=1)
+    with load_questions(src) as bank:
+        first=find_duplicates(bank, src); st:dict={}
+        assert find_duplicates(bank, src, stats=st)==first and st['cache']=='hit' and st['signed']==0
+
+@pytest.mark.parametrize('text', ['0', '-0.5', '1.01', 'nan', 'x'])
+def test_threshold_must_be_a_similarity(text:str):
+    with pytest.raises(argparse.ArgumentTypeError): threshold_arg(text)
+
+def test_threshold_accepts_unit_interval():
+    assert threshold_arg('1')==1.0 and threshold_arg('0.05')==0.05
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+import pytest
+from engine.history import HistoryStore, JsonlHistoryStore, migrate_json_history, open_history, open_history_store
+
+def rec(i:int, user:str='u')->dict:
+    return {'user':user,'timestamp':f'2024-01-{i+1:02d}T00:00:00+00:00','total':i,'answers':[{'question_id':i,'is_correct':i%2==0}]}
+
+@pytest.fixture(params=['history.jsonl','history.sqlite'])
+def store(request, tmp_path:Path):
+    s=open_history_store(tmp_path/request.param); yield s; s.close()
+
+def test_append_and_query_round_trip(store:HistoryStore):
+    recs=[rec(i, 'a' if i%2 else 'b') for i in range(10)]
+    assert store.append_many(recs)==10 and store.count()==10
+    assert list(store.query())==recs
+    assert list(store.query(user='a'))==[r for r in recs if r['user']=='a']
+    assert list(store.query(since='2024-01-03T00:00:00+00:00', until='2024-01-05T00:00:00+00:00'))==recs[2:5]
+    assert list(store.query(start=7))==recs[7:]
+    store.append(rec(10)); assert store.count()==11 and list(store.query(start=10))==[rec(10)]
+
+def test_backend_by_suffix(tmp_path:Path):
+    assert isinstance(open_history_store(tmp_path/'h.jsonl'), JsonlHistoryStore)
+    with open_history_store(tmp_path/'h.db') as s: assert type(s).__name__=='SqliteHistoryStore'
+
+def test_incomplete_backend_fails_on_creation():
+    class Partial(HistoryStore):
+        def count(self)->int: return 0
+    with pytest.raises(TypeError): Partial()
+
+def test_jsonl_repairs_torn_write(tmp_path:Path):
+    s=JsonlHistoryStore(tmp_path/'h.jsonl', fsync=False); s.append_many([rec(0), rec(1)])
+    with s.path.open('ab') as f: f.write(b'{"user": "u", "timest')   # crash mid-record: no newline, not indexed
+    assert s.count()==2 and list(s.query())==[rec(0), rec(1)]
+    s.append(rec(2))
+    assert s.count()==3 and list(s.query())==[rec(0), rec(1), rec(2)]
+
+def test_jsonl_indexes_records_a_crash_left_unindexed(tmp_path:Path):
+    s=JsonlHistoryStore(tmp_path/'h.jsonl', fsync=False); s.append(rec(0))
+    with s.path.open('ab') as f: f.write((json.dumps(rec(1))+'\n').encode('utf-8'))   # logged, index never written
+    with s.idx_path.open('ab') as f: f.write(b'\x01\x02\x03')                           # torn index entry
+    s.append(rec(2))
+    assert s.count()==3 and list(s.query())==[rec(0), rec(1), rec(2)]
+    assert list(s.query(since='2024-01-02T00:00:00+00:00'))==[rec(1), rec(2)]
+
+def test_no_lock_files_left_behind(tmp_path:Path):
+    s=JsonlHistoryStore(tmp_path/'h.jsonl', fsync=False); s.append_many([rec(0), rec(1)]); s.append(rec(2))
+    assert sorted(p.name for p in tmp_path.iterdir())==['h.jsonl', 'h.jsonl.idx']
+
+@pytest.mark.parametrize('name', ['history_u.jsonl', 'history.sqlite'])
+def test_legacy_json_is_migrated_once(tmp_path:Path, name:str):
+    legacy=tmp_path/'history_u.json'; recs=[rec(i) for i in range(4)]; legacy.write_text(json.dumps(recs), encoding='utf-8')
+    with open_history(tmp_path/name, legacy=legacy) as s: assert list(s.query())==recs
+    with open_history(tmp_path/name, legacy=legacy) as s: assert s.count()==4
+    assert not legacy.exists() and (tmp_path/'history_u.json.migrated').exists()
+    assert not list(tmp_path.glob('*.lock')) and not list(tmp_path.glob('*.migrating'))
+
+def test_interrupted_migration_does_not_duplicate(tmp_path:Path, store:HistoryStore):
+    legacy=tmp_path/'history_u.json'; recs=[rec(i) for i in range(5)]; legacy.write_text(json.dumps(recs), encoding='utf-8')
+    store.append(rec(20, 'other'))
+    # what a run that died between append and rename leaves behind: the marker and part of the import
+    (tmp_path/'history_u.json.migrating').write_text(str(store.count()), encoding='utf-8'); store.append_many(recs[:3])
+    assert migrate_json_history(legacy, store)==2
+    assert list(store.query(user='u'))==recs and store.count()==6
+    assert not legacy.exists() and not (tmp_path/'history_u.json.migrating').exists()
+
+@pytest.mark.parametrize('text', ['[{"user": "u", ', '{"user": "u"}', '[1, 2]'])
+def test_unusable_legacy_file_is_backed_up(tmp_path:Path, text:str):
+    legacy=tmp_path/'history_u.json'; legacy.write_text(text, encoding='utf-8')
+    with open_history(tmp_path/'history_u.jsonl', legacy=legacy) as s: assert s.count()==0
+    assert not legacy.exists() and (tmp_path/'history_u.bak.json').read_text(encoding='utf-8')==text
@@ -0,0 +1,55 @@
+from __future__ import annotations
+import random
+from pathlib import Path
+from typing import List
+import pytest
+from engine.exam import ExamSession
+from engine.journal import SessionJournal, journal_path, read_checkpoint, resume_session
+from engine.models import Question, SessionConfig
+from engine.timer import VirtualClock
+
+META={'user':'r2','data_dir':'/decks','questions':'/decks/other.jsonl','metadata':'/decks/metadata.json','history':'/results/history_r2.jsonl'}
+
+def start(state:Path, qs:List[Question], clock:VirtualClock)->ExamSession:
+    cfg=SessionConfig(num_questions=len(qs), time_limit_minutes=10, shuffle_options=True, seed=11)
+    sess=ExamSession(qs, cfg, rng=random.Random(11), clock=clock)
+    sess.journal=SessionJournal(state, meta=META).open(fresh=True); sess.start(); sess.journal.checkpoint(sess)
+    return sess
+
+def answer(sess:ExamSession, clock:VirtualClock, n:int)->None:
+    for _ in range(n):
+        q=sess.next_question(); clock.advance(5); sess.submit(q, sess.options.to_display(q, q.answer))
+
+def test_pause_and_resume(tmp_path:Path, questions:List[Question]):
+    state=tmp_path/'session.json'; clock=VirtualClock(1000.0); sess=start(state, questions, clock)
+    answer(sess, clock, 2); pending=sess.next_question(); clock.advance(20)
+    sess.journal.checkpoint(sess); sess.journal.close()   # "P": the pending question is kept
+    ckpt=read_checkpoint(state)
+    assert ckpt['meta']==META and ckpt['answered']==2
+    later=VirtualClock(5000.0); back=resume_session(state, {q.id:q for q in questions}, rng=random.Random(), clock=later)
+    assert back.answers==sess.answers and back.remaining_seconds()==sess.remaining_seconds()
+    assert back.next_question().id==pending.id
+    assert [back.options.keys(q) for q in questions]==[sess.options.keys(q) for q in questions]
+
+def test_resume_after_crash_replays_journal(tmp_path:Path, questions:List[Question]):
+    state=tmp_path/'session.json'; clock=VirtualClock(1000.0); sess=start(state, questions, clock)
+    answer(sess, clock, 3); left=sess.remaining_seconds(); sess.journal.close()   # no checkpoint since the start
+    with journal_path(state).open('a', encoding='utf-8') as f: f.write('{"n": 4, "question_')   # torn last line
+    back=resume_session(state, {q.id:q for q in questions}, clock=VirtualClock(0.0))
+    assert back.answers==sess.answers and back.remaining_seconds()==left
+    assert back.next_question().id==questions[3].id
+
+def test_resume_refuses_a_bank_missing_questions(tmp_path:Path, questions:List[Question]):
+    state=tmp_path/'session.json'; clock=VirtualClock(1000.0); sess=start(state, questions, clock)
+    answer(sess, clock, 1); sess.journal.close()
+    with pytest.raises(ValueError, match='not in this bank'): resume_session(state, {q.id:q for q in questions[1:]})
+    assert state.exists() and journal_path(state).exists()
+
+def test_discard_removes_session_files(tmp_path:Path, questions:List[Question]):
+    state=tmp_path/'session.json'; clock=VirtualClock(1000.0); sess=start(state, questions, clock)
+    answer(sess, clock, len(questions)); sess.journal.discard()
+    assert not state.exists() and not journal_path(state).exists()
+
+def test_rejects_files_that_are_not_checkpoints(tmp_path:Path):
+    p=tmp_path/'x.json'; p.write_text('[1, 2, 3]', encoding='utf-8')
+    with pytest.raises(ValueError): read_checkpoint(p)
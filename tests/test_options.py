@@ -0,0 +1,46 @@
+from __future__ import annotations
+from itertools import combinations
+import pytest
+from engine.options import LETTERS, MAX_OPTIONS, MIN_OPTIONS, OptionOrder, normalize_answer, parse_choice, permutation
+
+@pytest.mark.parametrize('n', range(MIN_OPTIONS, MAX_OPTIONS+1))
+def test_display_and_grading_round_trip(n:int, make_questions):
+    order=OptionOrder(seed=42)
+    for q in make_questions(20, options=n):
+        keys=list(q.options); shown=order.display(q)
+        assert sorted(order.perm(q))==list(range(n)) and list(shown)==list(LETTERS[:n])
+        assert sorted(shown.values())==sorted(q.options.values()) and order.letters(q)==LETTERS[:n]
+        for k in range(1, n+1):
+            for subset in combinations(keys, k):   # every single- and multi-answer key set
+                ans=','.join(subset); disp=order.to_display(q, ans)
+                assert order.to_source(q, disp)==ans
+                assert [shown[l] for l in disp.split(',')]==[q.options[x] for x in order.keys(q) if x in subset]
+
+def test_no_seed_keeps_bank_order(make_questions):
+    q=make_questions(1, options=5)[0]; order=OptionOrder()
+    assert order.keys(q)==list(q.options) and order.to_display(q, 'B,D')=='B,D' and not order.perms
+
+def test_permutations_depend_only_on_seed_and_id(make_questions):
+    assert permutation(7, 3, 8)==permutation(7, 3, 8)
+    qs=make_questions(30, options=8)
+    assert [OptionOrder(7).keys(q) for q in qs]==[OptionOrder(7).keys(q) for q in qs]
+    assert len({tuple(OptionOrder(7).keys(q)) for q in qs})>1
+
+def test_state_round_trip(make_questions):
+    qs=make_questions(10, options=6); order=OptionOrder(seed='s'); shown=[order.display(q) for q in qs]
+    back=OptionOrder.from_state(order.state())
+    assert back.seed=='s' and [back.display(q) for q in qs]==shown
+    assert OptionOrder.from_state(None).seed is None
+
+@pytest.mark.parametrize('text,multi,want', [('b',False,'B'), (' A ',False,'A'), ('a,c',True,'A,C'), ('c a',True,'A,C'),
+                                             ('CA',True,'A,C'), ('A,C',False,None), ('E',False,None), ('',True,None), ('A;B',True,'A,B')])
+def test_parse_choice(text:str, multi:bool, want):
+    assert parse_choice(text, 'ABCD', multi)==want
+
+@pytest.mark.parametrize('raw,want', [('b','B'), ('CA','A,C'), ('c, a','A,C'), (['D','A'],'A,D')])
+def test_normalize_answer(raw, want:str):
+    assert normalize_answer(raw, {'A':'a','B':'b','C':'c','D':'d'})==want
+
+@pytest.mark.parametrize('raw', ['E', '', 'A,E', []])
+def test_normalize_answer_rejects_unknown_keys(raw):
+    with pytest.raises(ValueError): normalize_answer(raw, {'A':'a','B':'b','C':'c','D':'d'})
@@ -0,0 +1,44 @@
+from __future__ import annotations
+import random
+from collections import Counter
+import pytest
+from engine.selector import QuestionIndex, apportion, blueprint_select, generate_forms, select_questions
+
+def test_apportion_is_proportional():
+    assert apportion(10, {'a':0.5,'b':0.3,'c':0.2}, {'a':100,'b':100,'c':100})=={'a':5,'b':3,'c':2}
+    assert sum(apportion(7, {'a':1,'b':1,'c':1}, {'a':9,'b':9,'c':9}).values())==7
+
+def test_apportion_respects_capacity_and_resplits():
+    out=apportion(10, {'a':0.8,'b':0.1,'c':0.1}, {'a':2,'b':50,'c':50})
+    assert out['a']==2 and out['b']+out['c']==8 and abs(out['b']-out['c'])<=1
+    assert apportion(10, {'a':1,'b':1}, {'a':2,'b':3})=={'a':2,'b':3}
+    assert apportion(5, {'a':0,'b':1}, {'a':9,'b':9})=={'a':0,'b':5}
+
+def test_filter_matches_a_scan(make_questions):
+    qs=make_questions(40); idx=QuestionIndex(qs)
+    assert len(idx)==40 and idx.domain_rows('Domain 1')==[i for i,q in enumerate(qs) if q.domain=='Domain 1']
+    f=idx.filter(['TAG1','tag2'], ['tag2'], 2, 4)
+    assert f.active()==[q for q in qs if 'tag1' in q.tags and 2<=q.difficulty<=4]
+    assert len(idx)==40   # filtering derives a new index
+
+def test_select_questions_follows_weights(make_questions):
+    qs=make_questions(40); sel=select_questions(qs, 10, {'Domain 1':0.7,'Domain 2':0.3}, rng=random.Random(3))
+    assert len({q.id for q in sel})==10 and Counter(q.domain for q in sel)=={'Domain 1':7,'Domain 2':3}
+
+def test_select_backfills_from_the_rest_of_the_pool(make_questions):
+    qs=make_questions(12); sel=select_questions(qs, 10, {'Domain 1':1.0}, rng=random.Random(0))
+    assert len({q.id for q in sel})==10 and sum(q.domain=='Domain 1' for q in sel)==6
+
+def test_forms_are_reproducible(make_questions):
+    qs=make_questions(40); w={'Domain 1':0.5,'Domain 2':0.5}
+    a=generate_forms(qs, 3, 8, w, seed=9); b=generate_forms(qs, 3, 8, w, seed=9)
+    assert [[q.id for q in f] for f in a]==[[q.id for q in f] for f in b] and all(len(f)==8 for f in a)
+
+def test_blueprint_caps_at_pool_size(make_questions):
+    sel=blueprint_select(make_questions(10), {'Domain 1':3,'Domain 2':99}, rng=random.Random(1))
+    assert Counter(q.domain for q in sel)=={'Domain 1':3,'Domain 2':5}
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_collapse_keeps_one_row_per_cluster(make_questions, seed:int):
+    idx=QuestionIndex(make_questions(10)).collapse([[0,3,5],[1,2]], rng=random.Random(seed)); rows=idx.rows()
+    assert len(rows)==7 and len({0,3,5}&set(rows))==1 and len({1,2}&set(rows))==1